@@ -0,0 +1,50 @@
+"""Compare the .mat file loaders used to resolve subsets: one MATLAB engine call per file, one call per batch of files, and scipy.
+
+Writes one small .mat file per synthetic trial, then times loading the subset's variables from all of them.
+The MATLAB loaders are only run if the MATLAB engine can be imported.
+
+Usage:
+    python benchmarks/bench_load_mat.py [num_files]
+"""
+import os
+import sys
+import time
+import tempfile
+
+import scipy.io
+
+from ResearchOS.load_mat import load_mat_variables, MAT_LOADERS
+from ResearchOS.matlab_eng import import_matlab
+
+VARS_LIST = ["speed", "side", "group"]
+
+def make_mat_files(folder: str, num_files: int) -> list:
+    mat_file_paths = []
+    for file_idx in range(num_files):
+        mat_file_path = os.path.join(folder, f"Trial{file_idx}.mat")
+        scipy.io.savemat(mat_file_path, {"speed": file_idx * 0.1, "side": "left" if file_idx % 2 else "right", "group": file_idx % 3})
+        mat_file_paths.append(mat_file_path)
+    return mat_file_paths
+
+def main(num_files: int = 20000):
+    try:
+        matlab = import_matlab(is_matlab=True)
+    except ValueError:
+        matlab = None
+        print("MATLAB engine not available, only the scipy loader is run.")
+    loaders = MAT_LOADERS if matlab else ("scipy",)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        mat_file_paths = make_mat_files(tmp_dir, num_files)
+        if matlab:
+            matlab["matlab_eng"].addpath(os.path.join(os.path.dirname(__file__), "..", "src", "ResearchOS"))
+        print(f"{num_files} .mat files, {len(VARS_LIST)} variables each")
+        print("{:>14} {:>10} {:>14}".format("loader", "seconds", "files/second"))
+        for loader in loaders:
+            start = time.perf_counter()
+            load_mat_variables(mat_file_paths, VARS_LIST, loader=loader, matlab=matlab)
+            elapsed = time.perf_counter() - start
+            print("{:>14} {:>10.3f} {:>14.0f}".format(loader, elapsed, num_files / elapsed))
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
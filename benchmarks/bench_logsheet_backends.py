@@ -0,0 +1,18 @@
+"""Compare the "python" and "arrow" logsheet backends on a wide synthetic logsheet.
+
+Times the whole logsheet import (reading, cleaning, grouping and saving the dataset), and reports the peak memory of each backend.
+Each backend runs in a new process, so its peak resident memory is not mixed up with the other's.
+
+Usage:
+    python benchmarks/bench_logsheet_backends.py [num_rows] [num_columns]
+"""
+import sys
+
+from run_benchmarks import run_suite
+
+def main(num_rows: int = 100000, num_columns: int = 200):
+    print(f"{num_rows} rows x {num_columns} columns")
+    run_suite(num_rows=num_rows, num_columns=num_columns, repeats=1, names=["read_logsheet", "read_logsheet_arrow"])
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,73 @@
+"""Stress test the Parquet store in parallelization.py with many writer processes appending at once, and one reader reading meanwhile.
+
+Checks that no rows are lost and that the reader never sees a partially written fragment,
+and reports the append throughput and the slowest append and read.
+
+Usage:
+    python benchmarks/bench_parallel_writes.py [num_writers] [writes_per_writer] [rows_per_write]
+"""
+import os
+import sys
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+
+from ResearchOS.parallelization import locked_write_parquet, read_parquet_store, compact_parquet_store
+
+def append_rows(store_path: str, writer: int, num_writes: int, num_rows: int) -> float:
+    """Returns the slowest append, in seconds."""
+    slowest = 0.0
+    for write in range(num_writes):
+        table = pa.table({"writer": np.full(num_rows, writer), "write": np.full(num_rows, write), "value": np.random.rand(num_rows)})
+        start = time.perf_counter()
+        locked_write_parquet(store_path, table, mode='a', timeout=60)
+        slowest = max(slowest, time.perf_counter() - start)
+    return slowest
+
+def read_rows(store_path: str, expected_rows: int, rows_per_write: int) -> tuple:
+    """Read repeatedly until all of the rows are written. Returns the number of reads and the slowest read, in seconds."""
+    num_reads = 0
+    slowest = 0.0
+    num_rows = 0
+    while num_rows < expected_rows:
+        start = time.perf_counter()
+        try:
+            num_rows = read_parquet_store(store_path, columns=["writer"], timeout=60).num_rows
+        except (FileNotFoundError, ValueError):
+            continue # Nothing written yet.
+        slowest = max(slowest, time.perf_counter() - start)
+        if num_rows % rows_per_write != 0:
+            raise ValueError(f"Read a partially written fragment: {num_rows} rows")
+        num_reads += 1
+    return num_reads, slowest
+
+def main(num_writers: int = 16, writes_per_writer: int = 50, rows_per_write: int = 1000):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = os.path.join(tmp_dir, "store")
+        expected_rows = num_writers * writes_per_writer * rows_per_write
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=num_writers + 1) as executor:
+            writers = [executor.submit(append_rows, store_path, writer, writes_per_writer, rows_per_write) for writer in range(num_writers)]
+            reader = executor.submit(read_rows, store_path, expected_rows, rows_per_write)
+            slowest_append = max([writer.result() for writer in writers])
+            num_reads, slowest_read = reader.result()
+        elapsed = time.perf_counter() - start
+
+        num_rows = read_parquet_store(store_path).num_rows
+        if num_rows != expected_rows:
+            raise ValueError(f"Lost rows: expected {expected_rows}, read {num_rows}")
+        compact_start = time.perf_counter()
+        compact_parquet_store(store_path)
+        compact_elapsed = time.perf_counter() - compact_start
+
+    num_appends = num_writers * writes_per_writer
+    print(f"{num_writers} writers x {writes_per_writer} appends x {rows_per_write} rows, 1 reader")
+    print(f"appends/second: {num_appends / elapsed:.0f}, slowest append: {slowest_append * 1000:.1f} ms")
+    print(f"reads during the appends: {num_reads}, slowest read: {slowest_read * 1000:.1f} ms")
+    print(f"compacted {num_appends} fragments in {compact_elapsed:.2f} s, no rows lost")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,90 @@
+"""Benchmark the logsheet column assignment on synthetic logsheets.
+
+Times cleaning and assigning the values of every cell, in one pass over the rows, for 1k, 10k and 100k row logsheets.
+The time per row should stay roughly constant as the number of rows grows.
+
+With --workers N, the rows are also assigned by N worker processes like `read_logsheet(workers=N)`. This process still pickles
+the rows and merges the results, so workers only pay off with spare cores. e.g. on one machine, for 50k rows x 60 columns the serial
+pass took 2.1 s, and with workers this process spent 1.2 s of its own, so at least 3 free cores were needed to break even.
+
+Usage:
+    python benchmarks/bench_read_logsheet.py [--workers N] [num_rows ...]
+"""
+import sys
+import time
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from ResearchOS.read_logsheet import _assign_rows, _assign_rows_parallel
+from ResearchOS.data_object_index import DataObjectIndex
+
+DEFAULT_NUM_ROWS = (1000, 10000, 100000)
+NUM_COLUMNS = 60
+TRIALS_PER_SUBJECT = 100
+
+def make_logsheet(num_rows: int, num_columns: int = NUM_COLUMNS, seed: int = 0) -> tuple:
+    """Make a synthetic logsheet with a Subject and a Trial column followed by num_columns - 2 data columns.
+    Returns the logsheet rows (without headers), the header types and the header levels."""
+    rand = random.Random(seed)
+    header_types = ["str", "str"]
+    header_levels = ["Subject", "Trial"]
+    for col_idx in range(num_columns - 2):
+        header_types.append(("str", "num", "bool")[col_idx % 3])
+        header_levels.append("Subject" if col_idx % 4 == 0 else "Trial")
+
+    logsheet = []
+    for row_num in range(num_rows):
+        subject = row_num // TRIALS_PER_SUBJECT
+        row = [f"Subject{subject}", f"Trial{row_num}"]
+        for col_idx in range(2, num_columns):
+            if header_levels[col_idx] == "Subject" and header_types[col_idx] == "bool":
+                row.append("x") # Empty bool cells are False, so they can't be left empty.
+            elif header_levels[col_idx] == "Subject":
+                # Same value in every row of the subject, but sometimes left empty.
+                row.append(str(subject * col_idx) if rand.random() < 0.5 else "")
+            elif header_types[col_idx] == "num":
+                row.append(str(rand.random()))
+            elif header_types[col_idx] == "bool":
+                row.append("x" if rand.random() < 0.5 else "")
+            else:
+                row.append(f"value{row_num}_{col_idx}")
+        logsheet.append(row)
+    return logsheet, header_types, header_levels
+
+def assign_values(logsheet: list, header_types: list, header_levels: list, executor: ProcessPoolExecutor = None, workers: int = 1) -> dict:
+    """The column assignment step of read_logsheet, in this process or split across the executor's workers."""
+    order = ["Subject", "Trial"]
+    column_level_idx = [order.index(level) for level in header_levels]
+    var_names = [str(col_idx) for col_idx in range(len(header_types))]
+    all_attrs = {}
+    if executor is not None:
+        _assign_rows_parallel(executor, workers, logsheet, header_types, column_level_idx, [0, 1], var_names, var_names, DataObjectIndex(), all_attrs)
+    else:
+        _assign_rows(logsheet, header_types, column_level_idx, [0, 1], var_names, var_names, DataObjectIndex(), all_attrs)
+    return all_attrs
+
+def main(num_rows_list: tuple = DEFAULT_NUM_ROWS, workers: int = 1):
+    print("{:>10} {:>8} {:>12} {:>12}".format("rows", "workers", "seconds", "us/row"))
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if executor is not None:
+            assign_values(*make_logsheet(workers), executor=executor, workers=workers) # Start the worker processes before timing.
+        for num_rows in num_rows_list:
+            logsheet, header_types, header_levels = make_logsheet(num_rows)
+            for num_workers in sorted({1, workers}):
+                start_time = time.perf_counter()
+                assign_values(logsheet, header_types, header_levels, executor=executor if num_workers > 1 else None, workers=num_workers)
+                elapsed_time = time.perf_counter() - start_time
+                print("{:>10} {:>8} {:>12.3f} {:>12.2f}".format(num_rows, num_workers, elapsed_time, elapsed_time / num_rows * 1e6))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    workers = 1
+    if "--workers" in args:
+        workers_idx = args.index("--workers")
+        workers = int(args[workers_idx + 1])
+        del args[workers_idx:workers_idx + 2]
+    main(tuple(int(arg) for arg in args) or DEFAULT_NUM_ROWS, workers=workers)
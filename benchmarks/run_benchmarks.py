@@ -0,0 +1,335 @@
+"""Run the benchmark suite on a synthetic project, and write the results as JSON to compare them across commits.
+
+Each benchmark runs in a new process, so that its peak memory is not mixed up with the other benchmarks' and caches start cold.
+For each benchmark, the wall time of every repeat is recorded, along with the peak Python memory (tracemalloc, from one extra repeat)
+and the process' peak resident memory. A benchmark that fails is recorded with its error and the others still run.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--rows N] [--columns N] [--depth N] [--repeats N] [--output results.json] [--only name ...]
+    python benchmarks/run_benchmarks.py --compare baseline.json results.json [--tolerance 0.25]
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import contextlib
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+
+from synthetic_project import make_project
+
+FAKE_ENGINE_SECONDS = 0.001 # Time that each fake MATLAB engine call takes.
+DEFAULT_TOLERANCE = 0.25 # A benchmark regressed if it's this much slower than the baseline.
+
+class FakeEngine:
+    """Stands in for a MATLAB engine: each wrapper or wrapperBatch call takes FAKE_ENGINE_SECONDS and saves each output variable
+    (as 1.0) to the save files, keeping the other variables in them like wrapper.m."""
+
+    def addpath(self, path: str) -> None:
+        pass
+
+    def eval(self, code: str, nargout: int = 0) -> None:
+        pass
+
+    def wrapper(self, input_var_metadata: dict, output_var_metadata: dict, save_file_path: str, nargout: int = 0) -> None:
+        self.wrapperBatch(input_var_metadata, output_var_metadata, [save_file_path])
+
+    def wrapperBatch(self, input_var_metadata: dict, output_var_metadata: dict, save_file_paths: list, nargout: int = 0) -> None:
+        import scipy.io
+        time.sleep(FAKE_ENGINE_SECONDS)
+        for path in save_file_paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            mat_vars = scipy.io.loadmat(path) if os.path.exists(path) else {}
+            mat_vars = {name: value for name, value in mat_vars.items() if not name.startswith("__")}
+            mat_vars.update({output: 1.0 for output in output_var_metadata})
+            scipy.io.savemat(path, mat_vars)
+
+    def quit(self) -> None:
+        pass
+
+def _setup_read_logsheet(project: dict, work_folder: str, backend: str):
+    from ResearchOS.constants import SAVE_DATA_FOLDER_KEY
+    from ResearchOS.read_logsheet import read_logsheet
+    os.environ[SAVE_DATA_FOLDER_KEY] = work_folder
+    return lambda: read_logsheet(project["folder"], logsheet_toml_path=project["logsheet_toml_path"], backend=backend)
+
+def setup_read_logsheet(project: dict, work_folder: str):
+    return _setup_read_logsheet(project, work_folder, "python")
+
+def setup_read_logsheet_arrow(project: dict, work_folder: str):
+    return _setup_read_logsheet(project, work_folder, "arrow")
+
+def _setup_subsets(project: dict, vectorized: bool):
+    from ResearchOS.constants import DATASET_SCHEMA_KEY, DATASET_KEY, PROJECT_FOLDER_KEY, ENVIRON_VAR_DELIM
+    from ResearchOS.data_objects import get_data_objects_in_subset
+    from ResearchOS.data_object_index import DataObjectIndex
+    os.environ[PROJECT_FOLDER_KEY] = project["folder"]
+    os.environ[DATASET_SCHEMA_KEY] = ENVIRON_VAR_DELIM.join([DATASET_KEY] + project["factors"])
+    dobj_index = DataObjectIndex.from_names(project["data_objects"])
+    def get_subsets():
+        # Without the variable cache, so every repeat reads the .mat files.
+        for subset_name in project["subsets"]:
+            get_data_objects_in_subset(subset_name, dobj_index, project["factors"][-1], None, vectorized=vectorized, loader="scipy", cache=False)
+    return get_subsets
+
+def setup_subsets(project: dict, work_folder: str):
+    return _setup_subsets(project, vectorized=False)
+
+def setup_subsets_vectorized(project: dict, work_folder: str):
+    return _setup_subsets(project, vectorized=True)
+
+def setup_resolve_dag(project: dict, work_folder: str):
+    import networkx as nx
+    from ResearchOS.custom_classes import DataObjectName, OutputVariable
+    from ResearchOS.resolve_dag import resolve_dags
+    from ResearchOS.data_object_index import DATA_OBJECT_DELIMITER
+    # Ten runnables' worth of nodes: one data object name input and ten output variables each.
+    dag = nx.MultiDiGraph()
+    for runnable_idx in range(10):
+        dag.add_node(f"name{runnable_idx}", node=DataObjectName(id=f"name{runnable_idx}", name=f"runnable{runnable_idx}.data_object_name", attrs={}))
+        for output_idx in range(10):
+            output_id = f"output{runnable_idx}_{output_idx}"
+            dag.add_node(output_id, node=OutputVariable(id=output_id, name=f"runnable{runnable_idx}.output{output_idx}", attrs={}))
+            dag.add_edge(f"name{runnable_idx}", output_id)
+    data_objects = [data_object.split(DATA_OBJECT_DELIMITER) for data_object in project["data_objects"]]
+    return lambda: resolve_dags(dag, data_objects)
+
+def _make_data_objects_table(project: dict) -> pa.Table:
+    """One row per data object, with a column of 1000 samples per row like a stored time series."""
+    num_rows = len(project["data_objects"])
+    samples = np.random.default_rng(0).random((num_rows, 1000))
+    return pa.table({"data_object": project["data_objects"], "speed": samples[:, 0],
+                     "time_series": pa.FixedSizeListArray.from_arrays(pa.array(samples.ravel()), 1000)})
+
+def setup_parquet_write(project: dict, work_folder: str):
+    from ResearchOS.parallelization import locked_write_parquet
+    table = _make_data_objects_table(project)
+    store_path = os.path.join(work_folder, "store")
+    def write():
+        # One overwrite, then one append per ten data objects.
+        locked_write_parquet(store_path, table.slice(0, 1), mode='w')
+        for start_idx in range(0, table.num_rows, 10):
+            locked_write_parquet(store_path, table.slice(start_idx, 10), mode='a')
+    return write
+
+def _setup_parquet_store(project: dict, work_folder: str) -> str:
+    from ResearchOS.parallelization import locked_write_parquet
+    store_path = os.path.join(work_folder, "store")
+    locked_write_parquet(store_path, _make_data_objects_table(project), mode='w')
+    return store_path
+
+def setup_parquet_read_all(project: dict, work_folder: str):
+    from ResearchOS.parallelization import locked_read_parquet
+    store_path = _setup_parquet_store(project, work_folder)
+    return lambda: locked_read_parquet(store_path)
+
+def setup_parquet_read_projected(project: dict, work_folder: str):
+    from ResearchOS.parallelization import read_parquet_arrays
+    store_path = _setup_parquet_store(project, work_folder)
+    data_objects = project["data_objects"][::max(len(project["data_objects"]) // 20, 1)]
+    def read():
+        # One variable of one data object at a time, like a runnable's input.
+        for data_object in data_objects:
+            read_parquet_arrays(store_path, ["speed"], filters=[("data_object", "==", data_object)])
+    return read
+
+class BenchRunnable:
+    """Stands in for a compiled runnable node, with the attributes that `run.get_node_settings` reads."""
+
+    def __init__(self, name: str, language: str, inputs: dict, outputs: list, subset: str, factor: str, batch: list = [], function: str = None):
+        self.name = name
+        self.language = language
+        self.inputs = inputs
+        self.outputs = outputs
+        self.subset = subset
+        self.factor = factor
+        self.batch = batch
+        self.function = function
+
+def combine(a, b):
+    """The Python runnable of the run benchmarks."""
+    return a + b
+
+def _setup_run(project: dict, work_folder: str, force: bool, batch_list: list = []):
+    import networkx as nx
+    from ResearchOS import run
+    from ResearchOS.constants import SAVE_DATA_FOLDER_KEY, PROJECT_FOLDER_KEY, DATASET_SCHEMA_KEY, DATASET_KEY, ENVIRON_VAR_DELIM
+    from ResearchOS.custom_classes import OutputVariable
+    from ResearchOS.data_object_index import DataObjectIndex
+    from ResearchOS.matlab_eng import MatlabEnginePool
+    os.environ[SAVE_DATA_FOLDER_KEY] = work_folder
+    os.environ[PROJECT_FOLDER_KEY] = project["folder"]
+    os.environ[DATASET_SCHEMA_KEY] = ENVIRON_VAR_DELIM.join([DATASET_KEY] + project["factors"])
+
+    class FakeEnginePool(MatlabEnginePool):
+        # The run's engines are fake engines, everything else is the real run.
+        def __init__(self, *args, start_engine=None, **kwargs):
+            super().__init__(*args, start_engine=FakeEngine, **kwargs)
+    run.MatlabEnginePool = FakeEnginePool # This process only runs this benchmark.
+    # The runnables are not compiled from TOML files, so they are sorted and hashed by name.
+    run.get_sorted_runnable_nodes = lambda dag: [node for node in nx.topological_sort(dag) if isinstance(dag.nodes[node]["node"], BenchRunnable)]
+    run.hash_node = lambda dag, node: dag.nodes[node]["node"].name
+
+    # A diamond of three MATLAB runnables and a Python runnable that loads two of their outputs, over the data objects in the "fast" subset.
+    factor = project["factors"][-1]
+    runnables = [
+        BenchRunnable("node1", "matlab", {"speed": "speed"}, ["out1"], "fast", factor, batch=batch_list),
+        BenchRunnable("node2", "matlab", {"x": "out1"}, ["out2"], "fast", factor, batch=batch_list),
+        BenchRunnable("node3", "matlab", {"x": "out1"}, ["out3"], "fast", factor, batch=batch_list),
+        BenchRunnable("node4", "python", {"a": "out2", "b": "out3"}, ["out4"], "fast", factor, function=os.path.abspath(__file__) + ":combine"),
+    ]
+    dag = nx.MultiDiGraph()
+    for runnable in runnables:
+        dag.add_node(runnable.name, node=runnable)
+        for output in runnable.outputs:
+            dag.add_node(output, node=OutputVariable(id=output, name=f"{runnable.name}.{output}", attrs={}))
+            dag.add_edge(runnable.name, output)
+    for runnable in runnables:
+        for var_name in runnable.inputs.values():
+            if var_name in dag:
+                dag.add_edge(var_name, runnable.name)
+    dobj_index = DataObjectIndex.from_names(project["data_objects"])
+    # Two fake engines shared by four worker threads, and up to two runnables at once.
+    run_dag = lambda: run.run(dag, workers=4, executor_type="thread", max_concurrency=2, matlab_engines=2, force=force, dobj_index=dobj_index)
+    if not force:
+        run_dag() # Every result is up to date in the timed runs.
+    return run_dag
+
+def setup_run_fake_engine(project: dict, work_folder: str):
+    return _setup_run(project, work_folder, force=True)
+
+def setup_run_up_to_date(project: dict, work_folder: str):
+    return _setup_run(project, work_folder, force=False)
+
+def setup_run_batched(project: dict, work_folder: str):
+    # One wrapper call per highest level data object, instead of one per data object (unless the schema only has one level).
+    return _setup_run(project, work_folder, force=True, batch_list=project["factors"][:1] if len(project["factors"]) > 1 else [])
+
+BENCHMARKS = {
+    "read_logsheet": setup_read_logsheet,
+    "read_logsheet_arrow": setup_read_logsheet_arrow,
+    "subsets": setup_subsets,
+    "subsets_vectorized": setup_subsets_vectorized,
+    "resolve_dag": setup_resolve_dag,
+    "parquet_write": setup_parquet_write,
+    "parquet_read_all": setup_parquet_read_all,
+    "parquet_read_projected": setup_parquet_read_projected,
+    "run_fake_engine": setup_run_fake_engine,
+    "run_up_to_date": setup_run_up_to_date,
+    "run_batched": setup_run_batched,
+}
+
+def run_benchmark(name: str, project: dict, repeats: int) -> dict:
+    """Run one benchmark in this process. Returns the seconds of each repeat, the peak Python memory and the peak resident memory."""
+    with tempfile.TemporaryDirectory() as work_folder, contextlib.redirect_stdout(io.StringIO()): # Without the progress prints.
+        try:
+            benchmark_fcn = BENCHMARKS[name](project, work_folder)
+            seconds = []
+            for _ in range(repeats):
+                start_time = time.perf_counter()
+                benchmark_fcn()
+                seconds.append(time.perf_counter() - start_time)
+            tracemalloc.start()
+            benchmark_fcn()
+            peak_python_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+    return {"seconds": seconds, "min_seconds": min(seconds), "median_seconds": float(np.median(seconds)),
+            "peak_python_mb": peak_python_bytes / 1e6, "peak_rss_mb": _get_peak_rss_mb()}
+
+def run_suite(num_rows: int = 1000, num_columns: int = 20, depth: int = 3, repeats: int = 3, names: list = None) -> dict:
+    """Generate the synthetic project, then run each benchmark in a new process."""
+    names = names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {unknown}. Must be in {list(BENCHMARKS)}")
+    project_folder = tempfile.mkdtemp()
+    try:
+        project = make_project(project_folder, num_rows=num_rows, num_columns=num_columns, depth=depth)
+        results = {}
+        for name in names:
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                results[name] = executor.submit(run_benchmark, name, project, repeats).result()
+            print(_format_result(name, results[name]))
+    finally:
+        shutil.rmtree(project_folder)
+    return {"commit": _get_commit(), "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "parameters": {"rows": num_rows, "columns": num_columns, "depth": depth, "repeats": repeats}, "results": results}
+
+def compare(baseline: dict, current: dict, tolerance: float = DEFAULT_TOLERANCE) -> list:
+    """Compare the minimum seconds of each benchmark to the baseline. Returns the names of the benchmarks that regressed."""
+    if baseline["parameters"] != current["parameters"]:
+        print(f"Warning: the parameters differ, baseline {baseline['parameters']} vs. {current['parameters']}")
+    regressed = []
+    print("{:<24} {:>12} {:>12} {:>8}".format("benchmark", "baseline s", "current s", "ratio"))
+    for name, result in current["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None or "error" in baseline_result or "error" in result:
+            print("{:<24} {:>12} {:>12} {:>8}".format(name, "-", "-", "-"))
+            continue
+        ratio = result["min_seconds"] / max(baseline_result["min_seconds"], 1e-9)
+        is_regressed = ratio > 1 + tolerance
+        if is_regressed:
+            regressed.append(name)
+        print("{:<24} {:>12.4f} {:>12.4f} {:>8.2f}{}".format(name, baseline_result["min_seconds"], result["min_seconds"], ratio, " REGRESSED" if is_regressed else ""))
+    return regressed
+
+def _format_result(name: str, result: dict) -> str:
+    if "error" in result:
+        return f"{name:<24} failed: {result['error']}"
+    rss = f"{result['peak_rss_mb']:.0f}" if result["peak_rss_mb"] is not None else "-"
+    return f"{name:<24} min {result['min_seconds']:.4f} s, median {result['median_seconds']:.4f} s, peak Python {result['peak_python_mb']:.1f} MB, peak RSS {rss} MB"
+
+def _get_peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return None # Windows
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1e6 if sys.platform == "darwin" else max_rss / 1e3 # Bytes on macOS, kilobytes on Linux.
+
+def _get_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite on a synthetic project.")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--output", help="Path of the JSON results file.")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two JSON results files instead of running the suite.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        regressed = compare(baseline, current, tolerance=args.tolerance)
+        sys.exit(1 if regressed else 0)
+
+    results = run_suite(num_rows=args.rows, num_columns=args.columns, depth=args.depth, repeats=args.repeats, names=args.only)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Wrote the results to {args.output}")
+
+if __name__ == "__main__":
+    main()
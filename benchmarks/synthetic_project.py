@@ -0,0 +1,143 @@
+"""Generate synthetic ResearchOS projects for the benchmarks.
+
+A project has a logsheet CSV and its TOML, a subsets TOML with nested and/or conditions, the index and pyproject files,
+and one .mat file per data object with the variables that the subsets use.
+The same arguments and seed always generate the same project.
+
+Usage:
+    python benchmarks/synthetic_project.py project_folder [num_rows] [num_columns] [depth]
+"""
+import os
+import sys
+import csv
+import json
+import random
+
+import scipy.io
+
+from ResearchOS.constants import LOGSHEET_NAME, SUBSET_KEY
+from ResearchOS.data_object_index import DATA_OBJECT_DELIMITER
+
+FACTOR_NAMES = ("Subject", "Task", "Trial", "Repetition", "Cycle", "Frame")
+CHILDREN_PER_DATA_OBJECT = 4 # Number of data objects below each data object, except at the highest level.
+HEADER_TYPES = ("str", "num", "bool")
+SUBSETS = {
+    "fast": ["speed", ">", 0.5],
+    "left_and_fast_or_control": {"or": [{"and": [["side", "==", "left"], ["speed", ">", 0.3]]}, ["group", "==", "control"]]},
+    "nested": {"and": [["group", "in", ["control", "treatment"]], {"or": [["speed", "<", 0.2], ["side", "contains", "igh"]]}, ["trial_num", ">=", 2]]},
+}
+
+def make_project(project_folder: str, num_rows: int = 1000, num_columns: int = 20, depth: int = 3, seed: int = 0, mat_files: bool = True) -> dict:
+    """Write a synthetic project to the folder, with one logsheet row per lowest level data object.
+    `depth` is the number of factors in the schema (Subject, Task, Trial, ...), and `num_columns` includes the factor columns.
+    Returns the project's paths, factors, data objects (lowest level only) and subset names."""
+    if not 1 <= depth <= len(FACTOR_NAMES):
+        raise ValueError(f"The schema depth must be from 1 to {len(FACTOR_NAMES)}, not {depth}")
+    if num_columns < depth:
+        raise ValueError(f"The logsheet needs at least one column per factor ({depth}), not {num_columns}")
+    rand = random.Random(seed)
+    factors = list(FACTOR_NAMES[:depth])
+    data_objects = get_data_object_names(num_rows, factors)
+    os.makedirs(project_folder, exist_ok=True)
+
+    # Logsheet columns: the factors, then data columns of each type at each level.
+    headers = {factor: {"column_name": factor, "type": "str", "level": factor} for factor in factors}
+    for col_idx in range(num_columns - depth):
+        headers[f"Var{col_idx}"] = {"column_name": f"Var{col_idx}", "type": HEADER_TYPES[col_idx % len(HEADER_TYPES)], "level": factors[col_idx % depth]}
+    logsheet_path = os.path.join(project_folder, "logsheet.csv")
+    with open(logsheet_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([header["column_name"] for header in headers.values()])
+        higher_level_values = {} # (data object, column) -> value, so each data object's value is the same in all of its rows.
+        for data_object in data_objects:
+            components = data_object.split(DATA_OBJECT_DELIMITER)
+            row = list(components)
+            for col_name, header in list(headers.items())[depth:]:
+                level_idx = factors.index(header["level"])
+                if level_idx == depth - 1:
+                    row.append(_make_value(header["type"], rand))
+                    continue
+                key = (DATA_OBJECT_DELIMITER.join(components[:level_idx + 1]), col_name)
+                if key not in higher_level_values:
+                    higher_level_values[key] = _make_value(header["type"], rand)
+                row.append(higher_level_values[key])
+            writer.writerow(row)
+
+    logsheet_toml_path = os.path.join(project_folder, "logsheet.toml")
+    with open(logsheet_toml_path, "w") as f:
+        f.write(f"[{LOGSHEET_NAME}]\n")
+        f.write(f"num_header_rows = 1\ndataset_factors = {_to_toml(factors)}\npath = {_to_toml(logsheet_path)}\n\n")
+        f.write(f"[{LOGSHEET_NAME}.headers]\n")
+        for name, header in headers.items():
+            for key, value in header.items():
+                f.write(f"{name}.{key} = {_to_toml(value)}\n")
+
+    subsets_path = os.path.join(project_folder, "subsets.toml")
+    with open(subsets_path, "w") as f:
+        for subset_name, conditions in SUBSETS.items():
+            f.write(f"{subset_name} = {_to_toml(conditions)}\n")
+    with open(os.path.join(project_folder, "index.toml"), "w") as f:
+        f.write(f"{SUBSET_KEY} = \"subsets.toml\"\n{LOGSHEET_NAME} = \"logsheet.toml\"\n")
+    with open(os.path.join(project_folder, "pyproject.toml"), "w") as f:
+        f.write("[project]\nname = \"ros-synthetic-project\"\nversion = \"0.0.1\"\n\n[tool.researchos]\nindex = 'index.toml'\n")
+
+    if mat_files:
+        write_mat_files(project_folder, data_objects, seed=seed)
+    return {"folder": project_folder, "logsheet_path": logsheet_path, "logsheet_toml_path": logsheet_toml_path, "subsets_path": subsets_path,
+            "factors": factors, "data_objects": data_objects, "subsets": list(SUBSETS)}
+
+def get_data_object_names(num_rows: int, factors: list) -> list:
+    """Get the names of the lowest level data objects, e.g. "Subject0.Task1.Trial2", in logsheet order.
+    Each data object has CHILDREN_PER_DATA_OBJECT children, and there are as many highest level data objects as needed for num_rows."""
+    data_objects = []
+    for row_idx in range(num_rows):
+        components = []
+        remainder = row_idx
+        for level_idx in reversed(range(len(factors))):
+            if level_idx == 0:
+                components.append(f"{factors[0]}{remainder}")
+            else:
+                components.append(f"{factors[level_idx]}{remainder % CHILDREN_PER_DATA_OBJECT}")
+                remainder //= CHILDREN_PER_DATA_OBJECT
+        data_objects.append(DATA_OBJECT_DELIMITER.join(reversed(components)))
+    return data_objects
+
+def write_mat_files(project_folder: str, data_objects: list, seed: int = 0) -> None:
+    """Write the variables that the subsets use: "group" in each highest level data object's .mat file,
+    and "speed", "side" (missing in some files) and "trial_num" in each lowest level data object's .mat file."""
+    rand = random.Random(seed)
+    written_highest = set()
+    for row_idx, data_object in enumerate(data_objects):
+        components = data_object.split(DATA_OBJECT_DELIMITER)
+        if components[0] not in written_highest:
+            written_highest.add(components[0])
+            scipy.io.savemat(os.path.join(project_folder, components[0] + ".mat"), {"group": rand.choice(["control", "treatment", "other"])})
+        if len(components) == 1:
+            continue
+        mat_vars = {"speed": rand.random(), "trial_num": row_idx % 10}
+        if rand.random() < 0.9:
+            mat_vars["side"] = rand.choice(["left", "right"])
+        mat_file_path = os.path.join(project_folder, *components) + ".mat"
+        os.makedirs(os.path.dirname(mat_file_path), exist_ok=True)
+        scipy.io.savemat(mat_file_path, mat_vars)
+
+def _make_value(type_str: str, rand: random.Random) -> str:
+    if type_str == "num":
+        return str(round(rand.random() * 100, 3)) if rand.random() < 0.9 else ""
+    if type_str == "bool":
+        return "x" if rand.random() < 0.5 else ""
+    return rand.choice(["left", "right", "both", ""])
+
+def _to_toml(value) -> str:
+    """TOML for the strings, numbers, lists and dicts of the generated settings. Dicts are written as inline tables."""
+    if isinstance(value, dict):
+        return "{ " + ", ".join([f"{key} = {_to_toml(item)}" for key, item in value.items()]) + " }"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join([_to_toml(item) for item in value]) + "]"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return json.dumps(value) # Strings are quoted and escaped the same way in JSON and TOML.
+
+if __name__ == "__main__":
+    project = make_project(sys.argv[1], *[int(arg) for arg in sys.argv[2:]])
+    print(f"Wrote {len(project['data_objects'])} data objects with factors {project['factors']} to {project['folder']}")
@@ -1,4 +1,55 @@
+import os
 
+from ResearchOS.constants import DATASET_SCHEMA_KEY, ENVIRON_VAR_DELIM
+from ResearchOS.data_object_index import DataObjectIndex
 
-def get_batches_dict(subset_list: list, batch_list: list):
-    return {k: [] for k in subset_list}
\ No newline at end of file
+def get_batches_dict(subset_list: list, batch_list: list, schema: list = None, dobj_index: DataObjectIndex = None) -> dict:
+    """Group the subset's data objects under their ancestors at each of the batch's factors, highest level first.
+    e.g. with batch_list = ["Subject"]: {"S1": {"S1.T1": [], "S1.T2": []}, "S2": {"S2.T1": []}}, and with ["Subject", "Task"] there is one more level of dicts.
+    Without a batch, each data object is its own batch: {"S1.T1": [], "S1.T2": [], "S2.T1": []}.
+    Data objects and batches stay in the order of the subset. `schema` is the dataset schema, including the Dataset, read from the environment by default.
+    The ancestors are looked up in `dobj_index` (e.g. the logsheet's DataObjectIndex), which is built from the subset by default."""
+    if isinstance(batch_list, str):
+        batch_list = [batch_list]
+    if not batch_list:
+        return {data_object: [] for data_object in subset_list}
+    if schema is None:
+        schema = os.environ[DATASET_SCHEMA_KEY].split(ENVIRON_VAR_DELIM)
+    for factor in batch_list:
+        if factor not in schema:
+            raise ValueError(f"Batch factor {factor} is not in the dataset schema: {schema}")
+    # Minus 1 to account for the Dataset at the beginning of the schema.
+    batch_levels = [schema.index(factor) - 1 for factor in batch_list]
+    if batch_levels != sorted(set(batch_levels)) or batch_levels[0] < 0:
+        raise ValueError(f"The batch factors must be below the Dataset and ordered from the highest level down: {batch_list}")
+    if dobj_index is None:
+        dobj_index = DataObjectIndex.from_names(subset_list)
+
+    batches_dict = {}
+    groups = {} # ID of the data object's ancestor at the lowest batch level -> dict of its data objects, so the higher levels are only walked once per group.
+    lowest_level = batch_levels[-1]
+    for data_object in subset_list:
+        try:
+            dobj_id = dobj_index.get_id(data_object)
+        except KeyError:
+            raise ValueError(f"Data object {data_object} is not in the data object index")
+        if dobj_index.id_level(dobj_id) <= lowest_level:
+            raise ValueError(f"Data object {data_object} is not below the lowest batch factor {batch_list[-1]}")
+        ancestor_ids = dobj_index.id_ancestors(dobj_id)
+        group = groups.get(ancestor_ids[lowest_level])
+        if group is None:
+            group = batches_dict
+            for batch_name in dobj_index.get_names([ancestor_ids[level_idx] for level_idx in batch_levels]):
+                group = group.setdefault(batch_name, {})
+            groups[ancestor_ids[lowest_level]] = group
+        group[data_object] = []
+    return batches_dict
+
+def get_batch_data_objects(data_object: str, data_object_batch) -> list:
+    """Get the data objects in one batch of `get_batches_dict`, from its name and its value. Without a batch, that is only the data object itself."""
+    if not data_object_batch:
+        return [data_object]
+    batch_data_objects = []
+    for name, value in data_object_batch.items():
+        batch_data_objects.extend(get_batch_data_objects(name, value))
+    return batch_data_objects
@@ -0,0 +1,110 @@
+import os
+import json
+import threading
+from types import MappingProxyType
+
+import tomli as tomllib
+
+from ResearchOS.create_dag_from_toml import get_package_index_dict
+from ResearchOS.tracing import count
+
+PYPROJECT_FILE_NAME = "pyproject.toml" # Points to the package's index file in [tool.researchos].
+
+class ConfigCache:
+    """Cache of parsed TOML and JSON settings files, so each file is only parsed once per process.
+    Entries are keyed by the file's path, and are reparsed when the file's modification time or size changes.
+    The parsed settings are returned as immutable views (see `freeze`), so one caller can't change the settings seen by another.
+    It is shared by the runnables running at the same time, so it is locked while getting or clearing entries."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._files = {} # Absolute path -> (file key, frozen settings)
+        self._package_index_dicts = {} # Package folder -> (file keys of its pyproject.toml and index file, frozen index dict)
+
+    def load(self, path: str):
+        """Get the frozen contents of the TOML or JSON file."""
+        path = os.path.abspath(path)
+        if not path.endswith((".toml", ".json")):
+            raise ValueError(f"Settings files must be .toml or .json files: {path}")
+        with self._lock:
+            return self._load(path)
+
+    def _load(self, path: str):
+        file_key = _get_file_key(path)
+        entry = self._files.get(path)
+        if entry is not None and entry[0] == file_key:
+            self._hit()
+            return entry[1]
+        self._miss()
+        with open(path, "rb") as f:
+            value = tomllib.load(f) if path.endswith(".toml") else json.load(f)
+        frozen = freeze(value)
+        self._files[path] = (file_key, frozen)
+        return frozen
+
+    def get_package_index_dict(self, package_folder_path: str):
+        """Get the frozen index dict of the package. It is read again when the package's pyproject.toml or index file changes."""
+        package_folder_path = os.path.abspath(package_folder_path)
+        with self._lock:
+            file_keys = self._get_index_file_keys(package_folder_path)
+            entry = self._package_index_dicts.get(package_folder_path)
+            if entry is not None and entry[0] == file_keys:
+                self._hit()
+                return entry[1]
+            self._miss()
+            index_dict = freeze(get_package_index_dict(package_folder_path=package_folder_path))
+            self._package_index_dicts[package_folder_path] = (file_keys, index_dict)
+            return index_dict
+
+    def _get_index_file_keys(self, package_folder_path: str) -> tuple:
+        """Get the file keys of the package's pyproject.toml and of the index file it points to (None for missing files)."""
+        pyproject_path = os.path.join(package_folder_path, PYPROJECT_FILE_NAME)
+        if not os.path.exists(pyproject_path):
+            return (None,)
+        index_path = self._load(pyproject_path).get("tool", {}).get("researchos", {}).get("index")
+        if not isinstance(index_path, str):
+            return (_get_file_key(pyproject_path),)
+        index_path = os.path.join(package_folder_path, index_path.replace("/", os.sep))
+        return (_get_file_key(pyproject_path), _get_file_key(index_path) if os.path.exists(index_path) else None)
+
+    def _hit(self) -> None:
+        self.hits += 1
+        count("config_cache.hits")
+
+    def _miss(self) -> None:
+        self.misses += 1
+        count("config_cache.misses")
+
+    def clear(self) -> None:
+        """Clear the cache, e.g. at the start of a run."""
+        with self._lock:
+            self._files.clear()
+            self._package_index_dicts.clear()
+
+def _get_file_key(path: str) -> tuple:
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+config_cache = ConfigCache()
+
+def load_config(path: str):
+    """Get the frozen contents of the TOML or JSON file from the process' config cache."""
+    return config_cache.load(path)
+
+def freeze(value):
+    """Get an immutable view of the value: dicts become read-only mappings and lists become tuples, recursively."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple([freeze(item) for item in value])
+    return value
+
+def thaw(value):
+    """Get a mutable copy of a frozen value, with plain dicts and lists."""
+    if isinstance(value, MappingProxyType):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
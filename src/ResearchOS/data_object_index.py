@@ -0,0 +1,186 @@
+import os
+import sys
+from array import array
+
+DATA_OBJECT_DELIMITER = "." # Between the names at each level of a data object's full name, e.g. `Subject1.Trial1`.
+NO_ID = -1 # Parent ID of the data objects at level 0.
+_NO_CHILDREN = {} # Never modified.
+
+class DataObjectIndex:
+    """Hierarchical index of data object names, built once (e.g. during the logsheet import).
+    Data object names are the names at each level of the schema joined by the delimiter, e.g. `Subject1.Trial1`.
+    Level 0 is the highest level of the schema below the Dataset.
+
+    Each data object has an integer ID, in the order they were added. The index only stores each data object's own name at its level,
+    and its parent ID and level in array columns, so full names are not kept in memory.
+    The name-based methods convert to and from IDs at the edges. The `id_` methods query the IDs directly, without building any names."""
+
+    def __init__(self, delimiter: str = DATA_OBJECT_DELIMITER):
+        self.delimiter = delimiter
+        self._components = [] # ID -> the data object's own name at its level (the last component of its full name).
+        self._parent_ids = array("q") # ID -> parent ID, NO_ID at level 0.
+        self._levels = array("H") # ID -> level index.
+        self._level_ids = [] # Level index -> array of the IDs at that level, in the order they were added.
+        self._child_ids = {NO_ID: {}} # Parent ID -> {component: child ID}, in the order the children were added. Only for data objects with children.
+
+    @classmethod
+    def from_names(cls, names: list, delimiter: str = DATA_OBJECT_DELIMITER) -> "DataObjectIndex":
+        """Build the index from a list of data object names. Ancestors are added even if they are not in the list."""
+        index = cls(delimiter=delimiter)
+        for name in names:
+            index.add_ids(str(name).split(delimiter))
+        return index
+
+    def add(self, components: list) -> list:
+        """Add the data object with the given names at each level, and all of its ancestors.
+        Returns the full names of the data object's ancestors and the data object itself, from the highest level down."""
+        ids = self.add_ids(components)
+        return [self.delimiter.join(components[:level_idx + 1]) for level_idx in range(len(ids))]
+
+    def add_ids(self, components: list) -> list:
+        """Like `add`, but returns the IDs of the data object's ancestors and the data object itself.
+        Raises ValueError if a name contains the delimiter, because the data object's full name could not be split back into its names."""
+        ids = []
+        siblings = self._child_ids[NO_ID]
+        for component in components:
+            dobj_id = siblings.get(component)
+            if dobj_id is None:
+                if self.delimiter in component:
+                    raise ValueError(f"Data object name {component!r} can't contain the delimiter {self.delimiter!r}!")
+                dobj_id = self._add_child(ids[-1] if ids else NO_ID, component)
+            ids.append(dobj_id)
+            siblings = self._child_ids.get(dobj_id, _NO_CHILDREN)
+        return ids
+
+    def _add_child(self, parent_id: int, component: str) -> int:
+        dobj_id = len(self._components)
+        level_idx = self._levels[parent_id] + 1 if parent_id != NO_ID else 0
+        component = sys.intern(component) # The same names are used at each level, e.g. Trial1 of every Subject.
+        if parent_id not in self._child_ids:
+            self._child_ids[parent_id] = {}
+        self._child_ids[parent_id][component] = dobj_id
+        self._components.append(component)
+        self._parent_ids.append(parent_id)
+        self._levels.append(level_idx)
+        if level_idx == len(self._level_ids):
+            self._level_ids.append(array("q"))
+        self._level_ids[level_idx].append(dobj_id)
+        return dobj_id
+
+    def get_id(self, name: str) -> int:
+        """Get the ID of the data object. Raises KeyError if it's not in the index."""
+        dobj_id = NO_ID
+        for component in name.split(self.delimiter):
+            dobj_id = self._child_ids.get(dobj_id, _NO_CHILDREN)[component]
+        return dobj_id
+
+    def get_name(self, dobj_id: int) -> str:
+        """Get the full name of the data object."""
+        components = [self._components[dobj_id]]
+        parent_id = self._parent_ids[dobj_id]
+        while parent_id != NO_ID:
+            components.append(self._components[parent_id])
+            parent_id = self._parent_ids[parent_id]
+        components.reverse()
+        return self.delimiter.join(components)
+
+    def get_names(self, dobj_ids) -> list:
+        """Get the full names of the data objects. Each parent's name is only built once."""
+        names = {}
+        for dobj_id in dobj_ids:
+            if dobj_id not in names:
+                parent_id = self._parent_ids[dobj_id]
+                if parent_id == NO_ID:
+                    names[dobj_id] = self._components[dobj_id]
+                else:
+                    if parent_id not in names:
+                        names[parent_id] = self.get_name(parent_id)
+                    names[dobj_id] = names[parent_id] + self.delimiter + self._components[dobj_id]
+        return [names[dobj_id] for dobj_id in dobj_ids]
+
+    def ids_at_level(self, level_idx: int) -> array:
+        """Get the IDs of all data objects at the given level, in the order they were added."""
+        if level_idx < 0 or level_idx >= len(self._level_ids):
+            return array("q")
+        return self._level_ids[level_idx]
+
+    def id_level(self, dobj_id: int) -> int:
+        return self._levels[dobj_id]
+
+    def id_parent(self, dobj_id: int) -> int:
+        """Get the ID of the data object's parent, or NO_ID at the highest level."""
+        return self._parent_ids[dobj_id]
+
+    def id_children(self, dobj_id: int) -> list:
+        return list(self._child_ids.get(dobj_id, _NO_CHILDREN).values())
+
+    def id_descendants(self, dobj_id: int) -> list:
+        """Get the IDs of all of the data object's descendants, depth first."""
+        descendants = []
+        stack = list(reversed(self.id_children(dobj_id)))
+        while stack:
+            child_id = stack.pop()
+            descendants.append(child_id)
+            stack.extend(reversed(self.id_children(child_id)))
+        return descendants
+
+    def id_ancestors(self, dobj_id: int) -> list:
+        """Get the IDs of the data object's ancestors, from the highest level down."""
+        ancestors = []
+        parent_id = self._parent_ids[dobj_id]
+        while parent_id != NO_ID:
+            ancestors.append(parent_id)
+            parent_id = self._parent_ids[parent_id]
+        ancestors.reverse()
+        return ancestors
+
+    def at_level(self, level_idx: int) -> list:
+        """Get the names of all data objects at the given level, in the order they were added."""
+        return self.get_names(self.ids_at_level(level_idx))
+
+    def level(self, name: str) -> int:
+        """Get the level index of the data object."""
+        return self._levels[self.get_id(name)]
+
+    def parent(self, name: str) -> str:
+        """Get the name of the data object's parent, or None at the highest level."""
+        self.get_id(name) # Raises KeyError if the data object is not in the index.
+        parent, delimiter, _ = name.rpartition(self.delimiter)
+        return parent if delimiter else None
+
+    def children(self, name: str) -> list:
+        """Get the names of the data object's children."""
+        return [name + self.delimiter + self._components[child_id] for child_id in self.id_children(self.get_id(name))]
+
+    def descendants(self, name: str) -> list:
+        """Get the names of all of the data object's descendants, depth first."""
+        return self.get_names(self.id_descendants(self.get_id(name)))
+
+    def ancestors(self, name: str) -> list:
+        """Get the names of the data object's ancestors, from the highest level down."""
+        self.get_id(name)
+        components = name.split(self.delimiter)
+        return [self.delimiter.join(components[:level_idx]) for level_idx in range(1, len(components))]
+
+    @property
+    def num_levels(self) -> int:
+        return len(self._level_ids)
+
+    def __contains__(self, name: str) -> bool:
+        try:
+            self.get_id(name)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self._components)
+
+    def __iter__(self):
+        """Iterate over all data object names, level by level."""
+        for level_idx in range(len(self._level_ids)):
+            yield from self.at_level(level_idx)
+
+def get_save_file_path(save_data_folder: str, data_object: str, delimiter: str = DATA_OBJECT_DELIMITER) -> str:
+    """Get the path of the data object's .mat save file, in one folder per level above it, e.g. `save_data_folder/Subject1/Trial1.mat`."""
+    return os.path.join(save_data_folder, data_object.replace(delimiter, os.sep) + ".mat")
@@ -1,166 +1,302 @@
 import os
+import operator
+import threading
 
-import tomli as tomllib
+import numpy as np
 
-from ResearchOS.constants import DATASET_SCHEMA_KEY, SUBSET_KEY, PROJECT_FOLDER_KEY
-from ResearchOS.create_dag_from_toml import get_package_index_dict
+from ResearchOS.constants import DATASET_SCHEMA_KEY, SUBSET_KEY, PROJECT_FOLDER_KEY, ENVIRON_VAR_DELIM
+from ResearchOS.config_cache import config_cache, thaw
+from ResearchOS.data_object_index import DataObjectIndex, get_save_file_path
+from ResearchOS.load_mat import load_mat_variables
+from ResearchOS.var_cache import get_variable_cache
+from ResearchOS.tracing import span, traced, count
 
 numeric_logic_options = (">", "<", ">=", "<=", )
 any_type_logic_options = ("==", '=', "!=", "in", "not in", "is", "is not", "contains", "not contains")
 logic_options = numeric_logic_options + any_type_logic_options
 plural_logic = ("in", "not in", "contains", "not contains")
+_INT64_MIN, _INT64_MAX = np.iinfo(np.int64).min, np.iinfo(np.int64).max
+_MAX_EXACT_FLOAT_INT = 2**53 # Larger ints are not all exactly representable as float64.
+comparison_operators = {">": operator.gt, "<": operator.lt, ">=": operator.ge, "<=": operator.le, "==": operator.eq, "=": operator.eq, "!=": operator.ne, "is": operator.is_, "is not": operator.is_not}
 
-def get_data_objects_in_subset(subset_name: str, all_data_objects: list, level: str, matlab) -> list:
+compiled_subsets = {} # Subset name -> (conditions, predicate, vars_list, frozen conditions), so each subset is only compiled once per process.
+_compiled_subsets_lock = threading.Lock() # Nodes running at the same time get their subsets from different threads.
+
+@traced("subset")
+def get_data_objects_in_subset(subset_name: str, all_data_objects, level: str, matlab, vectorized: bool = False, loader: str = "matlab", cache: bool = True) -> list:
     """Get the data objects in the specified subset. Returns a list of Data Object strings using dot notation.
-    e.g. `Subject.Task.Trial`"""
+    e.g. `Subject.Task.Trial`
+    `all_data_objects` is a DataObjectIndex, or a list of Data Object strings using dot notation.
+    If vectorized, the conditions are evaluated on a table of the variables' values (one row per data object) instead of one data object at a time.
+    `loader` is how the variables are loaded from the .mat files, see `load_mat_variables`. `matlab` may be None with the "scipy" loader.
+    If cache, the variables are loaded through the process' variable cache, so only variables not loaded before (or whose .mat file changed) are read."""
     # 1. Read the subset to determine which variables need to be loaded from file.
     # Store the variables in a dictionary.
     schema_str = os.environ[DATASET_SCHEMA_KEY]
-    schema = schema_str.split(".")
+    schema = schema_str.split(ENVIRON_VAR_DELIM)
     level_idx_in_schema = schema.index(level)
+    if not isinstance(all_data_objects, DataObjectIndex):
+        all_data_objects = DataObjectIndex.from_names(all_data_objects)
+    dobj_index = all_data_objects
     # Remove everything that's not the level of interest.
     # Minus 1 on the level index to account for the Dataset level at the beginning.
-    all_data_objects = [data_object for data_object in all_data_objects if str(data_object).count(".") == level_idx_in_schema - 1]
-
-    # 2. Get the subset conditions given by the subset name.
-    subset_conditions = get_subset_conditions(subset_name)
-    subset_conditions_list = []
-    _extract_and_replace_lists(subset_conditions, subset_conditions_list)
+    all_data_objects = list(dobj_index.at_level(level_idx_in_schema - 1))
 
-    # 3. Get all of the variables used in the subset's conditions.
-    vars_list = []
-    for condition in subset_conditions_list:
-        vars_list.append(condition[0])
+    # 2. Get the compiled subset conditions and all of the variables used in them.
+    subset_conditions, predicate, vars_list = get_compiled_subset(subset_name, with_conditions=True)
 
-    all_vars = {}
-    matlab_eng = matlab['matlab_eng']
+    # 3. Load the variables.
     mat_data_folder = os.environ[PROJECT_FOLDER_KEY]
-    for data_object in all_data_objects:
-        all_vars[data_object] = {}             
-        # Load the variables all at once from the file.
-        mat_file_path = os.path.join(mat_data_folder, data_object.replace(".", os.sep) + ".mat")
-        vars_dict = matlab_eng.readMatFileSafe(mat_file_path, vars_list)
-        all_vars[data_object] = vars_dict
-
-    # 4. For each data object, evaluate whether the subset condition is met.
-    data_objects_in_subset = []
-    for data_object in all_data_objects:
-        if _meets_conditions(data_object, conditions=subset_conditions, vr_values = all_vars[data_object], all_data_objects=all_data_objects):
-            data_objects_in_subset.append(data_object)        
-    return data_objects_in_subset
-
-def _extract_and_replace_lists(data, extracted_lists: list, counter=[0]):
-    """Recursively traverses the data structure, replaces each list with a unique number, and extracts the lists. """
-    if isinstance(data, list):
-        # Append the current list to the extracted lists
-        extracted_lists.append(data)
-        # Replace the list with the current counter value
-        number = counter[0]
-        counter[0] += 1
-        return number
-    elif isinstance(data, dict):
-        # Traverse dictionary and process each value
-        return {key: [_extract_and_replace_lists(item, extracted_lists, counter) if isinstance(item, list) else item for item in value] if isinstance(value, list) else _extract_and_replace_lists(value, extracted_lists, counter) for key, value in data.items()}
-    else:
-        # For other data types, return as is
-        return data
+    mat_file_paths = [get_save_file_path(mat_data_folder, data_object, delimiter=dobj_index.delimiter) for data_object in all_data_objects]
+    load_fcn = lambda paths, vars: load_mat_variables(paths, vars, loader=loader, matlab=matlab)
+    load_vars = lambda paths, vars: get_variable_cache().load(paths, vars, load_fcn) if cache else load_fcn(paths, vars)
+    with span("subset.load_variables", subset=subset_name, files=len(mat_file_paths), variables=len(vars_list)):
+        loaded_vars = load_vars(mat_file_paths, vars_list)
+    all_vars = dict(zip(all_data_objects, loaded_vars))
+
+    # Variables that a data object does not have are looked up for its ancestors, so load them from the ancestors' .mat files too.
+    missing_vars = [vr_id for vr_id in vars_list if any(vr_id not in vars for vars in loaded_vars)]
+    ancestors = {} # Only the ancestors of the data objects with missing variables, each once.
+    for data_object, vars in zip(all_data_objects, loaded_vars):
+        if any(vr_id not in vars for vr_id in missing_vars):
+            ancestors.update(dict.fromkeys(dobj_index.ancestors(data_object)))
+    if ancestors:
+        anc_file_paths = [get_save_file_path(mat_data_folder, ancestor, delimiter=dobj_index.delimiter) for ancestor in ancestors]
+        with span("subset.load_ancestor_variables", subset=subset_name, files=len(anc_file_paths), variables=len(missing_vars)):
+            all_vars.update(zip(ancestors, load_vars(anc_file_paths, missing_vars)))
+
+    # 4. Evaluate the subset conditions for all of the data objects.
+    count("subset.data_objects_evaluated", len(all_data_objects))
+    with span("subset.evaluate", subset=subset_name, vectorized=vectorized):
+        if vectorized:
+            return filter_data_objects_vectorized(subset_conditions, all_data_objects, vars_list, all_vars, dobj_index)
+        return filter_data_objects(predicate, all_data_objects, all_vars, dobj_index)
+
+def get_compiled_subset(subset_name: str, with_conditions: bool = False) -> tuple:
+    """Get the predicate and the list of variables of the subset, compiling its conditions only if they changed since the last call.
+    If with_conditions, the subset's conditions are returned first, from the same compilation."""
+    frozen_conditions = _get_frozen_subset_conditions(subset_name)
+    with _compiled_subsets_lock:
+        compiled_subset = compiled_subsets.get(subset_name)
+        if compiled_subset is None or compiled_subset[3] is not frozen_conditions: # Not the same parsed settings file as last time.
+            subset_conditions = thaw(frozen_conditions)
+            if compiled_subset is not None and compiled_subset[0] == subset_conditions:
+                compiled_subset = compiled_subset[:3] + (frozen_conditions,)
+            else:
+                compiled_subset = (subset_conditions, *compile_conditions(subset_conditions), frozen_conditions)
+            compiled_subsets[subset_name] = compiled_subset
+    return compiled_subset[:3] if with_conditions else compiled_subset[1:3]
+
+def filter_data_objects(predicate, data_objects: list, all_vars: dict, dobj_index: DataObjectIndex) -> list:
+    """Get the data objects that meet the compiled conditions.
+    `all_vars` is a dict of {data object: {variable: value}}. Variables that are not found for a data object are looked up for its ancestors."""
+    return [data_object for data_object in data_objects if predicate(data_object, all_vars.get(data_object) or {}, all_vars, dobj_index)]
 
 def get_subset_conditions(subset_name: str) -> dict:
     """Get the conditions for the subset."""
+    return thaw(_get_frozen_subset_conditions(subset_name))
+
+def _get_frozen_subset_conditions(subset_name: str):
+    """Get the immutable view of the subset's conditions. The index and subset settings files are parsed once through the config cache."""
     folder_path = os.environ[PROJECT_FOLDER_KEY]
-    index_dict = get_package_index_dict(package_folder_path=folder_path)
+    index_dict = config_cache.get_package_index_dict(folder_path)
     subset_settings_path = index_dict[SUBSET_KEY]
-    if isinstance(subset_settings_path, list):
+    if isinstance(subset_settings_path, tuple):
         subset_settings_path = subset_settings_path[0]
     subset_settings_path = subset_settings_path.replace("/", os.sep)
     subset_settings_path = os.path.join(folder_path, subset_settings_path)
-    with open(subset_settings_path, "rb") as f:
-        subset_settings = tomllib.load(f)
+    subset_settings = config_cache.load(subset_settings_path)
     return subset_settings[subset_name]
 
 
-def _meets_conditions(node_id: str, conditions: dict, vr_values: dict, all_data_objects: dict) -> bool:
-    """Check if the node_id meets the conditions."""
+def filter_data_objects_vectorized(conditions, data_objects: list, vars_list: list, all_vars: dict, dobj_index: DataObjectIndex) -> list:
+    """Get the data objects that meet the conditions, evaluating each condition for all data objects at once.
+    Gives the same result as `filter_data_objects` with the compiled conditions."""
+    values, found = get_variables_table(data_objects, vars_list, all_vars, dobj_index)
+    mask = _conditions_mask(conditions, values, found, np.arange(len(data_objects)))
+    return [data_object for data_object, is_in_subset in zip(data_objects, mask) if is_in_subset]
+
+def get_variables_table(data_objects: list, vars_list: list, all_vars: dict, dobj_index: DataObjectIndex) -> tuple:
+    """Get the values of the variables as a table with one row per data object and one column per variable.
+    Variables that are not found for a data object are looked up for its ancestors, from the highest level down.
+    Returns the columns of values as {variable: object array}, and {variable: bool array} of whether each value was found at all.
+    The values are kept as NumPy object arrays rather than a DataFrame so that None is not converted to NaN."""
+    _missing = object()
+    dobj_vars = [all_vars.get(data_object) or {} for data_object in data_objects]
+    values = {}
+    found = {}
+    for vr_id in vars_list:
+        column = [vars.get(vr_id, _missing) for vars in dobj_vars]
+        vr_found = np.array([vr_value is not _missing for vr_value in column], dtype=bool)
+        vr_values = np.empty(len(column), dtype=object) # Filled by slice so that list or array values stay one object per row.
+        vr_values[:] = column
+        missing_idx = np.flatnonzero(~vr_found)
+        from_parent = {} # Parent -> (value, found), so each parent's ancestors are only searched once.
+        fallback = []
+        for row_idx in missing_idx:
+            parent = dobj_index.parent(data_objects[row_idx])
+            if parent not in from_parent:
+                from_parent[parent] = (None, False)
+                for anc_node_id in dobj_index.ancestors(data_objects[row_idx]):
+                    if vr_id in all_vars.get(anc_node_id, {}):
+                        from_parent[parent] = (all_vars[anc_node_id][vr_id], True)
+                        break
+            fallback.append(from_parent[parent])
+        if fallback:
+            fallback_values = np.empty(len(fallback), dtype=object)
+            fallback_values[:] = [value for value, _ in fallback]
+            vr_values[missing_idx] = fallback_values
+            vr_found[missing_idx] = [is_found for _, is_found in fallback]
+        values[vr_id] = vr_values
+        found[vr_id] = vr_found
+    return values, found
+
+def _conditions_mask(conditions, values: dict, found: dict, rows: np.ndarray) -> np.ndarray:
+    """Recursively evaluate the nested "and"/"or" conditions for the given rows of the table at once.
+    Like the compiled predicate, each "and" ("or") condition is only evaluated for the rows that met (did not meet) all of the previous ones,
+    so e.g. a None check guards the comparisons after it. Returns one bool per row in `rows`."""
     if isinstance(conditions, dict):
         if "and" in conditions:
+            mask = np.ones(len(rows), dtype=bool)
             for cond in conditions["and"]:
-                if not _meets_conditions(node_id, cond, vr_values, all_data_objects):
-                    return False
-            return True
+                remaining = np.flatnonzero(mask)
+                if len(remaining) == 0:
+                    break
+                mask[remaining] = _conditions_mask(cond, values, found, rows[remaining])
+            return mask
+        if "or" in conditions:
+            mask = np.zeros(len(rows), dtype=bool)
+            for cond in conditions["or"]:
+                remaining = np.flatnonzero(~mask)
+                if len(remaining) == 0:
+                    break
+                mask[remaining] = _conditions_mask(cond, values, found, rows[remaining])
+            return mask
+        raise ValueError(f"Subset conditions must have an 'and' or 'or' key: {conditions}")
+
+    vr_id = conditions[0]
+    logic = conditions[1]
+    value = _lower(conditions[2])
+    is_found = found[vr_id][rows]
+    mask = np.zeros(len(rows), dtype=bool)
+    if is_found.any():
+        mask[is_found] = _column_mask(values[vr_id][rows[is_found]], logic, value)
+    return mask
+
+def _column_mask(vr_values: np.ndarray, logic: str, value) -> np.ndarray:
+    """Test all of the variable's values against the (lowercased) value in the condition.
+    Columns of only numbers or only strings use NumPy kernels, anything else is tested one value at a time like `_compile_test`."""
+    from pandas.api.types import infer_dtype # pandas is slow to import, and only needed for vectorized subsets.
+    kind = infer_dtype(vr_values, skipna=False)
+    if logic in (">", "<", ">=", "<=", "==", "=", "!="):
+        numbers = _numeric_column(vr_values, kind, value)
+        if numbers is not None:
+            return comparison_operators[logic](numbers, value)
+    if kind == "string":
+        lowered = np.array([vr_value.lower() for vr_value in vr_values], dtype=str)
+        if logic in ("==", "=", "!=") and isinstance(value, str):
+            return comparison_operators[logic](lowered, value)
+        if logic in ("in", "not in") and isinstance(value, list):
+            is_in = np.isin(lowered, [x for x in value if isinstance(x, str)])
+            return is_in if logic == "in" else ~is_in
+        if logic in ("in", "not in") and isinstance(value, str):
+            # Substring of the condition's value.
+            is_in = np.char.find(value, lowered) >= 0
+            return is_in if logic == "in" else ~is_in
+        if logic in ("contains", "not contains") and isinstance(value, str):
+            contains = np.char.find(lowered, value) >= 0
+            return contains if logic == "contains" else ~contains
+    test = _compile_test(logic, value)
+    return np.array([test(vr_value.lower() if isinstance(vr_value, str) else vr_value) for vr_value in vr_values], dtype=bool)
+
+def _numeric_column(vr_values: np.ndarray, kind: str, value) -> np.ndarray:
+    """Get the column as an int64 or float64 array that compares with the value exactly like Python does, or None if it can't.
+    e.g. ints above 2**53 are not converted to float, and ints outside of int64 are left to Python."""
+    if isinstance(value, (bool, np.bool_)) or not isinstance(value, (int, float, np.integer, np.floating)):
+        return None
+    if kind == "integer" and isinstance(value, (int, np.integer)) and _INT64_MIN <= value <= _INT64_MAX:
+        try:
+            return vr_values.astype(np.int64)
+        except OverflowError:
+            return None
+    if kind == "floating" and (isinstance(value, (float, np.floating)) or abs(value) <= _MAX_EXACT_FLOAT_INT):
+        return vr_values.astype(np.float64)
+    return None
+
+def compile_conditions(conditions) -> tuple:
+    """Compile the nested "and"/"or" subset conditions into one predicate, which is called as
+    `predicate(data_object, vr_values, all_vars, dobj_index)` and returns whether the data object meets the conditions.
+    Each condition is a list of [variable, logic, value]. The strings in the values are lowercased once here.
+    Returns the predicate and the list of all of the variables used in the conditions."""
+    vars_list = []
+    predicate = _compile_conditions(conditions, vars_list)
+    return predicate, vars_list
+
+def _compile_conditions(conditions, vars_list: list):
+    """Recursively compile the conditions, adding the variables to vars_list."""
+    if isinstance(conditions, dict):
+        if "and" in conditions:
+            and_predicates = [_compile_conditions(cond, vars_list) for cond in conditions["and"]]
+            return lambda node_id, vr_values, all_vars, dobj_index: all(p(node_id, vr_values, all_vars, dobj_index) for p in and_predicates)
         if "or" in conditions:
-            return any([_meets_conditions(node_id, cond, vr_values, all_data_objects) for cond in conditions["or"]])
-                
-    # Check the condition.
+            or_predicates = [_compile_conditions(cond, vars_list) for cond in conditions["or"]]
+            return lambda node_id, vr_values, all_vars, dobj_index: any(p(node_id, vr_values, all_vars, dobj_index) for p in or_predicates)
+        raise ValueError(f"Subset conditions must have an 'and' or 'or' key: {conditions}")
+
     vr_id = conditions[0]
     logic = conditions[1]
     value = conditions[2]
-    try:
-        vr_value = vr_values[vr_id][node_id]
-        found_attr = True
-    except:            
-        found_attr = False
-        anc_nodes = node_id.split(".")
-        anc_nodes.pop() # Remove the last node
-        for anc_node_id in anc_nodes:
-            try:
-                vr_value = all_data_objects[anc_node_id][vr_id]
-            except:
-                continue
-            found_attr = True
-            break
-    if not found_attr:
-        return False
-    
-    if isinstance(vr_value, str):
-        vr_value = vr_value.lower()
-    if isinstance(value, str):
-        value = value.lower()
-    if isinstance(value, list):
-        value = [x.lower() if isinstance(x, str) else x for x in value]
+    if logic not in logic_options:
+        raise ValueError(f"Invalid subset condition logic: {logic}. Must be one of {logic_options}")
+    if vr_id not in vars_list:
+        vars_list.append(vr_id)
+    test = _compile_test(logic, _lower(value))
 
+    def meets_condition(node_id: str, vr_values: dict, all_vars: dict, dobj_index: DataObjectIndex) -> bool:
+        """Check if the node_id meets this condition.
+        If the variable is not found for the node_id, it is looked up in `all_vars` for each of the node's ancestors in `dobj_index`."""
+        if vr_id in vr_values:
+            vr_value = vr_values[vr_id]
+        else:
+            for anc_node_id in dobj_index.ancestors(node_id):
+                if vr_id in all_vars.get(anc_node_id, {}):
+                    vr_value = all_vars[anc_node_id][vr_id]
+                    break
+            else:
+                return False
+        if isinstance(vr_value, str):
+            vr_value = vr_value.lower()
+        return test(vr_value)
+
+    return meets_condition
+
+def _compile_test(logic: str, value):
+    """Get the function that tests a variable's value against the (lowercased) value in the condition."""
     # This is probably shoddy logic, but it'll serve as a first pass to handle None types.
-    if logic in plural_logic:
-        if logic == "contains" and vr_value is None:
-            return False
-        elif logic == "not contains" and vr_value is None and value is not None:                
-            return True
-        elif logic == "in" and value is None:
-            return False
-        elif logic == "not in" and value is None:
-            return True
-        
-    if not isinstance(vr_value, str) and isinstance(value, str):
-        if logic in ("contains", "not contains"):
-            vr_value = [vr_value]
-        elif logic in ("in", "not in"):
-            value = [value]
-
-    # Numeric
-    bool_val = False
-    if logic == ">" and vr_value > value:
-        bool_val = True
-    elif logic == "<" and vr_value < value:
-        bool_val = True
-    elif logic == ">=" and vr_value >= value:
-        bool_val = True
-    elif logic == "<=" and vr_value <= value:
-        bool_val = True
-    # Any type
-    elif logic in ["==","="] and vr_value == value:
-        bool_val = True
-    elif logic == "!=" and vr_value != value:
-        bool_val = True
-    elif logic == "in" and vr_value in value:
-        bool_val = True
-    elif logic == "not in" and vr_value not in value:
-        bool_val = True
-    elif logic == "is" and vr_value is value:
-        bool_val = True
-    elif logic == "is not" and vr_value is not value:
-        bool_val = True
-    elif logic == "contains" and value in vr_value:
-        bool_val = True
-    elif logic == "not contains" and not value in vr_value:
-        bool_val = True
-
-    return bool_val
\ No newline at end of file
+    if logic == "in" and value is None:
+        return lambda vr_value: False
+    if logic == "not in" and value is None:
+        return lambda vr_value: True
+
+    if logic in ("in", "not in"):
+        is_in = lambda vr_value: vr_value in ([value] if not isinstance(vr_value, str) and isinstance(value, str) else value)
+        if logic == "in":
+            return is_in
+        return lambda vr_value: not is_in(vr_value)
+
+    if logic in ("contains", "not contains"):
+        contains = lambda vr_value: value in ([vr_value] if not isinstance(vr_value, str) and isinstance(value, str) else vr_value)
+        if logic == "contains":
+            return lambda vr_value: vr_value is not None and contains(vr_value)
+        return lambda vr_value: (vr_value is None and value is not None) or not contains(vr_value)
+
+    compare = comparison_operators[logic]
+    return lambda vr_value: bool(compare(vr_value, value))
+
+def _lower(value):
+    """Lowercase the string, or the strings in the list."""
+    if isinstance(value, str):
+        return value.lower()
+    if isinstance(value, list):
+        return [x.lower() if isinstance(x, str) else x for x in value]
+    return value
@@ -1,12 +1,10 @@
 from typing import Any
 import os
 
-import tomli as tomllib
-import json
-
 from ResearchOS.constants import LOAD_CONSTANT_FROM_FILE_KEY, LOGSHEET_VAR_KEY, DATA_FILE_KEY, DATA_OBJECT_NAME_KEY
 from ResearchOS.custom_classes import InputVariable, Constant, DataObjectName, Unspecified, DataFilePath, LoadConstantFromFile, LogsheetVariable
 from ResearchOS.helper_functions import is_dynamic_variable, is_specified
+from ResearchOS.config_cache import load_config, thaw
 
 def classify_input_type(input: Any, package_folder: str = "") -> tuple:
     """Takes in an input from a TOML file and returns the class of the input.
@@ -43,12 +41,7 @@ def classify_input_type(input: Any, package_folder: str = "") -> tuple:
     return Constant, attrs
 
 def load_constant_from_file(file_name: str, package_folder: str) -> Any:
-    """Load a constant from a file."""
+    """Load a constant from a file.
+    The file is only parsed once per process (and again if it changes), the returned value is a copy that can be modified."""
     full_path = os.path.join(package_folder, file_name)
-    if full_path.endswith('.toml'):
-        with open(full_path, 'rb') as f:
-            value = tomllib.load(f)
-    elif full_path.endswith('.json'):
-        with open(full_path, 'rb') as f:
-            value = json.load(f)
-    return value
\ No newline at end of file
+    return thaw(load_config(full_path))
\ No newline at end of file
@@ -0,0 +1,78 @@
+import numpy as np
+
+from ResearchOS.constants import MATLAB_ENG_KEY
+from ResearchOS.tracing import span, count
+
+MAT_LOADERS = ("matlab", "matlab_batch", "scipy")
+
+def load_mat_variables(mat_file_paths: list, vars_list: list, loader: str = "matlab", matlab: dict = None, batch_size: int = None) -> list:
+    """Load the variables from each of the .mat files. Returns a list of {variable: value} dicts, in the same order as the file paths.
+    Files that do not exist, or do not have some of the variables, return a dict with only the variables that were found.
+    Loaders:
+        "matlab": One MATLAB engine call per file (readMatFileSafe.m).
+        "matlab_batch": One MATLAB engine call per batch of `batch_size` files (readMatFilesSafe.m). All files in one call if batch_size is None.
+        "scipy": Read the files in Python with scipy.io.loadmat, without the MATLAB engine.
+            MATLAB v7.3 (HDF5) files are not supported by scipy, so they are loaded with "matlab_batch" if the engine is available."""
+    if loader not in MAT_LOADERS:
+        raise ValueError(f"Invalid .mat file loader: {loader}. Must be one of {MAT_LOADERS}")
+    mat_file_paths = list(mat_file_paths)
+    vars_list = list(vars_list)
+    count("load_mat.files", len(mat_file_paths))
+    if loader == "matlab":
+        matlab_eng = _get_matlab_eng(matlab, loader)
+        with span("matlab.readMatFileSafe", files=len(mat_file_paths)):
+            return [matlab_eng.readMatFileSafe(mat_file_path, vars_list) for mat_file_path in mat_file_paths]
+    if loader == "matlab_batch":
+        return _load_matlab_batch(mat_file_paths, vars_list, _get_matlab_eng(matlab, loader), batch_size)
+
+    all_vars = []
+    hdf5_idx = [] # Index of the files that scipy can't read.
+    with span("load_mat.scipy", files=len(mat_file_paths)):
+        for path_idx, mat_file_path in enumerate(mat_file_paths):
+            try:
+                all_vars.append(load_mat_file_scipy(mat_file_path, vars_list))
+            except NotImplementedError:
+                all_vars.append({})
+                hdf5_idx.append(path_idx)
+    if hdf5_idx:
+        if not matlab:
+            raise ValueError(f"{len(hdf5_idx)} .mat files are MATLAB v7.3 files, which can't be read without the MATLAB engine, e.g. {mat_file_paths[hdf5_idx[0]]}")
+        hdf5_vars = _load_matlab_batch([mat_file_paths[path_idx] for path_idx in hdf5_idx], vars_list, _get_matlab_eng(matlab, loader), batch_size)
+        for path_idx, vars_dict in zip(hdf5_idx, hdf5_vars):
+            all_vars[path_idx] = vars_dict
+    return all_vars
+
+def load_mat_file_scipy(mat_file_path: str, vars_list: list) -> dict:
+    """Load the variables from one .mat file with scipy. Returns an empty dict if the file does not exist.
+    Scalars are returned as Python scalars and char arrays as str, like the MATLAB engine does. Other arrays are returned as NumPy arrays.
+    Raises NotImplementedError for MATLAB v7.3 (HDF5) files."""
+    import scipy.io # scipy is slow to import, and not needed with the MATLAB loaders.
+    try:
+        mat_vars = scipy.io.loadmat(mat_file_path, variable_names=vars_list, simplify_cells=True)
+    except FileNotFoundError:
+        return {}
+    return {vr_name: _to_python(mat_vars[vr_name]) for vr_name in vars_list if vr_name in mat_vars}
+
+def _load_matlab_batch(mat_file_paths: list, vars_list: list, matlab_eng, batch_size: int = None) -> list:
+    """Load the variables from the .mat files with one MATLAB engine call per batch of files."""
+    if not mat_file_paths:
+        return []
+    if batch_size is None:
+        batch_size = len(mat_file_paths)
+    all_vars = []
+    for start_idx in range(0, len(mat_file_paths), batch_size):
+        with span("matlab.readMatFilesSafe", files=len(mat_file_paths[start_idx:start_idx + batch_size])):
+            batch_vars = matlab_eng.readMatFilesSafe(mat_file_paths[start_idx:start_idx + batch_size], vars_list)
+        all_vars.extend([dict(vars_dict) for vars_dict in batch_vars])
+    return all_vars
+
+def _get_matlab_eng(matlab: dict, loader: str):
+    if not matlab:
+        raise ValueError(f"The MATLAB engine is required for the '{loader}' .mat file loader.")
+    return matlab[MATLAB_ENG_KEY]
+
+def _to_python(value):
+    """Convert NumPy scalars and 0-d arrays to Python scalars."""
+    if isinstance(value, np.generic) or (isinstance(value, np.ndarray) and value.ndim == 0):
+        return value.item()
+    return value
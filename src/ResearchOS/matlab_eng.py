@@ -1,30 +1,43 @@
 import sys
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
 
-import networkx as nx
+from ResearchOS.tracing import span
 
-def import_matlab(is_matlab: bool):
-    # Import MATLAB
+if TYPE_CHECKING:
+    import networkx as nx
+
+logger = logging.getLogger(__name__)
+
+def import_matlab(is_matlab: bool, new_session: bool = False):
+    """Import MATLAB and connect to the shared "ResearchOS" session, or start a new one.
+    If new_session, always start a new MATLAB session, e.g. so that each parallel worker has its own engine."""
     if not is_matlab:
         return
     try:
-        if "matlab" in sys.modules:
-            matlab_double_types = (type(None), matlab.double,)
-            matlab_numeric_types = (matlab.double, matlab.single, matlab.int8, matlab.uint8, matlab.int16, matlab.uint16, matlab.int32, matlab.uint32, matlab.int64, matlab.uint64)
-        else:
+        if "matlab.engine" not in sys.modules:
             print("Importing MATLAB engine...")
-            import matlab.engine
-            matlab_double_types = (type(None), matlab.double,)
-            matlab_numeric_types = (matlab.double, matlab.single, matlab.int8, matlab.uint8, matlab.int16, matlab.uint16, matlab.int32, matlab.uint32, matlab.int64, matlab.uint64)
-            try:
-                print("Attempting to connect to an existing shared MATLAB session.")                
-                matlab_eng = matlab.engine.connect_matlab(name = "ResearchOS")
-                print("Successfully connected to the shared 'ResearchOS' MATLAB session.")
-            except:
-                print("Failed to connect. Starting a new MATLAB session.")
-                print("To share an existing session run <matlab.engine.shareEngine('ResearchOS')> in MATLAB's Command Window and leave MATLAB open.")
-                matlab_eng = matlab.engine.start_matlab()
+        import matlab.engine
+        matlab_double_types = (type(None), matlab.double,)
+        matlab_numeric_types = (matlab.double, matlab.single, matlab.int8, matlab.uint8, matlab.int16, matlab.uint16, matlab.int32, matlab.uint32, matlab.int64, matlab.uint64)
     except:
         raise ValueError("Failed to import MATLAB engine.")
+
+    if new_session:
+        matlab_eng = matlab.engine.start_matlab()
+    else:
+        try:
+            print("Attempting to connect to an existing shared MATLAB session.")                
+            matlab_eng = matlab.engine.connect_matlab(name = "ResearchOS")
+            print("Successfully connected to the shared 'ResearchOS' MATLAB session.")
+        except:
+            print("Failed to connect. Starting a new MATLAB session.")
+            print("To share an existing session run <matlab.engine.shareEngine('ResearchOS')> in MATLAB's Command Window and leave MATLAB open.")
+            matlab_eng = matlab.engine.start_matlab()
     
     matlab_output = {
         "matlab_eng": matlab_eng,
@@ -33,6 +46,173 @@ def import_matlab(is_matlab: bool):
     }
     return matlab_output
 
-def check_if_matlab(dag: nx.MultiDiGraph, nodes_to_run: list):
+def check_if_matlab(dag: "nx.MultiDiGraph", nodes_to_run: list):
     """Check if any of the nodes to run require MATLAB."""
-    return any([dag.nodes[node]['node'].language == "matlab" for node in nodes_to_run])
\ No newline at end of file
+    return any([dag.nodes[node]['node'].language == "matlab" for node in nodes_to_run])
+
+class MatlabEnginePool:
+    """Pool of MATLAB engines that are started (or attached to) once, and leased to workers one at a time.
+    Each engine has `addpaths` added and `warm_up(engine)` run once when it starts.
+    An engine is recycled (stopped and replaced) when it no longer responds after a failed lease, or after `max_leases` leases,
+    so that crashed engines and engines leaking memory don't stay in the pool. If its replacement fails to start, the engine is removed
+    from the pool, and once no engines are left leasing raises ValueError instead of waiting.
+    `start_engine()` and `connect_engine(name)` create the engines, by default with matlab.engine. Pass stand-ins to test without MATLAB."""
+
+    def __init__(self, num_engines: int = 1, shared_session_names: list = None, addpaths: list = [], warm_up = None,
+                 max_leases: int = None, start_engine = None, connect_engine = None):
+        if shared_session_names:
+            num_engines = len(shared_session_names)
+        if num_engines < 1:
+            raise ValueError("The MATLAB engine pool must have at least one engine.")
+        self.shared_session_names = shared_session_names
+        self.addpaths = list(addpaths)
+        self.warm_up = warm_up
+        self.max_leases = max_leases
+        self._start_engine = start_engine if start_engine is not None else _start_matlab_engine
+        self._connect_engine = connect_engine if connect_engine is not None else _connect_matlab_engine
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._engines = []
+        self._num_alive = num_engines # Engines that have not failed to restart.
+        for engine_idx in range(num_engines):
+            pooled_engine = _PooledEngine(engine_idx)
+            self._engines.append(pooled_engine)
+            self._start(pooled_engine)
+            self._idle.put(pooled_engine)
+        self._closed = False
+
+    @contextmanager
+    def lease(self, timeout: float = None):
+        """Lease an engine for the duration of the `with` block, waiting up to `timeout` seconds for one to be free.
+        Errors raised in the block are re-raised after the engine is checked, and recycled if it no longer responds."""
+        if self._closed:
+            raise ValueError("The MATLAB engine pool is closed.")
+        if self._num_alive == 0:
+            raise ValueError("All of the pool's MATLAB engines failed to restart.")
+        try:
+            with span("matlab.lease_wait"):
+                pooled_engine = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ValueError(f"No MATLAB engine was free within {timeout} seconds.")
+        if pooled_engine.engine is None:
+            # The last engine failed to restart. Put it back so that the other waiting leases fail too.
+            self._idle.put(pooled_engine)
+            raise ValueError("All of the pool's MATLAB engines failed to restart.")
+        start_time = time.perf_counter()
+        healthy = True
+        error = None
+        try:
+            yield pooled_engine.engine
+        except Exception as e:
+            error = e
+            healthy = _is_engine_alive(pooled_engine.engine)
+            raise
+        finally:
+            self._return(pooled_engine, start_time, healthy, error)
+
+    def utilization(self) -> list:
+        """Get each engine's number of leases, restarts, busy time, and the fraction of the pool's lifetime it was busy."""
+        with self._lock:
+            return [{"engine": pooled_engine.engine_idx,
+                     "leases": pooled_engine.leases,
+                     "restarts": pooled_engine.restarts,
+                     "busy_seconds": pooled_engine.busy_seconds,
+                     "utilization": pooled_engine.busy_seconds / max(time.perf_counter() - pooled_engine.created_at, 1e-9)}
+                    for pooled_engine in self._engines]
+
+    def close(self) -> None:
+        """Stop the idle engines. Leased engines are stopped when they are returned. Shared sessions are disconnected, not stopped."""
+        self._closed = True
+        while True:
+            try:
+                pooled_engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if pooled_engine.engine is not None:
+                _stop_engine(pooled_engine.engine)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start(self, pooled_engine: "_PooledEngine") -> None:
+        """Start or attach to the engine, then add the paths and warm it up. The engine is stopped again if that fails."""
+        if self.shared_session_names:
+            engine = self._connect_engine(self.shared_session_names[pooled_engine.engine_idx])
+        else:
+            engine = self._start_engine()
+        try:
+            for path in self.addpaths:
+                engine.addpath(path)
+            if self.warm_up is not None:
+                self.warm_up(engine)
+        except Exception:
+            _stop_engine(engine)
+            raise
+        pooled_engine.engine = engine
+
+    def _return(self, pooled_engine: "_PooledEngine", start_time: float, healthy: bool, error: Exception = None) -> None:
+        """Put the leased engine back in the pool, recycling it first if needed.
+        If the engine fails to restart, the error is logged (and noted on the lease's error) rather than raised, and the engine is removed from the pool."""
+        with self._lock:
+            pooled_engine.leases += 1
+            pooled_engine.busy_seconds += time.perf_counter() - start_time
+        if not healthy or (self.max_leases is not None and pooled_engine.leases % self.max_leases == 0):
+            try:
+                self._recycle(pooled_engine)
+            except Exception as restart_error:
+                logger.error(f"MATLAB engine {pooled_engine.engine_idx} failed to restart and was removed from the pool: {restart_error!r}")
+                if error is not None and hasattr(error, "add_note"):
+                    error.add_note(f"MATLAB engine {pooled_engine.engine_idx} then failed to restart: {restart_error!r}")
+                with self._lock:
+                    pooled_engine.engine = None
+                    self._num_alive -= 1
+                    if self._num_alive > 0:
+                        return
+                # No engines are left, so wake up the leases that are waiting for one.
+                self._idle.put(pooled_engine)
+                return
+        if self._closed:
+            _stop_engine(pooled_engine.engine)
+        else:
+            self._idle.put(pooled_engine)
+
+    def _recycle(self, pooled_engine: "_PooledEngine") -> None:
+        _stop_engine(pooled_engine.engine)
+        pooled_engine.engine = None
+        pooled_engine.restarts += 1
+        self._start(pooled_engine)
+
+class _PooledEngine:
+    def __init__(self, engine_idx: int):
+        self.engine_idx = engine_idx
+        self.engine = None
+        self.leases = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self.created_at = time.perf_counter()
+
+def _start_matlab_engine():
+    import matlab.engine
+    return matlab.engine.start_matlab()
+
+def _connect_matlab_engine(name: str):
+    import matlab.engine
+    return matlab.engine.connect_matlab(name = name)
+
+def _is_engine_alive(engine) -> bool:
+    """Check that the engine still responds."""
+    try:
+        engine.eval("1;", nargout = 0)
+    except Exception:
+        return False
+    return True
+
+def _stop_engine(engine) -> None:
+    """Stop the engine, ignoring errors from engines that already crashed."""
+    try:
+        engine.quit()
+    except Exception:
+        pass
@@ -1,74 +1,197 @@
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
 import os
-import fcntl  # Use `import msvcrt` on Windows
 import time
+import uuid
+from contextlib import contextmanager, ExitStack
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ResearchOS.tracing import span, count, is_tracing
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows: shared locks are not available, so every lock is exclusive (see `_lock_file_exclusive`).
 
-def locked_write_parquet(file_path: str, df: pd.DataFrame, mode: str = 'w', timeout: float = 10):
+LOCK_FILE_NAME = ".lock"
+LOCK_FILE_EXTENSION = ".lock" # Added to a file's path for the path of its lock file, see `locked_files`.
+FRAGMENT_PREFIX = "part-"
+MIN_LOCK_BACKOFF = 0.001 # Seconds to wait after the first failed attempt to get a lock, doubled after each attempt.
+MAX_LOCK_BACKOFF = 0.1
+
+def locked_write_parquet(file_path: str, df, mode: str = 'w', timeout: float = 10, row_group_size: int = None):
     """
-    Write a DataFrame to a Parquet file with a file lock to prevent concurrent writes.
+    Write a DataFrame or Arrow table to a Parquet store, safely with other processes writing to and reading from it at the same time.
+    The store is a folder of Parquet fragment files. Each write adds one fragment, which is written to a temporary file first and then
+    renamed into place, so readers never see a partially written fragment.
 
     Parameters:
-    - file_path (str): The path to the Parquet file.
-    - df (pd.DataFrame): The DataFrame to write to the Parquet file.
-    - mode (str): The mode in which to open the file ('w' for write, 'a' for append). Default is 'w'.
-    - timeout (int): Timeout in seconds to wait for acquiring the lock. Default is 10 seconds.
+    - file_path (str): The path to the Parquet store folder. A single Parquet file at this path (the store's old layout) is moved into
+        a new store folder as its first fragment.
+    - df (pd.DataFrame or pa.Table): The rows to write.
+    - mode (str): 'w' to replace all of the rows in the store, 'a' to append the rows without rewriting the existing ones. Default is 'w'.
+        Any number of processes can append at once. Replacing waits for the appends and reads in progress to finish.
+    - timeout (float): Timeout in seconds to wait for acquiring the lock. Default is 10 seconds.
+    - row_group_size (int): Maximum number of rows per row group in the fragment. Default is pyarrow's default.
     """
-    start_time = time.time()
-    
-    # Open the file with the desired mode
-    with open(file_path, 'wb' if mode == 'w' else 'ab') as file:
-        while True:
-            try:
-                # Acquire an exclusive lock (LOCK_EX)
-                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                print(f"Lock acquired for writing to {file_path}")
-                
-                # Convert DataFrame to Parquet and write
-                table = pa.Table.from_pandas(df)
-                pq.write_table(table, file_path)
-                
-                fcntl.flock(file, fcntl.LOCK_UN)  # Release the lock
-                print(f"Lock released after writing to {file_path}")
-                break
-            except BlockingIOError:
-                # If the lock is not acquired, wait for a bit and retry
-                if time.time() - start_time > timeout:
-                    raise TimeoutError(f"Could not acquire lock for writing to {file_path} within {timeout} seconds.")
-                print(f"Waiting to acquire lock for writing to {file_path}...")
-                time.sleep(0.1)  # Sleep a bit before retrying
-
-def locked_read_parquet(file_path: str, timeout: float = 10):
+    if mode not in ('w', 'a'):
+        raise ValueError(f"Invalid mode: {mode}. Must be 'w' or 'a'.")
+    table = df if isinstance(df, pa.Table) else pa.Table.from_pandas(df)
+    if not os.path.isdir(file_path):
+        _create_store_folder(file_path, timeout)
+
+    # Write the fragment before getting the lock, so that writers only hold the lock to rename it.
+    tmp_path = os.path.join(file_path, f".tmp-{uuid.uuid4().hex}.parquet")
+    try:
+        pq.write_table(table, tmp_path, row_group_size=row_group_size)
+        count("parquet.rows_written", table.num_rows)
+        if is_tracing():
+            count("parquet.bytes_written", os.path.getsize(tmp_path))
+        with _locked(file_path, exclusive=mode == 'w', timeout=timeout):
+            old_fragments = _list_fragments(file_path) if mode == 'w' else []
+            os.replace(tmp_path, os.path.join(file_path, _new_fragment_name()))
+            for fragment in old_fragments:
+                os.remove(fragment)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def locked_read_parquet(file_path: str, timeout: float = 10, columns: list = None, filters=None):
     """
-    Read data from a Parquet file with a file lock to prevent concurrent reads/writes.
+    Read the rows of a Parquet store, with a shared lock so that the rows are not replaced while they are read.
 
     Parameters:
-    - file_path (str): The path to the Parquet file.
-    - timeout (int): Timeout in seconds to wait for acquiring the lock. Default is 10 seconds.
+    - file_path (str): The path to the Parquet store folder, or a single Parquet file.
+    - timeout (float): Timeout in seconds to wait for acquiring the lock. Default is 10 seconds.
+    - columns (list): The columns to read. Default is all columns.
+    - filters (list or pc.Expression): Only read the rows that match, e.g. [("data_object", "==", "S01,T1")]. Default is all rows.
 
     Returns:
-    - pd.DataFrame: The DataFrame read from the Parquet file.
+    - pd.DataFrame: The rows in the order they were written.
     """
-    start_time = time.time()
-    
-    # Open the file in read mode
-    with open(file_path, 'rb') as file:
+    return read_parquet_store(file_path, timeout=timeout, columns=columns, filters=filters).to_pandas()
+
+def read_parquet_store(file_path: str, timeout: float = 10, columns: list = None, filters=None, memory_map: bool = True) -> pa.Table:
+    """Read the rows of a Parquet store as an Arrow table, in the order they were written. See `locked_read_parquet`.
+    The fragments are memory mapped, so only the pages of the projected columns and the row groups that match the filters are read from disk."""
+    if os.path.isfile(file_path):
+        return pq.read_table(file_path, columns=columns, filters=filters, memory_map=memory_map)
+    if not os.path.isdir(file_path):
+        raise FileNotFoundError(f"No Parquet store at {file_path}")
+    with _locked(file_path, exclusive=False, timeout=timeout):
+        tables = [pq.read_table(fragment, columns=columns, filters=filters, memory_map=memory_map) for fragment in _list_fragments(file_path)]
+    if not tables:
+        raise ValueError(f"The Parquet store at {file_path} is empty.")
+    count("parquet.fragments_read", len(tables))
+    table = pa.concat_tables(tables)
+    count("parquet.rows_read", table.num_rows)
+    return table
+
+def read_parquet_arrays(file_path: str, columns: list, timeout: float = 10, filters=None) -> dict:
+    """Read columns of a Parquet store as NumPy arrays, without converting to pandas.
+    The Parquet pages are decoded into new Arrow buffers. Numeric columns without nulls that are stored in one fragment are then
+    viewed as NumPy arrays without another copy, other columns are copied once more.
+    This is for callers of Parquet stores only: runnables' input variables are loaded from the data objects' .mat files
+    (see `python_runner.load_inputs` and wrapper.m), which already only read the requested variables.
+    Returns {column name: np.ndarray}."""
+    table = read_parquet_store(file_path, timeout=timeout, columns=columns, filters=filters)
+    arrays = {}
+    for column in columns:
+        chunked = table[column]
+        # A single decoded chunk can be viewed without copying it, several chunks have to be concatenated.
+        arrays[column] = chunked.chunk(0).to_numpy(zero_copy_only=False) if chunked.num_chunks == 1 else chunked.to_numpy()
+    return arrays
+
+def compact_parquet_store(file_path: str, timeout: float = 10, row_group_size: int = None) -> None:
+    """Merge all of the store's fragments into one fragment, e.g. after many small appends. Reads and writes wait until it's done."""
+    with _locked(file_path, exclusive=True, timeout=timeout):
+        fragments = _list_fragments(file_path)
+        if len(fragments) <= 1:
+            return
+        table = pa.concat_tables([pq.read_table(fragment) for fragment in fragments])
+        tmp_path = os.path.join(file_path, f".tmp-{uuid.uuid4().hex}.parquet")
+        pq.write_table(table, tmp_path, row_group_size=row_group_size)
+        os.replace(tmp_path, os.path.join(file_path, _new_fragment_name()))
+        for fragment in fragments:
+            os.remove(fragment)
+
+@contextmanager
+def locked_files(file_paths: list, timeout: float = None):
+    """Hold an exclusive lock on each of the files, e.g. the save files of a batch of data objects while they are read, modified and written.
+    Each file's lock is on a lock file next to it, so it works across threads and processes. The locks are taken in sorted order,
+    so holders of overlapping lists of files can't deadlock. Waits up to `timeout` seconds for each lock, or as long as it takes if None."""
+    with ExitStack() as stack:
+        for file_path in sorted(set(file_paths)):
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            stack.enter_context(_locked_path(file_path + LOCK_FILE_EXTENSION, exclusive=True, timeout=timeout))
+        yield
+
+def _create_store_folder(file_path: str, timeout: float) -> None:
+    """Create the store folder at file_path. A single Parquet file at file_path (the store's old layout) becomes the new store's first fragment.
+    The folder is only renamed into place once it has the fragment, and writers that don't find the folder wait for the one creating it."""
+    with _locked_path(file_path + LOCK_FILE_EXTENSION, exclusive=True, timeout=timeout):
+        if os.path.isdir(file_path):
+            return # Created by another writer.
+        if not os.path.isfile(file_path):
+            os.makedirs(file_path, exist_ok=True)
+            return
+        tmp_folder = f"{file_path}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp_folder)
+        os.replace(file_path, os.path.join(tmp_folder, _new_fragment_name()))
+        os.rename(tmp_folder, file_path)
+
+def _new_fragment_name() -> str:
+    """Fragment names sort in the order they were written."""
+    return f"{FRAGMENT_PREFIX}{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+
+def _list_fragments(folder: str) -> list:
+    return [os.path.join(folder, file_name) for file_name in sorted(os.listdir(folder)) if file_name.startswith(FRAGMENT_PREFIX) and file_name.endswith(".parquet")]
+
+def _locked(folder: str, exclusive: bool, timeout: float):
+    """Hold a shared or exclusive lock on the folder's lock file. Waits with exponential backoff, up to `timeout` seconds."""
+    return _locked_path(os.path.join(folder, LOCK_FILE_NAME), exclusive, timeout)
+
+@contextmanager
+def _locked_path(lock_path: str, exclusive: bool, timeout: float):
+    if fcntl is None:
+        with _lock_file_exclusive(lock_path, timeout):
+            yield
+        return
+    with open(lock_path, 'a') as lock_file:
+        _wait_for_lock(lambda: fcntl.flock(lock_file, (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB), lock_path, timeout)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+@contextmanager
+def _lock_file_exclusive(lock_path: str, timeout: float):
+    """Exclusive lock for platforms without fcntl: the lock is held by whoever creates the lock file."""
+    lock_file_path = lock_path + ".held"
+    def acquire():
+        os.close(os.open(lock_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    _wait_for_lock(acquire, lock_path, timeout, exceptions=(FileExistsError,))
+    try:
+        yield
+    finally:
+        os.remove(lock_file_path)
+
+def _wait_for_lock(acquire, lock_path: str, timeout: float, exceptions: tuple = (BlockingIOError,)) -> None:
+    try:
+        acquire()
+        return
+    except exceptions:
+        pass
+    count("lock.waits") # Only contended locks are timed.
+    with span("lock.wait", lock=lock_path):
+        start_time = time.monotonic()
+        backoff = MIN_LOCK_BACKOFF
         while True:
+            if timeout is not None and time.monotonic() - start_time > timeout:
+                raise TimeoutError(f"Could not acquire lock {lock_path} within {timeout} seconds.")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, MAX_LOCK_BACKOFF)
             try:
-                # Acquire a shared lock (LOCK_SH)
-                fcntl.flock(file, fcntl.LOCK_SH | fcntl.LOCK_NB)
-                print(f"Lock acquired for reading from {file_path}")
-                
-                # Read Parquet data into a DataFrame
-                df = pd.read_parquet(file_path)
-                
-                fcntl.flock(file, fcntl.LOCK_UN)  # Release the lock
-                print(f"Lock released after reading from {file_path}")
-                return df
-            except BlockingIOError:
-                # If the lock is not acquired, wait for a bit and retry
-                if time.time() - start_time > timeout:
-                    raise TimeoutError(f"Could not acquire lock for reading from {file_path} within {timeout} seconds.")
-                print(f"Waiting to acquire lock for reading from {file_path}...")
-                time.sleep(0.1)  # Sleep a bit before retrying
+                acquire()
+                return
+            except exceptions:
+                pass
@@ -0,0 +1,233 @@
+import os
+import json
+import shutil
+import hashlib
+from urllib.parse import unquote
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from ResearchOS.data_object_index import DATA_OBJECT_DELIMITER
+
+LOGSHEET_DATASET_NAME = "logsheet_data_objects" # Folder name of the logsheet's dataset in the save folder.
+DEFAULT_ROW_GROUP_SIZE = 10000
+FINGERPRINTS_FILE_NAME = "_fingerprints.json" # Files starting with "_" are ignored when reading the dataset.
+HEADER_TYPES_TO_ARROW = {"str": pa.string(), "num": pa.float64(), "bool": pa.bool_()}
+
+def save_data_objects(dataset_path: str, all_attrs: dict, factors: list, column_hashes: dict, delimiter: str = DATA_OBJECT_DELIMITER, incremental: bool = False, schema: pa.Schema = None, row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> tuple:
+    """Save the data objects' attributes to the Parquet dataset.
+    If incremental, the data objects are compared to the previous save using their fingerprints, and only the partitions with
+    created, modified or deleted data objects are rewritten. Otherwise the whole dataset is rewritten.
+    Returns the lists of created, modified and deleted data object names, compared to the previous save."""
+    fingerprints = get_data_object_fingerprints(all_attrs, column_hashes)
+    table = data_objects_to_table(all_attrs, factors, column_hashes, delimiter=delimiter, schema=schema)
+    return save_data_objects_table(dataset_path, table, factors, fingerprints, delimiter=delimiter, incremental=incremental, row_group_size=row_group_size)
+
+def save_data_objects_table(dataset_path: str, table: pa.Table, factors: list, fingerprints: dict, delimiter: str = DATA_OBJECT_DELIMITER, incremental: bool = False, row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> tuple:
+    """Like `save_data_objects`, for data objects that are already in a table like the one from `data_objects_to_table`, with their fingerprints."""
+    prev_fingerprints = read_fingerprints(dataset_path)
+    created, modified, deleted = diff_fingerprints(prev_fingerprints, fingerprints)
+
+    if incremental and prev_fingerprints and _get_dataset_types(dataset_path, factors) == _get_table_types(table):
+        changed_partitions = set([dobj.split(delimiter)[0] for dobj in created + modified + deleted])
+        table = table.filter(pc.is_in(table[factors[0]], value_set=pa.array(sorted(changed_partitions), type=pa.string())))
+        deleted_partitions = set([dobj for dobj in deleted if delimiter not in dobj]) # Deleted top level data objects leave an empty partition.
+        _remove_partitions(dataset_path, deleted_partitions)
+    elif os.path.exists(dataset_path):
+        shutil.rmtree(dataset_path)
+
+    if table.num_rows > 0:
+        write_data_objects_dataset(dataset_path, table, factors, row_group_size=row_group_size)
+    write_fingerprints(dataset_path, fingerprints)
+    return created, modified, deleted
+
+class DataObjectsDatasetWriter:
+    """Write the data objects to the Parquet dataset one partition (highest level data object) at a time.
+    This lets the logsheet import be streamed: only the partitions that have not been written yet need to be kept in memory.
+    If incremental, partitions whose data objects all have the same fingerprints as in the previous save are not rewritten."""
+
+    def __init__(self, dataset_path: str, factors: list, column_hashes: dict, column_levels: dict, schema: pa.Schema, delimiter: str = DATA_OBJECT_DELIMITER, incremental: bool = False, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        self.dataset_path = dataset_path
+        self.factors = factors
+        self.column_hashes = column_hashes
+        self.column_levels = column_levels # Column name -> level index of the data objects that the column belongs to.
+        self.schema = schema
+        self.delimiter = delimiter
+        self.row_group_size = row_group_size
+        self.prev_fingerprints = read_fingerprints(dataset_path)
+        self.incremental = incremental and _get_dataset_types(dataset_path, factors) == _get_table_types(schema)
+        if not self.incremental and os.path.exists(dataset_path):
+            shutil.rmtree(dataset_path)
+        self.prev_partition_fingerprints = {}
+        for dobj, fingerprint in self.prev_fingerprints.items():
+            partition = dobj.split(delimiter)[0]
+            if partition not in self.prev_partition_fingerprints:
+                self.prev_partition_fingerprints[partition] = {}
+            self.prev_partition_fingerprints[partition][dobj] = fingerprint
+        self.partition_fingerprints = {} # Partition -> fingerprints of the data objects written in that partition.
+
+    def write_partition(self, partition: str, all_attrs: dict) -> None:
+        """Write all of the data objects in one partition, replacing the partition if it exists."""
+        fingerprints = get_data_object_fingerprints(all_attrs, self.column_hashes)
+        self.partition_fingerprints[partition] = fingerprints
+        if self.incremental and fingerprints == self.prev_partition_fingerprints.get(partition):
+            return
+        table = data_objects_to_table(all_attrs, self.factors, self.column_hashes, delimiter=self.delimiter, schema=self.schema)
+        write_data_objects_dataset(self.dataset_path, table, self.factors, row_group_size=self.row_group_size)
+
+    def is_written(self, partition: str) -> bool:
+        return partition in self.partition_fingerprints
+
+    def read_partition(self, partition: str) -> dict:
+        """Read a written partition back, e.g. to add rows to it. It must be written again afterwards.
+        Returns the data objects' attributes in the same form as they were written."""
+        del self.partition_fingerprints[partition]
+        dataset = open_data_objects_dataset(self.dataset_path, self.factors)
+        table = dataset.to_table(filter=pc.field(self.factors[0]) == partition)
+        all_attrs = {}
+        for row in table.to_pylist():
+            components = [row[factor] for factor in self.factors if row[factor] is not None]
+            level_idx = len(components) - 1
+            all_attrs[self.delimiter.join(components)] = {column: row[hash] for column, hash in self.column_hashes.items() if self.column_levels[column] == level_idx}
+        return all_attrs
+
+    def close(self) -> tuple:
+        """Remove the partitions that were not written, and save the fingerprints.
+        Returns the lists of created, modified and deleted data object names."""
+        fingerprints = {}
+        for partition_fingerprints in self.partition_fingerprints.values():
+            fingerprints.update(partition_fingerprints)
+        _remove_partitions(self.dataset_path, set([partition for partition in self.prev_partition_fingerprints if partition not in self.partition_fingerprints]))
+        write_fingerprints(self.dataset_path, fingerprints)
+        return diff_fingerprints(self.prev_fingerprints, fingerprints)
+
+def get_data_objects_schema(factors: list, column_hashes: dict, column_types: dict) -> pa.Schema:
+    """Get the schema of the dataset from the logsheet's header types ("str", "num" or "bool") of each column."""
+    fields = [(factor, pa.string()) for factor in factors]
+    fields.extend([(hash, HEADER_TYPES_TO_ARROW[column_types[column]]) for column, hash in column_hashes.items()])
+    return pa.schema(fields)
+
+def get_data_object_fingerprints(all_attrs: dict, column_hashes: dict) -> dict:
+    """Get a fingerprint of each data object's attributes.
+    The output variable hashes are part of the fingerprint, so changing a logsheet column's settings changes the fingerprint too."""
+    fingerprints = {}
+    for dobj, attrs in all_attrs.items():
+        items = sorted([(column_hashes[column], repr(value)) for column, value in attrs.items()])
+        fingerprints[dobj] = hashlib.sha256(json.dumps(items).encode()).hexdigest()
+    return fingerprints
+
+def get_data_objects_table_fingerprints(table: pa.Table, factors: list, column_hashes: dict, column_levels: dict, delimiter: str = DATA_OBJECT_DELIMITER, batch_size: int = DEFAULT_ROW_GROUP_SIZE) -> dict:
+    """Get the same fingerprints as `get_data_object_fingerprints`, from a table like the one from `data_objects_to_table`.
+    The table is converted to Python values one batch of rows at a time."""
+    level_hashes = [[hash for column, hash in column_hashes.items() if column_levels[column] == level_idx] for level_idx in range(len(factors))]
+    fingerprints = {}
+    for batch in table.to_batches(max_chunksize=batch_size):
+        values = batch.to_pydict()
+        for row_idx in range(batch.num_rows):
+            components = [values[factor][row_idx] for factor in factors if values[factor][row_idx] is not None]
+            items = sorted([(hash, repr(values[hash][row_idx])) for hash in level_hashes[len(components) - 1]])
+            fingerprints[delimiter.join(components)] = hashlib.sha256(json.dumps(items).encode()).hexdigest()
+    return fingerprints
+
+def diff_fingerprints(prev_fingerprints: dict, fingerprints: dict) -> tuple:
+    """Compare the data objects' fingerprints to the previous ones.
+    Returns the sorted lists of created, modified and deleted data object names."""
+    created = sorted([dobj for dobj in fingerprints if dobj not in prev_fingerprints])
+    modified = sorted([dobj for dobj in fingerprints if dobj in prev_fingerprints and fingerprints[dobj] != prev_fingerprints[dobj]])
+    deleted = sorted([dobj for dobj in prev_fingerprints if dobj not in fingerprints])
+    return created, modified, deleted
+
+def read_fingerprints(dataset_path: str) -> dict:
+    """Read the fingerprints of the last save of the dataset. Returns an empty dict if there are none."""
+    fingerprints_path = os.path.join(dataset_path, FINGERPRINTS_FILE_NAME)
+    if not os.path.exists(fingerprints_path):
+        return {}
+    with open(fingerprints_path, "r") as f:
+        return json.load(f)
+
+def write_fingerprints(dataset_path: str, fingerprints: dict) -> None:
+    """Write the fingerprints of the data objects in the dataset."""
+    os.makedirs(dataset_path, exist_ok=True)
+    with open(os.path.join(dataset_path, FINGERPRINTS_FILE_NAME), "w") as f:
+        json.dump(fingerprints, f)
+
+def data_objects_to_table(all_attrs: dict, factors: list, column_hashes: dict, delimiter: str = DATA_OBJECT_DELIMITER, schema: pa.Schema = None) -> pa.Table:
+    """Convert the data objects' attributes to one table, with one row per data object.
+    There is one string column per factor of the schema (null below the data object's level), and one column per output variable hash.
+    The rows are sorted by data object so that each row group covers a narrow range of data objects."""
+    dobj_names = sorted(all_attrs.keys())
+    factor_values = {factor: [] for factor in factors}
+    hash_values = {hash: [] for hash in column_hashes.values()}
+    for dobj in dobj_names:
+        components = dobj.split(delimiter)
+        for level_idx, factor in enumerate(factors):
+            factor_values[factor].append(components[level_idx] if level_idx < len(components) else None)
+        attrs = all_attrs[dobj]
+        for column, hash in column_hashes.items():
+            hash_values[hash].append(attrs.get(column))
+
+    arrays = {factor: pa.array(values, type=pa.string()) for factor, values in factor_values.items()}
+    for hash, values in hash_values.items():
+        arrays[hash] = pa.array(values) if schema is None else pa.array(values, type=schema.field(hash).type)
+    return pa.table(arrays, schema=schema)
+
+def write_data_objects_dataset(dataset_path: str, table: pa.Table, factors: list, row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> None:
+    """Write the table of data objects as one Parquet dataset, partitioned by the highest level factor (e.g. one folder per Subject).
+    Partitions that are in the table replace the existing partitions with the same name, other existing partitions are left as is."""
+    os.makedirs(dataset_path, exist_ok=True)
+    ds.write_dataset(table, dataset_path, format="parquet",
+                     partitioning=_get_partitioning(factors),
+                     basename_template="part-{i}.parquet",
+                     min_rows_per_group=min(row_group_size, max(table.num_rows, 1)),
+                     max_rows_per_group=row_group_size,
+                     max_partitions=max(pc.count_distinct(table[factors[0]]).as_py(), 1), # pyarrow's default is 1024.
+                     existing_data_behavior="delete_matching")
+
+def read_data_object(dataset_path: str, data_object: str, factors: list, delimiter: str = DATA_OBJECT_DELIMITER, columns: list = None) -> dict:
+    """Read the attributes of one data object from the dataset.
+    Only the data object's partition is opened, and row groups are skipped using the factor columns' statistics.
+    Returns a dict of {column name: value}, or an empty dict if the data object is not in the dataset."""
+    components = data_object.split(delimiter)
+    dobj_filter = None
+    for level_idx, factor in enumerate(factors):
+        if level_idx < len(components):
+            factor_filter = pc.field(factor) == components[level_idx]
+        else:
+            factor_filter = pc.field(factor).is_null()
+        dobj_filter = factor_filter if dobj_filter is None else dobj_filter & factor_filter
+    dataset = open_data_objects_dataset(dataset_path, factors)
+    table = dataset.to_table(columns=columns, filter=dobj_filter)
+    if table.num_rows == 0:
+        return {}
+    return {name: values[0] for name, values in table.to_pydict().items()}
+
+def open_data_objects_dataset(dataset_path: str, factors: list) -> ds.Dataset:
+    """Open the Parquet dataset of data objects. The files are memory mapped, so reading a few columns of a few data objects only reads those pages."""
+    return ds.dataset(dataset_path, format="parquet", partitioning=_get_partitioning(factors), filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+def _get_partitioning(factors: list) -> ds.Partitioning:
+    """Partition by the highest level factor. The partition values are always strings, even if they look like numbers."""
+    return ds.partitioning(pa.schema([(factors[0], pa.string())]), flavor="hive")
+
+def _remove_partitions(dataset_path: str, partition_values: set) -> None:
+    """Remove the partition folders (e.g. `Subject=S1`) of the given partition values."""
+    if not partition_values or not os.path.exists(dataset_path):
+        return
+    for folder_name in os.listdir(dataset_path):
+        if "=" in folder_name and unquote(folder_name.split("=", 1)[1]) in partition_values:
+            shutil.rmtree(os.path.join(dataset_path, folder_name))
+
+def _get_dataset_types(dataset_path: str, factors: list) -> dict:
+    """Get the column types of the existing dataset, or None if there is no dataset to compare to."""
+    try:
+        schema = open_data_objects_dataset(dataset_path, factors).schema
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    return {field.name: field.type for field in schema}
+
+def _get_table_types(table) -> dict:
+    """Get the column types of a table or schema."""
+    schema = table if isinstance(table, pa.Schema) else table.schema
+    return {field.name: field.type for field in schema}
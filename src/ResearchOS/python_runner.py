@@ -0,0 +1,169 @@
+import os
+import sys
+import threading
+import importlib
+import importlib.util
+
+import numpy as np
+
+from ResearchOS.tracing import span, count
+
+BATCHED_ATTR = "__researchos_batched__"
+
+_functions = {} # Function path -> imported function, so each function is only imported once per process.
+_file_modules = {} # Absolute file path -> module imported from that file, so each file is only run once.
+_functions_lock = threading.Lock()
+
+def batched(fcn):
+    """Decorator for Python runnables that can process many data objects in one call.
+    The batched function is called with each input stacked over the data objects: a NumPy array with one row per data object
+    if the inputs are numbers or same-shape arrays, otherwise a list. It must return each output stacked the same way."""
+    setattr(fcn, BATCHED_ATTR, True)
+    return fcn
+
+def is_batched(fcn) -> bool:
+    return getattr(fcn, BATCHED_ATTR, False)
+
+def import_function(function_path: str):
+    """Import the runnable's function once per process.
+    `function_path` is the function's dotted import path (e.g. "my_package.processes.filter_data"),
+    or a Python file and the function name separated by a colon (e.g. "src/processes.py:filter_data")."""
+    with _functions_lock:
+        if function_path in _functions:
+            return _functions[function_path]
+        if ":" in function_path and function_path.rsplit(":", 1)[0].endswith(".py"):
+            file_path, fcn_name = function_path.rsplit(":", 1)
+            module = _import_file(os.path.abspath(file_path))
+        else:
+            module_name, _, fcn_name = function_path.rpartition(".")
+            if not module_name:
+                raise ValueError(f"The Python runnable's function must include its module, e.g. my_package.module.function, not: {function_path}")
+            module = importlib.import_module(module_name)
+        if not hasattr(module, fcn_name):
+            raise ValueError(f"The Python runnable's function {fcn_name} was not found in {module.__name__}")
+        _functions[function_path] = getattr(module, fcn_name)
+        return _functions[function_path]
+
+def _import_file(file_path: str):
+    if file_path not in _file_modules:
+        module_name = f"_researchos_runnable_{len(_file_modules)}_" + os.path.splitext(os.path.basename(file_path))[0]
+        spec = importlib.util.spec_from_file_location(module_name, file_path)
+        if spec is None:
+            raise ValueError(f"Could not import the Python runnable's file: {file_path}")
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        _file_modules[file_path] = module
+    return _file_modules[file_path]
+
+def run_python_batch(fcn, data_objects: list, inputs: list, output_names: list, batch_size: int = None) -> list:
+    """Run the function for each data object, in this process.
+    `inputs` is one {input name: value} dict per data object. Batched functions (see `batched`) are called once per `batch_size` data objects
+    (all at once if None), other functions once per data object.
+    Returns one dict per data object, in order: {"data_object": str, "result": {output name: value} or None, "error": str or None}.
+    If a batched call fails, all of the data objects in that batch fail with its error."""
+    if not is_batched(fcn):
+        results = []
+        for data_object, dobj_inputs in zip(data_objects, inputs):
+            try:
+                with span("python.call"):
+                    outputs = _to_output_dict(fcn(**dobj_inputs), output_names)
+            except Exception as e:
+                results.append({"data_object": data_object, "result": None, "error": f"{type(e).__name__}: {e}"})
+                continue
+            results.append({"data_object": data_object, "result": outputs, "error": None})
+        count("python.calls", len(data_objects))
+        return results
+
+    if batch_size is None:
+        batch_size = max(len(data_objects), 1)
+    results = []
+    for start_idx in range(0, len(data_objects), batch_size):
+        batch_data_objects = data_objects[start_idx:start_idx + batch_size]
+        try:
+            with span("python.batched_call", data_objects=len(batch_data_objects)):
+                stacked_outputs = _to_output_dict(fcn(**stack_inputs(inputs[start_idx:start_idx + batch_size])), output_names)
+            all_outputs = unstack_outputs(stacked_outputs, len(batch_data_objects))
+        except Exception as e:
+            results.extend([{"data_object": data_object, "result": None, "error": f"{type(e).__name__}: {e}"} for data_object in batch_data_objects])
+            continue
+        results.extend([{"data_object": data_object, "result": outputs, "error": None} for data_object, outputs in zip(batch_data_objects, all_outputs)])
+        count("python.calls")
+    return results
+
+def stack_inputs(inputs: list) -> dict:
+    """Stack each input over the data objects: {input name: stacked values}, from one {input name: value} dict per data object.
+    Numbers and arrays of the same shape are stacked into one array with one row per data object, other values into a list."""
+    if not inputs:
+        return {}
+    stacked = {}
+    for input_name in inputs[0]:
+        values = [dobj_inputs[input_name] for dobj_inputs in inputs]
+        stacked[input_name] = _stack(values)
+    return stacked
+
+def unstack_outputs(stacked_outputs: dict, num_data_objects: int) -> list:
+    """Split each stacked output back into one value per data object. Returns one {output name: value} dict per data object."""
+    all_outputs = [{} for _ in range(num_data_objects)]
+    for output_name, stacked in stacked_outputs.items():
+        if not isinstance(stacked, (np.ndarray, list, tuple)) or len(stacked) != num_data_objects:
+            raise ValueError(f"The batched function's output {output_name} must have one row per data object ({num_data_objects})")
+        for outputs, value in zip(all_outputs, stacked):
+            outputs[output_name] = value
+    return all_outputs
+
+def load_inputs(save_file_paths: list, input_vars: dict, constants: dict = {}) -> list:
+    """Load the input variables of each data object from its save file.
+    `input_vars` is {input name: variable name in the save file}, `constants` is {input name: value} for inputs that are the same for every data object.
+    Returns one {input name: value} dict per save file. Raises ValueError if a variable is not in a data object's file."""
+    from ResearchOS.load_mat import load_mat_variables
+    var_names = list(dict.fromkeys(input_vars.values()))
+    all_vars = load_mat_variables(save_file_paths, var_names, loader="scipy") if var_names else [{} for _ in save_file_paths]
+    inputs = []
+    for save_file_path, file_vars in zip(save_file_paths, all_vars):
+        missing = [var_name for var_name in var_names if var_name not in file_vars]
+        if missing:
+            raise ValueError(f"Input variables {missing} not found in {save_file_path}")
+        dobj_inputs = {input_name: file_vars[var_name] for input_name, var_name in input_vars.items()}
+        dobj_inputs.update(constants)
+        inputs.append(dobj_inputs)
+    return inputs
+
+def save_outputs(save_file_path: str, outputs: dict) -> None:
+    """Save the output variables to the data object's save file, keeping the other variables in it.
+    The file is locked while it's read and written, so nodes running at the same time don't overwrite each other's variables.
+    The new file is written to a temporary file first and then renamed into place, so a failed save never leaves a partial file.
+    Raises ValueError for MATLAB v7.3 (HDF5) save files, which scipy can't read or write."""
+    import scipy.io
+    from ResearchOS.parallelization import locked_files
+    with locked_files([save_file_path]):
+        mat_vars = {}
+        if os.path.exists(save_file_path):
+            try:
+                mat_vars = {name: value for name, value in scipy.io.loadmat(save_file_path).items() if not name.startswith("__")}
+            except NotImplementedError:
+                raise ValueError(f"Can't save the Python runnable's outputs to a MATLAB v7.3 file, because scipy can't read or write them: {save_file_path}")
+        mat_vars.update(outputs)
+        tmp_path = f"{save_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                scipy.io.savemat(f, mat_vars)
+            os.replace(tmp_path, save_file_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+def _to_output_dict(returned, output_names: list) -> dict:
+    """Name the returned values in the order of the output names, like the outputs of a MATLAB function."""
+    if len(output_names) == 1:
+        return {output_names[0]: returned}
+    if not isinstance(returned, tuple) or len(returned) != len(output_names):
+        raise ValueError(f"The function must return {len(output_names)} outputs: {output_names}")
+    return dict(zip(output_names, returned))
+
+def _stack(values: list):
+    if all(isinstance(value, (int, float, bool, np.number, np.bool_)) for value in values):
+        return np.array(values)
+    if all(isinstance(value, np.ndarray) for value in values) and len(set(value.shape for value in values)) == 1:
+        return np.stack(values)
+    return values
@@ -0,0 +1,28 @@
+function [all_vars] = readMatFilesSafe(mat_file_paths, vars_list)
+
+%% PURPOSE: LOAD THE SPECIFIED VARIABLES FROM MANY .MAT FILES IN ONE CALL, SO THAT ONLY ONE ROUND TRIP TO THE ENGINE IS NEEDED.
+% Returns a cell array with one struct per file, in the same order as the file paths.
+% Files that do not exist, cannot be read, or do not have some of the variables return a struct with only the variables that were found.
+
+if ischar(mat_file_paths)
+    mat_file_paths = {mat_file_paths};
+end
+if ischar(vars_list)
+    vars_list = {vars_list};
+end
+
+all_vars = cell(1, length(mat_file_paths));
+warning('off', 'MATLAB:load:variableNotFound');
+for i = 1:length(mat_file_paths)
+    mat_file_path = char(mat_file_paths{i});
+    all_vars{i} = struct();
+    if ~isfile(mat_file_path)
+        continue;
+    end
+    try
+        all_vars{i} = load(mat_file_path, vars_list{:});
+    catch
+        % Leave the struct empty if the file cannot be read.
+    end
+end
+warning('on', 'MATLAB:load:variableNotFound');
@@ -3,12 +3,12 @@ import csv
 import time
 import os
 import uuid
-from typing import Any
+from typing import Any, Iterator, TYPE_CHECKING
 import builtins
 import math
+from concurrent.futures import Executor, ProcessPoolExecutor
 
 import tomli as tomllib
-import networkx as nx
 
 from ResearchOS.constants import DATASET_SCHEMA_KEY, DATASET_KEY, LOGSHEET_NAME, SAVE_DATA_FOLDER_KEY, DATASET_FILE_SCHEMA_KEY, PACKAGE_SETTINGS_KEY
 from ResearchOS.custom_classes import Logsheet, OutputVariable
@@ -16,8 +16,16 @@ from ResearchOS.validation_classes import RunnableFactory
 from ResearchOS.helper_functions import get_package_setting
 from ResearchOS.hash_dag import hash_node
 from ResearchOS.create_dag_from_toml import get_package_index_dict
-from ResearchOS.parallelization import locked_write_parquet
+from ResearchOS.data_object_index import DataObjectIndex
+from ResearchOS.tracing import span, traced, count
 
+if TYPE_CHECKING:
+    import pyarrow as pa
+    from ResearchOS.parquet_dataset import DataObjectsDatasetWriter
+
+LOGSHEET_BACKENDS = ("python", "arrow")
+
+@traced("logsheet.read_csv")
 def _read_and_clean_logsheet(logsheet_path: str, nrows: int = None, delimiter: str = ",") -> list:
         """Read the logsheet (CSV only) and clean it.
         If nrows is provided, only read the first nrows rows."""
@@ -45,42 +53,75 @@ def _read_and_clean_logsheet(logsheet_path: str, nrows: int = None, delimiter: s
             logsheet[0][0] = logsheet[0][0][len(first_elem_prefix):]
         return logsheet
 
-def read_logsheet(project_folder: str = None, logsheet_toml_path: str = None, delimiter: str = ",") -> None:
+@traced("read_logsheet")
+def read_logsheet(project_folder: str = None, logsheet_toml_path: str = None, delimiter: str = ",", backend: str = "python", incremental: bool = False, chunk_size: int = None, workers: int = 1) -> DataObjectIndex:
     """Run the logsheet import process.
+
+    Args:
+        backend: "python" to parse the CSV with the built-in csv module, or "arrow" to read it straight into typed columns with pyarrow.
+            The "arrow" backend falls back to "python" if pyarrow is not installed or can't parse the file.
+        incremental: if True, only the Data Objects that were created, modified or deleted since the last import are rewritten.
+        chunk_size: if provided, stream the logsheet chunk_size rows at a time with the csv module (for logsheets larger than memory).
+            Each highest level Data Object is saved once a chunk starts with a different one, so memory use is bounded by the number
+            of Data Objects rather than the number of rows. Works best when the rows are grouped by the highest level factor.
+            The saved Data Objects and any conflicting values' error are the same as without chunks.
+        workers: if more than 1, split the rows into this many chunks that are cleaned and assigned in parallel in a pool of processes.
+            The results are the same as with 1 worker, errors included. Only pays off for large logsheets with spare cores.
     
     Returns:
-        None
+        DataObjectIndex: the data objects in the logsheet, e.g. `Subject1.Trial1`, which can be reused e.g. for subsets and batches.
     
     Raises:
         ValueError: more header rows than logsheet rows or incorrect schema format?"""
     logsheet_start_time = time.time()
 
+    if backend not in LOGSHEET_BACKENDS:
+        raise ValueError(f"Invalid logsheet backend: {backend}. Must be one of {LOGSHEET_BACKENDS}")
+    if workers < 1:
+        raise ValueError(f"The number of workers must be at least 1, not {workers}")
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError(f"The chunk size must be at least 1 row, not {chunk_size}")
+
     if not project_folder:
         project_folder = os.getcwd()
 
+    # pyarrow and networkx are slow to import, so they're only imported once a logsheet is actually read.
+    import networkx as nx
+    from ResearchOS.parquet_dataset import LOGSHEET_DATASET_NAME, DataObjectsDatasetWriter, save_data_objects, save_data_objects_table, get_data_objects_schema, get_data_objects_table_fingerprints
+
     # 2. Get the logsheet object
     logsheet_dict = get_logsheet_dict(project_folder, logsheet_toml_path) 
     logsheet_path = logsheet_dict['path']  
     num_header_rows = logsheet_dict['num_header_rows']    
     dataset_factors = logsheet_dict['dataset_factors']
-
-    # 1. Read the logsheet file (using built-in Python libraries)
-    full_logsheet = _read_and_clean_logsheet(logsheet_path, delimiter=delimiter)    
-
-    if len(full_logsheet) < num_header_rows:
-        raise ValueError("The number of header rows is greater than the number of rows in the logsheet!")
-    elif len(full_logsheet) == num_header_rows:
-        logsheet = []
-    else:
-        logsheet = full_logsheet[num_header_rows:]
-    
-    # For each row, connect instances of the appropriate DataObject subclass to all other instances of appropriate DataObject subclasses.
-    headers_in_logsheet = [f.lower() for f in full_logsheet[0]]
     var_names = [h for h in logsheet_dict['headers'].keys()]
     num_columns = len(var_names)
     header_names = [h["column_name"] for h in logsheet_dict['headers'].values()]
     header_types = [h["type"] for h in logsheet_dict['headers'].values()]
     header_levels = [h["level"] for h in logsheet_dict['headers'].values()]
+
+    # 1. Read the logsheet file (in chunks of rows if streaming). The cells are cleaned in one pass with the assignment below.
+    table = None # The arrow backend's table of raw cells.
+    if chunk_size is not None:
+        full_logsheet = _read_and_clean_logsheet(logsheet_path, nrows=num_header_rows, delimiter=delimiter)
+        if len(full_logsheet) < num_header_rows:
+            raise ValueError("The number of header rows is greater than the number of rows in the logsheet!")
+        chunks = _iter_logsheet_chunks(logsheet_path, num_header_rows, chunk_size, delimiter=delimiter)
+    else:
+        if backend == "arrow":
+            full_logsheet = _read_and_clean_logsheet(logsheet_path, nrows=num_header_rows, delimiter=delimiter)
+            if len(full_logsheet) == num_header_rows:
+                table = _read_logsheet_table_arrow(logsheet_path, num_columns, num_header_rows, delimiter=delimiter)
+            if table is None:
+                print("Could not read the logsheet with pyarrow, falling back to the Python CSV reader.")
+        if table is None:
+            full_logsheet = _read_and_clean_logsheet(logsheet_path, delimiter=delimiter)
+            if len(full_logsheet) < num_header_rows:
+                raise ValueError("The number of header rows is greater than the number of rows in the logsheet!")
+            chunks = [full_logsheet[num_header_rows:]]
+    
+    # For each row, connect instances of the appropriate DataObject subclass to all other instances of appropriate DataObject subclasses.
+    headers_in_logsheet = [f.lower() for f in full_logsheet[0]]
         
     # Order the class column names by precedence in the schema so that higher level objects always exist before lower level.
     schema = dataset_factors
@@ -92,66 +133,11 @@ def read_logsheet(project_folder: str = None, logsheet_toml_path: str = None, de
         if factor not in var_names:
             raise ValueError(f"Dataset factor {factor} not found in logsheet output variable names!")        
         factor_column_names_ordered.append(header_names[var_names.index(factor)].lower())
-
-    # Get all of the names of the data objects in the lowest level ONLY - this avoids redundancy.
     dobj_cols_idx = [headers_in_logsheet.index(header) for header in factor_column_names_ordered] # Get the indices of the data objects columns in the logsheet
-    dobj_names = [] # The matrix of data object names (values in the logsheet).
-    for row_num, row in enumerate(logsheet): 
-        curr_dobj_name = []
-        for idx in dobj_cols_idx:
-            raw_value = row[idx]
-            type_class = header_types[idx]
-            value = _clean_value(type_class, raw_value)
-            # Check that all of the data object names are valid variable names.
-            if not value:
-                raise ValueError(f"Logsheet row #{row_num+num_header_rows+1} Column {idx+1}: All data object names must be non-empty!")
-            curr_dobj_name.append(str(value))
-        dobj_names.append(','.join(curr_dobj_name))        
-                    
-    # Get all Data Object names that are not in the lowest level.
-    for idx in range(len(order[0:-1])):
-        # Get the index of the n'th delimiter (comma) in the string.
-        data_objects_in_level_names = [",".join(dobj_name.split(",")[0:idx+1]) for dobj_name in dobj_names]
-        # Make this list unique.
-        data_objects_in_level_names = list(set(data_objects_in_level_names))
-        # Add the names to the dobj_names list.
-        [dobj_names.append(name) for name in data_objects_in_level_names if name not in dobj_names]
-
-    # To format the print statements.
-    max_len = -1
-    for header in headers_in_logsheet:
-        if len(header) > max_len:
-            max_len = len(header)   
-    
-    # Assign the values to the DataObject instances.
-    all_attrs = {}
-    for col_idx in range(num_columns):        
-        level = header_levels[col_idx]
-        type_class = header_types[col_idx]
-        level_idx = [o.lower() for o in order].index(level.lower())
-        level_dobjs = [dobj for dobj in dobj_names if dobj.count(",") == level_idx]        
-        # Get the index of the column that corresponds to the level of the DataObjects.
-        level_column_idx = dobj_cols_idx[level_idx]
-        print("{:<{width}} {:<25}".format(f"Column: {header_names[col_idx]}", f"Level: {level}", width=max_len+2))                
-        for dobj in level_dobjs:
-            # Get all of the values
-            values = [_clean_value(type_class, row[col_idx]) for row in logsheet if dobj == str(_clean_value(type_class, row[level_column_idx]))]
-            non_none_values = list(set([value for value in values if value is not None]))
-            num_values_non_none = len(non_none_values)
-            if num_values_non_none == 0:
-                value = None
-            elif num_values_non_none > 1:
-                raise ValueError(f"Logsheet Column: {header_names[col_idx]} Data Object: {dobj.name} has multiple values!")
-            else:
-                value = non_none_values[0]
-
-            # Store it to the all_attrs dict.
-            if dobj not in all_attrs:
-                all_attrs[dobj] = {}
-            all_attrs[dobj][var_names[col_idx].lower()] = value     
+    lowered_order = [o.lower() for o in order]
+    column_level_idx = [lowered_order.index(level.lower()) for level in header_levels]
 
     # Create logsheet runnable node.
-    print("Assigning Data Object values...")
     logsheet_attrs = {}
     logsheet_attrs['outputs'] = [header.lower() for header in logsheet_dict['headers']]
     logsheet_node = Logsheet(id = str(uuid.uuid4()), name = LOGSHEET_NAME, attrs = logsheet_attrs)
@@ -168,11 +154,12 @@ def read_logsheet(project_folder: str = None, logsheet_toml_path: str = None, de
     
     # Get the hash for each output variable.    
     hashes = {}
-    for column in mapping:
-        node_id = mapping[column]
-        hashes[node_id] = hash_node(logsheet_graph, node_id)
+    with span("logsheet.hash", columns=len(mapping)):
+        for column in mapping:
+            node_id = mapping[column]
+            hashes[node_id] = hash_node(logsheet_graph, node_id)
 
-    # Write the values to the DataObjects.    
+    # Get the Parquet dataset to write the values to.
     try:
         save_folder_path = os.environ[SAVE_DATA_FOLDER_KEY]
     except KeyError:
@@ -183,26 +170,341 @@ def read_logsheet(project_folder: str = None, logsheet_toml_path: str = None, de
             save_folder_path = os.sep.join([project_folder, index_dict["save_path"][0]]) if not os.path.isabs(index_dict["save_path"][0]) else index_dict["save_path"][0]               
     if save_folder_path == ".":
         save_folder_path = project_folder
+    dataset_path = os.path.join(save_folder_path, LOGSHEET_DATASET_NAME)
+    # One column per output variable hash.
+    column_hashes = {column: hashes[mapping[column]] for column in mapping}
+    dataset_schema = get_data_objects_schema(dataset_factors, column_hashes, {column: header_types[idx] for idx, column in enumerate(logsheet_attrs['outputs'])})
+    column_levels = {column: column_level_idx[idx] for idx, column in enumerate(logsheet_attrs['outputs'])}
+    dobj_index = DataObjectIndex()
+    writer = None
+    if chunk_size is not None:
+        writer = DataObjectsDatasetWriter(dataset_path, dataset_factors, column_hashes, column_levels, dataset_schema, delimiter=dobj_index.delimiter, incremental=incremental)
+
+    # To format the print statements.
+    max_len = -1
+    for header in headers_in_logsheet:
+        if len(header) > max_len:
+            max_len = len(header)   
     
-    # Sort the all_attrs dict alphabetically by key
-    sorted_keys = sorted(all_attrs.keys())
-    all_attrs = {key: all_attrs[key] for key in sorted_keys}
-    count = 0
-    num_dobjs = len(all_attrs)    
-    for dobj, attrs in all_attrs.items():
-        count += 1
-        dobj_to_save = {}
-        for attr in attrs:
-            node_id = mapping[attr]
-            hash = hashes[node_id]
-            dobj_to_save[hash] = attrs[attr] if attrs[attr] is not None else math.nan
-        # Save the values to file.
-        save_file_path = os.path.join(save_folder_path, dobj.replace(delimiter, os.sep) + ".parquet")
-        print(f"Saving Data Object {count} of {num_dobjs}: ", dobj)
-        # locked_write_parquet(save_file_path, df)
+    # Assign the values to the DataObject instances, one chunk of rows at a time.
+    print("Assigning Data Object values...")
+    for col_idx in range(num_columns):
+        print("{:<{width}} {:<25}".format(f"Column: {header_names[col_idx]}", f"Level: {header_levels[col_idx]}", width=max_len+2))
+    all_attrs = {}
+    num_rows = 0
+    dobj_table = None # The arrow backend's table of data objects, like the one from `data_objects_to_table`.
+    if table is not None:
+        dobj_table = _get_data_objects_table_arrow(table, header_types, column_level_idx, dobj_cols_idx, dobj_index, dataset_schema)
+        if dobj_table is None:
+            # The Python reader raises the errors, if there are any, exactly like the "python" backend does.
+            print("Could not assign the Data Object values with pyarrow, falling back to the Python CSV reader.")
+            full_logsheet = _read_and_clean_logsheet(logsheet_path, delimiter=delimiter)
+            chunks = [full_logsheet[num_header_rows:]]
+        else:
+            chunks = []
+            num_rows = table.num_rows
+            count("logsheet.rows", num_rows)
+        del table
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for chunk in chunks:
+            # Highest level Data Objects that were already saved get more rows, so read them back in before assigning the rows.
+            partitions = _get_partitions(chunk, dobj_cols_idx[0], header_types[dobj_cols_idx[0]]) if writer is not None else []
+            for partition in partitions:
+                if writer.is_written(partition):
+                    all_attrs.update(writer.read_partition(partition))
+
+            if executor is not None and len(chunk) > 1:
+                _assign_rows_parallel(executor, workers, chunk, header_types, column_level_idx, dobj_cols_idx, [var_name.lower() for var_name in var_names], header_names, dobj_index, all_attrs, num_header_rows=num_header_rows, first_row_num=num_rows)
+            else:
+                _assign_rows(chunk, header_types, column_level_idx, dobj_cols_idx, [var_name.lower() for var_name in var_names], header_names, dobj_index, all_attrs, num_header_rows=num_header_rows, first_row_num=num_rows)
+            num_rows += len(chunk)
+            count("logsheet.rows", len(chunk))
+
+            # Save the highest level Data Objects that are finished, i.e. all but the one in the last row of the chunk.
+            if writer is not None and chunk:
+                last_partition = _get_partitions(chunk[-1:], dobj_cols_idx[0], header_types[dobj_cols_idx[0]])[0]
+                for partition in partitions:
+                    if partition != last_partition:
+                        _write_partition(writer, partition, all_attrs, dobj_index)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # Save all of the (remaining) Data Objects to one Parquet dataset.
+    if writer is not None:
+        for partition in list(dobj_index.at_level(0)):
+            if not writer.is_written(partition):
+                _write_partition(writer, partition, all_attrs, dobj_index)
+        print(f"Saved {len(dobj_index)} Data Objects to {dataset_path}")
+        created, modified, deleted = writer.close()
+    elif dobj_table is not None:
+        print(f"Saving {dobj_table.num_rows} Data Objects to {dataset_path}")
+        with span("logsheet.save", data_objects=dobj_table.num_rows):
+            fingerprints = get_data_objects_table_fingerprints(dobj_table, dataset_factors, column_hashes, column_levels, delimiter=dobj_index.delimiter)
+            created, modified, deleted = save_data_objects_table(dataset_path, dobj_table, dataset_factors, fingerprints, delimiter=dobj_index.delimiter, incremental=incremental)
+    else:
+        print(f"Saving {len(all_attrs)} Data Objects to {dataset_path}")
+        with span("logsheet.save", data_objects=len(all_attrs)):
+            created, modified, deleted = save_data_objects(dataset_path, all_attrs, dataset_factors, column_hashes, delimiter=dobj_index.delimiter, incremental=incremental, schema=dataset_schema)
 
     elapsed_time = time.time() - logsheet_start_time
-    print(f"Logsheet import complete (nrows={len(logsheet)}). Created {len(all_attrs)} new DataObjects, modified {0} DataObjects in {round(elapsed_time, 2)} seconds.")
+    print(f"Logsheet import complete (nrows={num_rows}). Created {len(created)} new DataObjects, modified {len(modified)} DataObjects, deleted {len(deleted)} DataObjects in {round(elapsed_time, 2)} seconds.")
+    return dobj_index
+
+@traced("logsheet.save")
+def _write_partition(writer: "DataObjectsDatasetWriter", partition: str, all_attrs: dict, dobj_index: DataObjectIndex) -> None:
+    """Save a highest level Data Object and all of its descendants, and remove them from all_attrs."""
+    names = [partition] + dobj_index.descendants(partition)
+    writer.write_partition(partition, {name: all_attrs.pop(name) for name in names if name in all_attrs})
+
+def _iter_logsheet_chunks(logsheet_path: str, num_header_rows: int, chunk_size: int, delimiter: str = ",") -> Iterator[list]:
+    """Read the data rows of the logsheet (CSV only) chunk_size rows at a time.
+    Yields the list of rows in each chunk."""
+    with open(logsheet_path, "r") as f:
+        reader = csv.reader(f, delimiter=delimiter, quotechar='"')
+        for _ in range(num_header_rows):
+            next(reader, None)
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+@traced("logsheet.assign_rows")
+def _assign_rows(logsheet: list, header_types: list, column_level_idx: list, dobj_cols_idx: list, var_names: list, header_names: list,
+                 dobj_index: DataObjectIndex, all_attrs: dict, num_header_rows: int = 0, first_row_num: int = 0) -> list:
+    """Clean each cell of the rows and assign it to the row's data object at the column's level, in one pass over the rows.
+    New data objects (and their ancestors) are added to the index and to all_attrs, with every variable at their level set to None.
+    The rows are processed in order, and each row's cells from left to right, so the first conflicting value raises the same error
+    however the rows are split up. Raises ValueError if a data object has more than one non-empty value in a column.
+    Returns the names at each level of the rows' data objects, in the order they first appear."""
+    num_columns = len(header_types)
+    cleaners = [_get_cleaner(type_str) for type_str in header_types]
+    level_var_names = [[var_names[col_idx] for col_idx in range(num_columns) if column_level_idx[col_idx] == level_idx] for level_idx in range(len(dobj_cols_idx))]
+    cells = [(col_idx, cleaners[col_idx], var_names[col_idx], column_level_idx[col_idx]) for col_idx in range(num_columns)]
+    row_dobjs_cache = {} # Factor cells -> the (name, attrs) of the row's data object at each level, so each data object is only looked up once.
+    all_components = []
+    for row_num, row in enumerate(logsheet):
+        if len(row) < num_columns:
+            raise ValueError(f"Logsheet row #{first_row_num+row_num+num_header_rows+1} has {len(row)} columns, expected {num_columns}!")
+        factor_cells = tuple([row[idx] for idx in dobj_cols_idx])
+        row_dobjs = row_dobjs_cache.get(factor_cells)
+        if row_dobjs is None:
+            components = []
+            for col_idx in dobj_cols_idx:
+                value = cleaners[col_idx](row[col_idx])
+                # Check that all of the data object names are valid variable names.
+                if not value:
+                    raise ValueError(f"Logsheet row #{first_row_num+row_num+num_header_rows+1} Column {col_idx+1}: All data object names must be non-empty!")
+                component = _format_name(value)
+                if dobj_index.delimiter in component:
+                    raise ValueError(f"Logsheet row #{first_row_num+row_num+num_header_rows+1} Column {col_idx+1}: Data object name {component!r} can't contain the delimiter {dobj_index.delimiter!r}!")
+                components.append(component)
+            row_dobjs = []
+            for level_idx, dobj in enumerate(dobj_index.get_names(dobj_index.add_ids(components))):
+                if dobj not in all_attrs:
+                    all_attrs[dobj] = dict.fromkeys(level_var_names[level_idx])
+                row_dobjs.append((dobj, all_attrs[dobj]))
+            row_dobjs_cache[factor_cells] = row_dobjs
+            all_components.append(components)
+
+        for col_idx, clean, var_name, level_idx in cells:
+            value = clean(row[col_idx])
+            if value is None:
+                continue
+            dobj, attrs = row_dobjs[level_idx]
+            prev_value = attrs[var_name]
+            if prev_value is None:
+                attrs[var_name] = value
+            elif value is not prev_value and value != prev_value:
+                raise ValueError(f"Logsheet Column: {header_names[col_idx]} Data Object: {dobj} has multiple values!")
+    return all_components
+
+def _assign_rows_parallel(executor: Executor, num_workers: int, logsheet: list, header_types: list, column_level_idx: list, dobj_cols_idx: list, var_names: list, header_names: list,
+                          dobj_index: DataObjectIndex, all_attrs: dict, num_header_rows: int = 0, first_row_num: int = 0) -> None:
+    """Like `_assign_rows`, but the rows are split into num_workers contiguous chunks that are assigned in parallel, each to its own data objects.
+    The chunks' data objects are then merged in row order. If any chunk fails or two chunks conflict, the rows are assigned again in this process
+    to raise the same error as `_assign_rows`, so all_attrs is only changed once all of the chunks are merged."""
+    chunk_size = math.ceil(len(logsheet) / num_workers)
+    futures = [executor.submit(_assign_rows_worker, logsheet[start:start+chunk_size], header_types, column_level_idx, dobj_cols_idx, var_names, header_names,
+                               dobj_index.delimiter, num_header_rows, first_row_num + start) for start in range(0, len(logsheet), chunk_size)]
+    try:
+        results = [future.result() for future in futures]
+        chunk_attrs = results[0][0] if results else {}
+        for worker_attrs, _ in results[1:]:
+            _merge_attrs(chunk_attrs, worker_attrs)
+        _merge_attrs(all_attrs, chunk_attrs, check_only=True)
+    except ValueError:
+        _assign_rows(logsheet, header_types, column_level_idx, dobj_cols_idx, var_names, header_names, dobj_index, all_attrs, num_header_rows=num_header_rows, first_row_num=first_row_num)
+        return
+    _merge_attrs(all_attrs, chunk_attrs)
+    for _, all_components in results:
+        for components in all_components:
+            dobj_index.add_ids(components)
+
+def _assign_rows_worker(logsheet: list, header_types: list, column_level_idx: list, dobj_cols_idx: list, var_names: list, header_names: list,
+                        delimiter: str, num_header_rows: int, first_row_num: int) -> tuple:
+    """Run `_assign_rows` for a chunk of rows in a worker process. Returns the chunk's data objects' attributes, and their names at each level."""
+    all_attrs = {}
+    all_components = _assign_rows(logsheet, header_types, column_level_idx, dobj_cols_idx, var_names, header_names, DataObjectIndex(delimiter=delimiter), all_attrs,
+                                  num_header_rows=num_header_rows, first_row_num=first_row_num)
+    return all_attrs, all_components
+
+def _merge_attrs(all_attrs: dict, new_attrs: dict, check_only: bool = False) -> None:
+    """Merge data objects' attributes into all_attrs, keeping the non-empty values that are already there.
+    Raises ValueError if a data object has different non-empty values. If check_only, all_attrs is not changed."""
+    for dobj, attrs in new_attrs.items():
+        prev_attrs = all_attrs.get(dobj)
+        if prev_attrs is None:
+            if not check_only:
+                all_attrs[dobj] = attrs
+            continue
+        for var_name, value in attrs.items():
+            if value is None:
+                continue
+            prev_value = prev_attrs[var_name]
+            if prev_value is None:
+                if not check_only:
+                    prev_attrs[var_name] = value
+            elif value is not prev_value and value != prev_value:
+                raise ValueError(f"Data Object: {dobj} has multiple values for {var_name}!")
+
+def _get_partitions(logsheet: list, col_idx: int, type_str: str) -> list:
+    """Get the names of the highest level data objects in the rows, in the order they first appear.
+    Rows without a valid name are skipped, `_assign_rows` raises the error for them."""
+    clean = _get_cleaner(type_str)
+    partitions = {}
+    for row in logsheet:
+        if col_idx < len(row):
+            value = clean(row[col_idx])
+            if value:
+                partitions[_format_name(value)] = None
+    return list(partitions)
+
+def _format_name(value: Any) -> str:
+    """Format a cleaned factor cell as a data object name. Whole numbers have no decimal point, e.g. 1.0 is `1`."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+@traced("logsheet.read_csv_arrow")
+def _read_logsheet_table_arrow(logsheet_path: str, num_columns: int, num_header_rows: int, delimiter: str = ",") -> "pa.Table":
+    """Read the data rows of the logsheet (CSV only) straight into a pyarrow table, with every cell as a string.
+    Returns None if pyarrow is not installed or can't parse the file."""
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+    except ImportError:
+        return None
+
+    column_names = [f"f{col_idx}" for col_idx in range(num_columns)]
+    read_options = pa_csv.ReadOptions(skip_rows=num_header_rows, autogenerate_column_names=True)
+    parse_options = pa_csv.ParseOptions(delimiter=delimiter, quote_char='"', newlines_in_values=True)
+    # Read every cell as a string so that the header types are applied exactly like _clean_value does.
+    convert_options = pa_csv.ConvertOptions(column_types={name: pa.string() for name in column_names}, include_columns=column_names,
+                                            strings_can_be_null=False, quoted_strings_can_be_null=False)
+    try:
+        return pa_csv.read_csv(logsheet_path, read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+    except (pa.ArrowInvalid, pa.ArrowKeyError):
+        # e.g. rows with different numbers of columns, or no data rows at all.
+        return None
+
+def _clean_arrow_column(type_str: str, raw_column):
+    """Batch version of `_clean_value` for a whole pyarrow column of strings. Empty cells are null.
+    Returns None if any cell needs to be cleaned by `_clean_value` instead."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    _get_cleaner(type_str) # Raises ValueError for invalid types.
+    if type_str == "bool":
+        # bool() of any non-empty string is True.
+        return pc.not_equal(pc.utf8_length(raw_column), 0)
+    if type_str == "str":
+        cleaned = pc.utf8_trim_whitespace(pc.replace_substring(raw_column, "'", "''"))
+    else:
+        cleaned = pc.utf8_trim_whitespace(raw_column)
+    is_empty = pc.equal(cleaned, "")
+    cleaned = pc.if_else(is_empty, pa.scalar(None, pa.string()), cleaned)
+    if type_str == "num":
+        try:
+            cleaned = pc.cast(cleaned, pa.float64())
+        except pa.ArrowInvalid:
+            return None
+        if pc.any(pc.is_nan(cleaned)).as_py():
+            return None # NaN != NaN, so in Python two NaN values conflict, but pyarrow groups them as one value.
+    return cleaned
+
+@traced("logsheet.assign_arrow")
+def _get_data_objects_table_arrow(table: "pa.Table", header_types: list, column_level_idx: list, dobj_cols_idx: list, dobj_index: DataObjectIndex, schema: "pa.Schema") -> "pa.Table":
+    """Arrow version of `_assign_rows` for the whole logsheet: each column is cleaned in batch, and the rows are grouped by data object at each level,
+    so the values are never converted to Python objects. The data objects are added to the index in the order they first appear.
+    `schema` is the dataset's schema: the factors' columns, then one column per logsheet column in header order.
+    Returns the same table as `data_objects_to_table` would, or None if pyarrow can't clean or group the values exactly like `_assign_rows`,
+    e.g. if a data object has conflicting values or an empty name, so that `_assign_rows` can raise the error."""
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if any(header_types[col_idx] != "str" for col_idx in dobj_cols_idx):
+        return None # Numbers and bools in data object names are formatted by Python.
+    columns = []
+    for col_idx, type_str in enumerate(header_types):
+        column = _clean_arrow_column(type_str, table.column(col_idx))
+        if column is None:
+            return None
+        columns.append(column)
+    factor_columns = [columns[col_idx] for col_idx in dobj_cols_idx]
+    if any(column.null_count > 0 for column in factor_columns):
+        return None
+    if any(pc.any(pc.match_substring(column, dobj_index.delimiter)).as_py() for column in factor_columns):
+        return None # `_assign_rows` raises the error for names with the delimiter in them.
+
+    num_levels = len(dobj_cols_idx)
+    factors = schema.names[:num_levels]
+    column_names = schema.names[num_levels:]
+    row_nums = pa.array(np.arange(table.num_rows, dtype=np.int64))
+    level_tables = []
+    for level_idx in range(num_levels):
+        level_cols = [col_idx for col_idx in range(len(columns)) if column_level_idx[col_idx] == level_idx]
+        names = factor_columns[0] if level_idx == 0 else pc.binary_join_element_wise(*factor_columns[:level_idx + 1], dobj_index.delimiter)
+        if pc.count_distinct(names).as_py() == len(names):
+            # Each row is its own data object, e.g. at the lowest level, so there is nothing to group.
+            first_rows = row_nums
+            level_factors = factor_columns[:level_idx + 1]
+            level_values = {col_idx: columns[col_idx] for col_idx in level_cols}
+        else:
+            rows = pa.table([names, row_nums] + factor_columns[:level_idx + 1] + [columns[col_idx] for col_idx in level_cols],
+                            names=["name", "row"] + [f"factor{factor_idx}" for factor_idx in range(level_idx + 1)] + [f"column{col_idx}" for col_idx in level_cols])
+            # The first non-empty value of each column is the data object's value, unless the smallest and largest values differ.
+            aggregations = [("row", "min")] + [(f"factor{factor_idx}", "first") for factor_idx in range(level_idx + 1)]
+            for col_idx in level_cols:
+                aggregations += [(f"column{col_idx}", "first"), (f"column{col_idx}", "min"), (f"column{col_idx}", "max")]
+            grouped = rows.group_by("name", use_threads=False).aggregate(aggregations)
+            if any(pc.any(pc.not_equal(grouped[f"column{col_idx}_min"], grouped[f"column{col_idx}_max"])).as_py() for col_idx in level_cols):
+                return None
+            names = grouped["name"]
+            first_rows = grouped["row_min"]
+            level_factors = [grouped[f"factor{factor_idx}_first"] for factor_idx in range(level_idx + 1)]
+            level_values = {col_idx: grouped[f"column{col_idx}_first"] for col_idx in level_cols}
+
+        level_columns = [names]
+        for factor_idx, factor in enumerate(factors):
+            level_columns.append(level_factors[factor_idx] if factor_idx <= level_idx else pa.nulls(len(names), schema.field(factor).type))
+        for col_idx, column_name in enumerate(column_names):
+            level_columns.append(level_values[col_idx] if col_idx in level_values else pa.nulls(len(names), schema.field(column_name).type))
+        level_tables.append(pa.table(level_columns, schema=schema.insert(0, pa.field("name", pa.string()))))
+
+        if level_idx == num_levels - 1:
+            # Adding the lowest level data objects in the order they first appear adds every data object in the same order as `_assign_rows`.
+            order = pc.sort_indices(first_rows)
+            for components in zip(*[pc.take(factor_column, order).to_pylist() for factor_column in level_factors]):
+                dobj_index.add_ids(list(components))
+    # Sorted by data object, like `data_objects_to_table`.
+    return pa.concat_tables(level_tables).sort_by("name").select(schema.names)
 
 def _clean_value(type_str: str, raw_value: Any) -> Any:
     """Convert to proper type and clean the value of the logsheet cell."""
@@ -229,6 +531,28 @@ def _clean_value(type_str: str, raw_value: Any) -> Any:
             value = float(value)
     return value
 
+def _clean_str(raw_value: str) -> str:
+    """Same as `_clean_value("str", raw_value)` for a cell read from the CSV."""
+    value = raw_value.replace("'", "''").strip()
+    return value if value else None
+
+def _clean_num(raw_value: str) -> float:
+    """Same as `_clean_value("num", raw_value)` for a cell read from the CSV."""
+    try:
+        return float(raw_value)
+    except ValueError:
+        if not raw_value.strip():
+            return None
+        return _clean_value("num", raw_value) # Raises the same error for other strings.
+
+_CLEANERS = {"str": _clean_str, "num": _clean_num, "bool": bool}
+
+def _get_cleaner(type_str: str):
+    """Get the function that cleans the CSV cells of a column with this header type, like `_clean_value`."""
+    if type_str not in _CLEANERS:
+        raise ValueError(f"Invalid type class: {type_str}. Must be one of {list(_CLEANERS)}")
+    return _CLEANERS[type_str]
+
 def get_logsheet_dict(project_folder: str = None, logsheet_toml_path: str = None) -> dict:
     """Return the logsheet dict from the project_settings.toml file."""
 
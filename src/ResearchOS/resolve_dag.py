@@ -1,17 +1,69 @@
 from copy import deepcopy
-import networkx as nx
+from collections.abc import Mapping
+from types import MappingProxyType
+from typing import TYPE_CHECKING
 
 from ResearchOS.custom_classes import DataFilePath, LoadConstantFromFile, DataObjectName
+from ResearchOS.tracing import traced, count
 
-def resolve_dag(dag: nx.MultiDiGraph, data_object: list) -> nx.MultiDiGraph:
+if TYPE_CHECKING:
+    import networkx as nx
+
+NODE_TYPES_TO_RESOLVE = (DataFilePath, LoadConstantFromFile, DataObjectName)
+
+class ResolvedDag:
+    """Read-only view of the DAG for one data object.
+    The nodes that depend on the data object are resolved copies, all other nodes are shared with the DAG, which is never modified.
+    `resolved_dag.nodes[node]['node']` works like it does for the networkx graph, other attributes (e.g. `predecessors`) are the DAG's."""
+
+    def __init__(self, dag: "nx.MultiDiGraph", data_object: list, resolved_nodes: dict):
+        self.dag = dag
+        self.data_object = data_object
+        self.resolved_nodes = resolved_nodes # Node ID -> resolved node object.
+        self.nodes = _ResolvedNodes(dag, resolved_nodes)
+
+    def __getattr__(self, name: str):
+        return getattr(self.dag, name)
+
+class _ResolvedNodes(Mapping):
+    """Node ID -> read-only node attributes, with the resolved node objects in place of the DAG's."""
+
+    def __init__(self, dag: "nx.MultiDiGraph", resolved_nodes: dict):
+        self._dag = dag
+        self._resolved_nodes = resolved_nodes
+
+    def __getitem__(self, node):
+        node_attrs = self._dag.nodes[node]
+        if node in self._resolved_nodes:
+            node_attrs = dict(node_attrs, node=self._resolved_nodes[node])
+        return MappingProxyType(node_attrs)
+
+    def __iter__(self):
+        return iter(self._dag.nodes)
+
+    def __len__(self) -> int:
+        return len(self._dag.nodes)
+
+def resolve_dag(dag: "nx.MultiDiGraph", data_object: list) -> ResolvedDag:
     """Resolve the DAG for the currently specified data object.
     This means that each input variable node that is loaded from file, uses the data object's name, etc.
-    Is converted from the generic form to that of the specific data object."""
-    new_dag = deepcopy(dag(data=True)) # data set to True so that the new graph is completely independent of the old one.
-    node_types_to_resolve = (DataFilePath, LoadConstantFromFile, DataObjectName)
-    for node in dag.nodes:
-        node_obj = new_dag.nodes[node]['node']
-        if type(node_obj) in node_types_to_resolve:
-            node_obj.resolve(data_object)
-        new_dag.nodes[node]['node'] = node_obj
-    return new_dag
\ No newline at end of file
+    Is converted from the generic form to that of the specific data object.
+    Only those nodes are copied, see `ResolvedDag`."""
+    return resolve_dags(dag, [data_object])[0]
+
+@traced("resolve_dags")
+def resolve_dags(dag: "nx.MultiDiGraph", data_objects: list) -> list:
+    """Resolve the DAG for each of the data objects. The nodes to resolve are only looked up once for all of the data objects.
+    Returns one ResolvedDag per data object, in the same order."""
+    nodes_to_resolve = [(node, node_attrs['node']) for node, node_attrs in dag.nodes(data=True) if type(node_attrs['node']) in NODE_TYPES_TO_RESOLVE]
+    resolved_dags = []
+    for data_object in data_objects:
+        resolved_nodes = {}
+        for node, node_obj in nodes_to_resolve:
+            # Copied so that resolving never changes the shared node.
+            resolved_node = deepcopy(node_obj)
+            resolved_node.resolve(data_object)
+            resolved_nodes[node] = resolved_node
+        resolved_dags.append(ResolvedDag(dag, data_object, resolved_nodes))
+    count("resolve_dag.nodes_resolved", len(nodes_to_resolve) * len(data_objects))
+    return resolved_dags
@@ -0,0 +1,66 @@
+import os
+import json
+import hashlib
+import threading
+
+from ResearchOS.tracing import span, count
+
+RESULT_CACHE_FOLDER_NAME = "result_cache" # Folder in the save data folder with one record per up to date result.
+SKIPPED = "skipped"
+RECOMPUTED = "recomputed"
+
+def get_result_key(node_hash: str, input_var_metadata, data_object: str, upstream_keys: dict = None) -> str:
+    """Get the key of one runnable's result for one data object.
+    It changes when the runnable (its hash from `hash_dag.hash_node`), the input variables' hashes or values, or the data object change.
+    `upstream_keys` is {upstream runnable: [its result keys that this result depends on]}, so the key also changes when an upstream result changes."""
+    key_items = {"node": node_hash, "inputs": input_var_metadata, "data_object": data_object}
+    if upstream_keys:
+        key_items["upstream"] = upstream_keys
+    return hashlib.sha256(json.dumps(key_items, sort_keys=True, default=repr).encode()).hexdigest()
+
+class ResultCache:
+    """Records which results are up to date, so that running the DAG again only recomputes what changed.
+    A result is up to date if it was recorded with the same key, and its save file (or each of a batch's save files) still exists."""
+
+    def __init__(self, cache_folder: str):
+        self.cache_folder = cache_folder
+
+    def is_up_to_date(self, result_key: str, save_file_path: str) -> bool:
+        record_path = self._get_record_path(result_key)
+        if not os.path.exists(record_path):
+            return False
+        with open(record_path, "r") as f:
+            record = json.load(f)
+        # A batch's result has the save file path of each of its data objects.
+        save_file_paths = save_file_path if isinstance(save_file_path, list) else [save_file_path]
+        return record["save_file_path"] == save_file_path and all([os.path.exists(path) for path in save_file_paths])
+
+    def record(self, result_key: str, data_object: str, save_file_path: str) -> None:
+        """Record the result as up to date. Written to a temporary file first, so concurrent workers never read a partial record."""
+        record_path = self._get_record_path(result_key)
+        os.makedirs(os.path.dirname(record_path), exist_ok=True)
+        tmp_path = f"{record_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"data_object": data_object, "save_file_path": save_file_path}, f)
+        os.replace(tmp_path, record_path)
+
+    def _get_record_path(self, result_key: str) -> str:
+        return os.path.join(self.cache_folder, result_key[:2], result_key + ".json")
+
+def run_if_outdated(result_cache: ResultCache, result_key: str, data_object: str, save_file_path: str, run_fcn, force: bool = False) -> str:
+    """Run `run_fcn()` unless its result is up to date in the cache, or always if force.
+    Returns SKIPPED or RECOMPUTED."""
+    if result_cache is not None and not force and result_cache.is_up_to_date(result_key, save_file_path):
+        count("result_cache.skipped")
+        return SKIPPED
+    count("result_cache.recomputed")
+    with span("run_data_object", data_object=data_object):
+        run_fcn()
+    if result_cache is not None:
+        result_cache.record(result_key, data_object, save_file_path)
+    return RECOMPUTED
+
+def get_cache_report(results: list) -> dict:
+    """Get the data objects that were skipped and recomputed, from the results of `run.run_batch`."""
+    return {SKIPPED: [result["data_object"] for result in results if result["result"] == SKIPPED],
+            RECOMPUTED: [result["data_object"] for result in results if result["result"] == RECOMPUTED]}
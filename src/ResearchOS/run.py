@@ -1,69 +1,186 @@
 import os
-import json
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-import networkx as nx
-
-from ResearchOS.matlab_eng import import_matlab, check_if_matlab
-from ResearchOS.constants import MATLAB_ENG_KEY, DATA_OBJECT_KEY, DATA_OBJECT_BATCH_KEY, SAVE_DATA_FOLDER_KEY, DATASET_SCHEMA_KEY, ENVIRON_VAR_DELIM
+from ResearchOS.matlab_eng import import_matlab, MatlabEnginePool
+from ResearchOS.constants import MATLAB_ENG_KEY, SAVE_DATA_FOLDER_KEY, DATASET_SCHEMA_KEY, ENVIRON_VAR_DELIM, PROJECT_FOLDER_KEY
 from ResearchOS.data_objects import get_data_objects_in_subset
 from ResearchOS.helper_functions import is_specified
 from ResearchOS.visualize_dag import get_sorted_runnable_nodes
 from ResearchOS.custom_classes import Runnable
-from ResearchOS.batches import get_batches_dict
+from ResearchOS.batches import get_batches_dict, get_batch_data_objects
+from ResearchOS.data_object_index import DataObjectIndex, get_save_file_path
+from ResearchOS.read_logsheet import read_logsheet
+from ResearchOS.config_cache import config_cache
+from ResearchOS.scheduler import get_runnable_dependencies, schedule
+from ResearchOS.result_cache import ResultCache, RESULT_CACHE_FOLDER_NAME, SKIPPED, RECOMPUTED, get_result_key, run_if_outdated, get_cache_report
+from ResearchOS.hash_dag import hash_node
+from ResearchOS.tracing import span, traced, count
+from ResearchOS.python_runner import import_function, run_python_batch, load_inputs, save_outputs
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+M_FILES_FOLDER = os.path.dirname(os.path.abspath(__file__)) # Folder with the .m files, added to each MATLAB engine's path.
+RUN_EXECUTOR_TYPES = ("process", "thread")
 
-def run_batch(node_settings: dict, matlab: dict):
-    """Run an individual batch for an individual node."""
+_worker_matlab = None # MATLAB engine of this worker process, started when the worker runs its first MATLAB data object.
+
+def run_data_object(node_settings: dict, data_object: str, data_object_batch: dict, matlab: dict):
+    """Run an individual node for an individual data object and its batch.
+    The data object is passed as an argument rather than through the environment, so that data objects can run concurrently.
+    A batch (see `batches.get_batches_dict`) is run with one engine call to wrapperBatch.m, which calls wrapper.m for each of the batch's save file paths.
+    Returns "skipped" if the result is up to date in node_settings["result_cache"] (unless node_settings["force"]), otherwise "recomputed"."""
     # 1. Load the input variables    
     for input_name, input_value in node_settings["inputs"].items():
         # For loop is split up so the input name can be reported in the error.
         if not is_specified(input_value):
             raise ValueError(f"Input variable {input_name} is not specified. This should have been resolved by now.")
-    input_var_metadata = get_input_variable_hashes_or_values(dag, runnable.inputs)
-    if not input_var_metadata:
-        return
-    output_var_metadata = get_output_variable_hashes()
+    input_var_metadata = {**node_settings["inputs"], **node_settings.get("constants", {})}
+    output_var_metadata = node_settings["outputs"]
+    result_key = get_data_object_result_key(node_settings, data_object, data_object_batch)
     
-    # Get the file path to the mat file
-    relative_path = os.environ[DATA_OBJECT_KEY].replace('.', os.sep)
+    # Get the file path to the mat file of each data object in the batch
     save_data_folder = os.environ[SAVE_DATA_FOLDER_KEY]
-    save_file_path = os.path.join(save_data_folder, relative_path + '.mat')
+    batch_data_objects = get_batch_data_objects(data_object, data_object_batch)
+    save_file_paths = [get_save_file_path(save_data_folder, batch_data_object) for batch_data_object in batch_data_objects]
+    save_file_path = save_file_paths if data_object_batch else save_file_paths[0]
+
+    # 2. Execute the process for this data object or batch, unless its result is up to date. .m file also saves the data
+    # Run the wrapper.m file with the input variables' metadata, or wrapperBatch.m with the batch's save file paths.
+    # The save files are locked while the wrapper reads and writes them, so nodes running at the same time don't overwrite each other's variables.
+    wrapper_name = 'wrapperBatch' if data_object_batch else 'wrapper'
+    def run_wrapper():
+        from ResearchOS.parallelization import locked_files
+        with locked_files(save_file_paths), span("matlab." + wrapper_name):
+            getattr(matlab[MATLAB_ENG_KEY], wrapper_name)(input_var_metadata, output_var_metadata, save_file_path, nargout = 0)
+    return run_if_outdated(node_settings.get("result_cache"), result_key, data_object, save_file_path, run_wrapper, force=node_settings.get("force", False))
 
-    # 2. Execute the process for this data object. .m file also saves the data
-    # Run the wrapper.m file with the input variables' metadata.
-    matlab_eng = matlab[MATLAB_ENG_KEY]
-    wrapper_fcn = getattr(matlab_eng, 'wrapper')
-    wrapper_fcn(input_var_metadata, output_var_metadata, save_file_path, nargout = 0)
+def get_data_object_result_key(node_settings: dict, data_object: str, data_object_batch: dict = None) -> str:
+    """Get the result key (see `result_cache.get_result_key`) of the node for one data object, or for one batch.
+    It includes node_settings["upstream_keys"][data_object], the upstream nodes' result keys that the data object depends on, if there are any."""
+    input_var_metadata = {**node_settings["inputs"], **node_settings.get("constants", {})}
+    upstream_keys = node_settings.get("upstream_keys", {}).get(data_object)
+    if data_object_batch:
+        # The batch's result changes when the data objects in it change.
+        batch_data_objects = get_batch_data_objects(data_object, data_object_batch)
+        return get_result_key(node_settings["node_hash"], {"inputs": input_var_metadata, "batch": batch_data_objects}, data_object, upstream_keys)
+    return get_result_key(node_settings["node_hash"], input_var_metadata, data_object, upstream_keys)
 
-def run(dag: nx.MultiDiGraph):
-    """Run the compiled DAG."""
-    m_files_folder = 'src/ResearchOS'
+def run(dag: "nx.MultiDiGraph", workers: int = 1, executor_type: str = "process", max_concurrency: int = 1, matlab_engines: int = None, force: bool = False, dobj_index: DataObjectIndex = None) -> dict:
+    """Run the compiled DAG.
+    Runnables whose upstream runnables have all finished are run concurrently, up to `max_concurrency` at once (see `scheduler.schedule`).
+    With more than one worker, each MATLAB node's data objects are also run in parallel (see `run_batch`), by one pool of `workers` processes or threads
+    (executor_type) that all of the run's nodes share.
+    Python nodes' functions are imported once and called in this process (see `_run_python_node`).
+    MATLAB is only started when the first MATLAB node runs, so Python-only DAGs never start it. The run's MATLAB nodes share a pool of
+    `matlab_engines` engines, which also limits how many MATLAB nodes run at once. It defaults to the number of workers with worker threads, otherwise 1.
+    Worker processes start their own engines.
+    Results that are up to date (same runnable hash, input variables, data object and upstream results as a previous run) are skipped, unless force.
+    Each node's subset and batches are found in `dobj_index`, the DataObjectIndex returned by `read_logsheet.read_logsheet`.
+    If it's not given, the logsheet is read (incrementally) when the first node runs.
+    Returns {node: {"skipped": [data objects], "recomputed": [data objects]}}."""
+    if executor_type not in RUN_EXECUTOR_TYPES:
+        raise ValueError(f"Invalid executor type: {executor_type}. Must be one of {RUN_EXECUTOR_TYPES}")
+    config_cache.clear() # Settings files are parsed once per run.
+    if matlab_engines is None:
+        matlab_engines = workers if executor_type == "thread" else 1
 
-    # Get the ordered list of Runnables to run.
+    # Get the ordered list of Runnables to run, and which Runnables each one depends on.
     sorted_runnable_nodes = get_sorted_runnable_nodes(dag)
+    dependencies = get_runnable_dependencies(dag, sorted_runnable_nodes)
+    node_languages = {node_uuid: dag.nodes[node_uuid]['node'].language for node_uuid in sorted_runnable_nodes}
+    result_cache = ResultCache(os.path.join(os.environ[SAVE_DATA_FOLDER_KEY], RESULT_CACHE_FOLDER_NAME)) if SAVE_DATA_FOLDER_KEY in os.environ else None
+
+    engine_pool = None
+    executor = None
+    node_result_keys = {} # Node -> {data object or batch: result key}, once the node has succeeded.
+    run_lock = threading.Lock()
+    def get_engine_pool() -> MatlabEnginePool:
+        nonlocal engine_pool
+        with run_lock:
+            if engine_pool is None:
+                # One engine connects to the shared "ResearchOS" session if there is one, more engines are all new sessions.
+                start_engine = lambda: import_matlab(is_matlab=True, new_session=matlab_engines > 1)[MATLAB_ENG_KEY]
+                engine_pool = MatlabEnginePool(num_engines=matlab_engines, addpaths=[M_FILES_FOLDER], start_engine=start_engine)
+        return engine_pool
+
+    def get_dobj_index() -> DataObjectIndex:
+        nonlocal dobj_index
+        with run_lock:
+            if dobj_index is None:
+                dobj_index = read_logsheet(os.environ.get(PROJECT_FOLDER_KEY), incremental=True)
+        return dobj_index
+
+    def get_executor():
+        nonlocal executor
+        with run_lock:
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=workers) if executor_type == "process" else ThreadPoolExecutor(max_workers=workers)
+        return executor
+
+    def run_node(node_uuid: str) -> list:
+        with span("run_node", node=node_uuid):
+            node = dag.nodes[node_uuid]['node']
+            if node.language == "matlab" and not (workers > 1 and executor_type == "process"):
+                # The subset's variables are read with scipy, and with one of the run's engines for MATLAB v7.3 files.
+                with get_engine_pool().lease() as matlab_eng:
+                    node_settings = get_node_settings(node, dobj_index=get_dobj_index(), matlab={MATLAB_ENG_KEY: matlab_eng})
+            else:
+                node_settings = get_node_settings(node, dobj_index=get_dobj_index())
+            node_settings["node_hash"] = hash_node(dag, node_uuid)
+            node_settings["result_cache"] = result_cache
+            node_settings["force"] = force
+            node_batches = _get_node_batches(node_settings)
+            upstream_result_keys = {dep_uuid: node_result_keys[dep_uuid] for dep_uuid in dependencies[node_uuid]}
+            node_settings["upstream_keys"] = _get_upstream_keys(upstream_result_keys, node_batches, get_dobj_index())
+            if node_settings["language"] == "python":
+                # Python functions are called in this process, batched functions once for all data objects.
+                results = _run_python_node(node_settings)
+            elif node_settings["language"] != "matlab" or (workers > 1 and executor_type == "process"):
+                results = run_batch(node_settings, parallel=workers > 1, workers=workers, executor_type=executor_type, executor=get_executor() if workers > 1 else None)
+            elif workers > 1:
+                results = run_batch(node_settings, parallel=True, workers=workers, executor_type=executor_type, executor=get_executor(), engine_pool=get_engine_pool())
+            else:
+                with get_engine_pool().lease() as matlab_eng:
+                    results = run_batch(node_settings, matlab={MATLAB_ENG_KEY: matlab_eng})
+            failed = [result for result in results if result["error"] is not None]
+            if failed:
+                failed_str = "\n".join([f"{result['data_object']}: {result['error']}" for result in failed])
+                raise ValueError(f"{len(failed)} of {len(results)} data objects failed:\n{failed_str}")
+            node_result_keys[node_uuid] = {data_object: get_data_object_result_key(node_settings, data_object, data_object_batch) for data_object, data_object_batch in node_batches.items()}
+            report = get_cache_report(results)
+            print(f"Node {node_uuid}: skipped {len(report[SKIPPED])} up to date data objects, recomputed {len(report[RECOMPUTED])} data objects.")
+            return report
 
-    # Import MATLAB
-    is_matlab = check_if_matlab(dag, sorted_runnable_nodes)
-    matlab_output = import_matlab(is_matlab=is_matlab) 
-    matlab_eng = matlab_output[MATLAB_ENG_KEY]
-    matlab_eng.addpath(m_files_folder)    
-
-    # Run the nodes in series
-    for node_uuid in sorted_runnable_nodes:
-        node = dag.nodes[node_uuid]['node']
-        node_settings = get_node_settings(dag, node)        
-        result = run_batch(node_settings, matlab=matlab_output)
-        if not result:
-            raise ValueError("Result is not 0")
+    try:
+        node_results = schedule(dependencies, run_node, max_concurrency=max_concurrency, node_resources=node_languages, resource_limits={"matlab": matlab_engines})
+    finally:
+        try:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        finally:
+            if engine_pool is not None:
+                engine_pool.close()
+    failed = [f"Node {node_uuid} {node_result['status']}: {node_result['error']}" for node_uuid, node_result in node_results.items() if node_result["status"] != "succeeded"]
+    if failed:
+        failed_str = "\n".join(failed)
+        raise ValueError(f"{len(failed)} of {len(node_results)} nodes did not succeed:\n{failed_str}")
+    return {node_uuid: node_result["result"] for node_uuid, node_result in node_results.items()}
         
-def get_node_settings(runnable: Runnable = None, data_object: list = []):
+def get_node_settings(runnable: Runnable = None, data_object: list = [], dobj_index: DataObjectIndex = None, matlab: dict = None):
+    """Get the settings to run the runnable with. Its subset and batches are found in `dobj_index`.
+    The subset's variables are loaded with scipy, or with the `matlab` engine for MATLAB v7.3 files (see `load_mat.load_mat_variables`)."""
     # 1. Get the subset of Data Objects to operate on
     subset_name = runnable.subset    
     batch_list = runnable.batch
-    subset_of_data_objects = get_data_objects_in_subset(subset_name, level=runnable.factor) # Get the list of specific data objects included in this subset.    
+    subset_of_data_objects = get_data_objects_in_subset(subset_name, dobj_index, runnable.factor, matlab, loader="scipy") # Get the list of specific data objects included in this subset.    
     # The input list becomes the top-level keys to the nested dict (at the specified factor level)
     # The values are a nested dict of data objects within each subset data object.
     # For example, if factor="Condition", then all of the Trials in that condition would be included as sub-dicts (with values = []).
-    subset_data_object_batches = get_batches_dict(subset_of_data_objects, batch_list) 
+    subset_data_object_batches = get_batches_dict(subset_of_data_objects, batch_list, dobj_index=dobj_index) 
     if data_object:
         # Get the batch of the current data object only, if provided.
         schema = os.environ[DATASET_SCHEMA_KEY].split(ENVIRON_VAR_DELIM)
@@ -77,17 +194,145 @@ def get_node_settings(runnable: Runnable = None, data_object: list = []):
     node_settings["batch_name"] = runnable.batch
     node_settings["batches"] = subset_data_object_batches
     node_settings["factor"] = runnable.factor
+    node_settings["inputs"] = runnable.inputs
+    node_settings["outputs"] = runnable.outputs
+    if runnable.language == "python":
+        # Python runnables are called in-process (see `python_runner`), so their function is needed here.
+        node_settings["function"] = runnable.function
     return node_settings
 
-def run_batch(node_settings: dict, matlab: dict = None, parallel: bool = False):
-    """Run an individual Runnable node."""
-    # Process the data objects in series
-    for data_object, data_object_batch in node_settings["batches"].items():
-        os.environ[DATA_OBJECT_KEY] = data_object
-        os.environ[DATA_OBJECT_BATCH_KEY] = json.dumps(data_object_batch)
-        # TODO: Support parallelization if specified
-        if parallel:
-            raise ValueError("Parallelization not supported yet!")
-        result = run_batch(node_settings, data_object_batch, matlab = matlab)
-        if not result:
-            return result
\ No newline at end of file
+@traced("run_batch")
+def run_batch(node_settings: dict, matlab: dict = None, parallel: bool = False, workers: int = None, executor_type: str = "process", engine_pool: MatlabEnginePool = None, executor = None) -> list:
+    """Run an individual Runnable node for each data object in its batches.
+    If parallel, the data objects are run by `executor` (e.g. the run's pool), or by a pool of `workers` processes or threads started for this batch.
+    `executor_type` is whether the workers are processes or threads.
+    Each worker process starts its own MATLAB engine. Worker threads lease engines from `engine_pool`, or from a pool of `workers` engines started for this batch.
+    Returns one dict per data object, in the same order as the batches: {"data_object": str, "result": Any, "error": str or None}.
+    A data object that fails does not stop the others from running."""
+    batches = list(node_settings["batches"].items())
+    if not parallel:
+        # Process the data objects in series
+        return [_run_and_report(node_settings, data_object, data_object_batch, matlab) for data_object, data_object_batch in batches]
+
+    if executor_type not in RUN_EXECUTOR_TYPES:
+        raise ValueError(f"Invalid executor type: {executor_type}. Must be one of {RUN_EXECUTOR_TYPES}")
+    own_executor = None
+    own_engine_pool = None
+    is_matlab = node_settings["language"] == "matlab"
+    try:
+        if executor_type == "process":
+            worker_fcn = _run_in_process_worker
+        else:
+            if is_matlab and engine_pool is None:
+                own_engine_pool = engine_pool = MatlabEnginePool(num_engines=workers or 1, addpaths=[M_FILES_FOLDER])
+            worker_fcn = partial(_run_and_report, engine_pool=engine_pool if is_matlab else None)
+        if executor is None:
+            own_executor = executor = ProcessPoolExecutor(max_workers=workers) if executor_type == "process" else ThreadPoolExecutor(max_workers=workers)
+        futures = [executor.submit(worker_fcn, node_settings, data_object, data_object_batch) for data_object, data_object_batch in batches]
+        results = []
+        for (data_object, _), future in zip(batches, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # e.g. the worker process died.
+                results.append({"data_object": data_object, "result": None, "error": f"{type(e).__name__}: {e}"})
+    finally:
+        try:
+            if own_executor is not None:
+                own_executor.shutdown(cancel_futures=True)
+        finally:
+            if own_engine_pool is not None:
+                own_engine_pool.close()
+    return results
+
+def _get_node_batches(node_settings: dict) -> dict:
+    """Get the batches that the node gets a result for. Python nodes' batches are flattened into their data objects (see `_run_python_node`)."""
+    if node_settings["language"] != "python":
+        return node_settings["batches"]
+    return {data_object: [] for batch_name, batch in node_settings["batches"].items() for data_object in get_batch_data_objects(batch_name, batch)}
+
+def _get_upstream_keys(upstream_result_keys: dict, data_objects, dobj_index: DataObjectIndex) -> dict:
+    """Get the upstream nodes' result keys that each data object's result depends on: those of the data object, its ancestors and its descendants.
+    e.g. a Trial depends on the upstream results of its Subject and of itself, and a Subject also on those of each of its Trials.
+    `upstream_result_keys` is {upstream node: {data object or batch: result key}}. Returns {data object: {upstream node: [result keys]}}."""
+    if not upstream_result_keys:
+        return {}
+    upstream_keys = {}
+    for data_object in data_objects:
+        try:
+            related = dobj_index.ancestors(data_object) + [data_object] + dobj_index.descendants(data_object)
+        except KeyError:
+            related = [data_object]
+        upstream_keys[data_object] = {dep_uuid: [dep_keys[related_dobj] for related_dobj in related if related_dobj in dep_keys]
+                                      for dep_uuid, dep_keys in upstream_result_keys.items()}
+    return upstream_keys
+
+def _run_python_node(node_settings: dict) -> list:
+    """Run a Python node for each data object in its batches, calling its function in this process.
+    The function is imported once, and functions decorated with `python_runner.batched` are called once for all of the outdated data objects
+    (or once per node_settings["batch_size"] data objects), instead of once per data object.
+    node_settings["inputs"] is {input name: variable name in the data object's save file}, node_settings["constants"] is {input name: value},
+    and node_settings["outputs"] are the output variable names, in the order that the function returns them.
+    Returns the same results as `run_batch`, with one result per data object in the batches."""
+    data_objects = list(_get_node_batches(node_settings))
+    save_data_folder = os.environ[SAVE_DATA_FOLDER_KEY]
+    save_file_paths = [get_save_file_path(save_data_folder, data_object) for data_object in data_objects]
+    result_keys = [get_data_object_result_key(node_settings, data_object) for data_object in data_objects]
+
+    # Only the outdated data objects' inputs are loaded and passed to the function.
+    result_cache = node_settings.get("result_cache")
+    is_outdated = [result_cache is None or node_settings.get("force", False) or not result_cache.is_up_to_date(result_key, save_file_path)
+                   for result_key, save_file_path in zip(result_keys, save_file_paths)]
+    count("result_cache.skipped", is_outdated.count(False))
+    outdated_idx = [dobj_idx for dobj_idx, outdated in enumerate(is_outdated) if outdated]
+    results = {dobj_idx: {"data_object": data_objects[dobj_idx], "result": SKIPPED, "error": None} for dobj_idx in range(len(data_objects)) if not is_outdated[dobj_idx]}
+    if outdated_idx:
+        try:
+            fcn = import_function(node_settings["function"])
+            with span("python.load_inputs"):
+                inputs = load_inputs([save_file_paths[dobj_idx] for dobj_idx in outdated_idx], node_settings["inputs"], node_settings.get("constants", {}))
+        except Exception as e:
+            inputs = None
+            for dobj_idx in outdated_idx:
+                results[dobj_idx] = {"data_object": data_objects[dobj_idx], "result": None, "error": f"{type(e).__name__}: {e}"}
+        if inputs is not None:
+            python_results = run_python_batch(fcn, [data_objects[dobj_idx] for dobj_idx in outdated_idx], inputs, node_settings["outputs"], batch_size=node_settings.get("batch_size"))
+            for dobj_idx, python_result in zip(outdated_idx, python_results):
+                if python_result["error"] is not None:
+                    results[dobj_idx] = python_result
+                    continue
+                save_fcn = partial(save_outputs, save_file_paths[dobj_idx], python_result["result"])
+                try:
+                    # Already known to be outdated, so the outputs are always saved and the result recorded.
+                    result = run_if_outdated(result_cache, result_keys[dobj_idx], data_objects[dobj_idx], save_file_paths[dobj_idx], save_fcn, force=True)
+                except Exception as e:
+                    results[dobj_idx] = {"data_object": data_objects[dobj_idx], "result": None, "error": f"{type(e).__name__}: {e}"}
+                    continue
+                results[dobj_idx] = {"data_object": data_objects[dobj_idx], "result": result, "error": None}
+    return [results[dobj_idx] for dobj_idx in range(len(data_objects))]
+
+def _run_and_report(node_settings: dict, data_object: str, data_object_batch: dict, matlab: dict = None, engine_pool: MatlabEnginePool = None) -> dict:
+    """Run one data object, catching its error so it can be reported with the others.
+    If engine_pool is given, the data object is run with an engine leased from the pool."""
+    try:
+        if engine_pool is None:
+            result = run_data_object(node_settings, data_object, data_object_batch, matlab)
+        else:
+            with engine_pool.lease() as matlab_eng:
+                result = run_data_object(node_settings, data_object, data_object_batch, {MATLAB_ENG_KEY: matlab_eng})
+    except Exception as e:
+        return {"data_object": data_object, "result": None, "error": f"{type(e).__name__}: {e}"}
+    return {"data_object": data_object, "result": result, "error": None}
+
+def _get_worker_matlab() -> dict:
+    """Get this worker process' MATLAB engine, starting a new one (not shared with the other workers) the first time."""
+    global _worker_matlab
+    if _worker_matlab is None:
+        _worker_matlab = import_matlab(is_matlab=True, new_session=True)
+        _worker_matlab[MATLAB_ENG_KEY].addpath(M_FILES_FOLDER)
+    return _worker_matlab
+
+def _run_in_process_worker(node_settings: dict, data_object: str, data_object_batch: dict) -> dict:
+    # The worker's engine is kept for the other nodes of the run, so it is only started once per process.
+    matlab = _get_worker_matlab() if node_settings["language"] == "matlab" else None
+    return _run_and_report(node_settings, data_object, data_object_batch, matlab)
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import networkx as nx
+
+def get_runnable_dependencies(dag: "nx.MultiDiGraph", runnable_nodes: list) -> dict:
+    """Get the runnables that each runnable directly depends on, i.e. the nearest runnables upstream of it in the DAG.
+    The DAG's other nodes (e.g. variables) between two runnables are followed but not included.
+    Returns {runnable node: set of runnable nodes}, in the same order as `runnable_nodes`."""
+    runnable_set = set(runnable_nodes)
+    dependencies = {}
+    for node in runnable_nodes:
+        node_dependencies = set()
+        visited = set()
+        stack = list(dag.predecessors(node))
+        while stack:
+            upstream_node = stack.pop()
+            if upstream_node in visited:
+                continue
+            visited.add(upstream_node)
+            if upstream_node in runnable_set:
+                node_dependencies.add(upstream_node)
+            else:
+                stack.extend(dag.predecessors(upstream_node))
+        dependencies[node] = node_dependencies
+    return dependencies
+
+def schedule(dependencies: dict, run_node, max_concurrency: int = 1, node_resources: dict = {}, resource_limits: dict = {}) -> dict:
+    """Run every node once all of the nodes it depends on have succeeded, running up to `max_concurrency` nodes at once.
+    `dependencies` is {node: nodes it depends on}. When more nodes are ready than can run, they are started in the order of this dict (e.g. topological order).
+    `run_node(node)` runs one node. It fails by raising an exception, in which case all nodes downstream of it are skipped.
+    `node_resources` is {node: resource name} and `resource_limits` is {resource name: max nodes using it at once}, e.g. {"matlab": 2}.
+    Returns {node: {"status": "succeeded", "failed" or "skipped", "result": Any, "error": str or None}}, in the same order as `dependencies`."""
+    if max_concurrency < 1:
+        raise ValueError(f"The maximum concurrency must be at least 1, not {max_concurrency}")
+    waiting_on = {node: set([dep for dep in deps if dep in dependencies]) for node, deps in dependencies.items()}
+    dependents = {node: [] for node in dependencies}
+    for node, deps in waiting_on.items():
+        for dep in deps:
+            dependents[dep].append(node)
+
+    results = {}
+    resources_in_use = {resource: 0 for resource in resource_limits}
+    running = {} # Future -> node
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while len(results) < len(dependencies):
+            # Start every node that is ready, as long as there are free workers and resources.
+            running_nodes = set(running.values())
+            for node in dependencies:
+                if len(running) >= max_concurrency:
+                    break
+                if node in results or node in running_nodes or waiting_on[node]:
+                    continue
+                resource = node_resources.get(node)
+                if resource in resource_limits and resources_in_use[resource] >= resource_limits[resource]:
+                    continue
+                if resource in resource_limits:
+                    resources_in_use[resource] += 1
+                running[executor.submit(run_node, node)] = node
+                running_nodes.add(node)
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                resource = node_resources.get(node)
+                if resource in resource_limits:
+                    resources_in_use[resource] -= 1
+                try:
+                    result = future.result()
+                except Exception as e:
+                    results[node] = {"status": "failed", "result": None, "error": f"{type(e).__name__}: {e}"}
+                    _skip_downstream(node, dependents, results)
+                    continue
+                results[node] = {"status": "succeeded", "result": result, "error": None}
+                for dependent in dependents[node]:
+                    waiting_on[dependent].discard(node)
+
+    not_run = [node for node in dependencies if node not in results]
+    if not_run:
+        raise ValueError(f"Nodes could not be scheduled, because of a dependency cycle or a resource limit of 0: {not_run}")
+    return {node: results[node] for node in dependencies}
+
+def _skip_downstream(failed_node, dependents: dict, results: dict) -> None:
+    """Mark all nodes downstream of the failed node as skipped."""
+    stack = list(dependents[failed_node])
+    while stack:
+        node = stack.pop()
+        if node in results:
+            continue
+        results[node] = {"status": "skipped", "result": None, "error": f"Upstream node {failed_node} failed"}
+        stack.extend(dependents[node])
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import atexit
+import threading
+import functools
+
+TRACE_FOLDER_ENV_VAR = "RESEARCHOS_TRACE_FOLDER" # If set, tracing is on from import, and the trace files are written to this folder at exit.
+SUMMARY_FILE_NAME = "trace_summary.json"
+CHROME_TRACE_FILE_NAME = "trace.json" # Open in chrome://tracing or https://ui.perfetto.dev
+
+class Tracer:
+    """Collects timing spans and counters. Spans can be nested, and can be started from several threads at once.
+    Only the spans and counters of the current process are collected, e.g. not those of `run_batch`'s worker processes."""
+
+    def __init__(self):
+        self.enabled = False
+        self.events = [] # Chrome trace "complete" events, one per finished span.
+        self.counters = {}
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.events = []
+            self.counters = {}
+            self._start_time = time.perf_counter()
+
+    def add_span(self, name: str, start_time: float, end_time: float, args: dict) -> None:
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": (start_time - self._start_time) * 1e6, "dur": (end_time - start_time) * 1e6}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+    def add_count(self, name: str, value: float) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> dict:
+        """Get the number of calls, total and max seconds of each span name, and the counters.
+        The total of a span includes the spans nested in it."""
+        spans = {}
+        with self._lock:
+            for event in self.events:
+                span_summary = spans.setdefault(event["name"], {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                span_summary["count"] += 1
+                span_summary["total_seconds"] += event["dur"] / 1e6
+                span_summary["max_seconds"] = max(span_summary["max_seconds"], event["dur"] / 1e6)
+            counters = dict(self.counters)
+        spans = dict(sorted(spans.items(), key=lambda item: item[1]["total_seconds"], reverse=True))
+        return {"spans": spans, "counters": counters}
+
+    def write(self, folder: str) -> tuple:
+        """Write the JSON summary and the Chrome trace to the folder. Returns their paths."""
+        os.makedirs(folder, exist_ok=True)
+        summary_path = os.path.join(folder, SUMMARY_FILE_NAME)
+        with open(summary_path, "w") as f:
+            json.dump(self.summary(), f, indent=4)
+        with self._lock:
+            events = list(self.events)
+            # Chrome shows the counters as tracks, with their final values.
+            end_ts = (time.perf_counter() - self._start_time) * 1e6
+            events.extend([{"name": name, "ph": "C", "pid": os.getpid(), "ts": end_ts, "args": {name: value}} for name, value in self.counters.items()])
+        trace_path = os.path.join(folder, CHROME_TRACE_FILE_NAME)
+        with open(trace_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return summary_path, trace_path
+
+class _Span:
+    __slots__ = ("name", "args", "start_time")
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        tracer.add_span(self.name, self.start_time, time.perf_counter(), self.args)
+        return False
+
+class _NoSpan:
+    """Returned by `span` when tracing is off, so that an untraced `with span(...)` costs one function call."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+tracer = Tracer()
+
+def span(name: str, **args):
+    """Time the code in a `with span("name", key=value):` block. The args are shown with the span in the Chrome trace."""
+    if not tracer.enabled:
+        return _NO_SPAN
+    return _Span(name, args)
+
+def traced(name: str):
+    """Decorator to time every call of a function as a span."""
+    def decorator(fcn):
+        @functools.wraps(fcn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fcn(*args, **kwargs)
+            with _Span(name, {}):
+                return fcn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name: str, value: float = 1) -> None:
+    """Add to a counter, e.g. of rows, files, bytes or cache hits."""
+    if tracer.enabled:
+        tracer.add_count(name, value)
+
+def is_tracing() -> bool:
+    """For counts that are expensive to compute, e.g. file sizes: only compute them if this is True."""
+    return tracer.enabled
+
+def start_tracing() -> None:
+    """Turn tracing on, discarding the spans and counters collected so far."""
+    tracer.reset()
+    tracer.enabled = True
+
+def stop_tracing(folder: str = None) -> dict:
+    """Turn tracing off. If a folder is given, the JSON summary and Chrome trace are written to it. Returns the summary."""
+    tracer.enabled = False
+    if folder is not None:
+        tracer.write(folder)
+    return tracer.summary()
+
+if os.environ.get(TRACE_FOLDER_ENV_VAR):
+    start_tracing()
+    atexit.register(stop_tracing, os.environ[TRACE_FOLDER_ENV_VAR])
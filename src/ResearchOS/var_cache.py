@@ -0,0 +1,187 @@
+import os
+import sys
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ResearchOS.constants import SAVE_DATA_FOLDER_KEY
+from ResearchOS.tracing import span, count
+
+VARIABLE_CACHE_FOLDER_NAME = "subset_variables_cache" # Folder in the save data folder for the on-disk cache.
+DEFAULT_MAX_MEMORY_BYTES = 512 * 1024 ** 2
+
+_NOT_IN_FILE = "__ResearchOS_not_in_file__" # Cached for variables that are not in the .mat file, so the file isn't read again to find that out.
+
+class VariableCache:
+    """Cache of variables loaded from .mat files, in memory and optionally on disk.
+    Entries are keyed by (.mat file path, variable name), and are valid as long as the file's modification time and size are unchanged.
+    The in-memory cache evicts the least recently used variables once it holds more than `max_memory_bytes`.
+    The on-disk cache has one pickle file per .mat file, so variables loaded in a previous run are not read from the .mat files again.
+    It can be shared by threads, e.g. nodes running at the same time. The .mat files are read without holding its lock."""
+
+    def __init__(self, cache_folder: str = None, max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES):
+        self.cache_folder = cache_folder
+        self.max_memory_bytes = max_memory_bytes
+        self.memory_bytes = 0
+        self.hits = 0 # Variables found in memory or on disk.
+        self.misses = 0 # Variables loaded from the .mat files.
+        self._memory = OrderedDict() # (mat file path, variable name) -> (file key, value, size in bytes), least recently used first.
+        self._lock = threading.Lock()
+
+    def load(self, mat_file_paths: list, vars_list: list, load_fcn) -> list:
+        """Load the variables from each of the .mat files, only reading the variables that are not cached.
+        `load_fcn(mat_file_paths, vars_list)` loads the variables that are not cached, and returns one {variable: value} dict per file.
+        Returns a list of {variable: value} dicts, in the same order as the file paths. Files that do not exist return an empty dict."""
+        all_vars = []
+        to_load = {} # Tuple of variables to load -> [(index, mat file path, file key)], so files missing the same variables are loaded together.
+        with self._lock:
+            for path_idx, mat_file_path in enumerate(mat_file_paths):
+                file_key = _get_file_key(mat_file_path)
+                if file_key is None:
+                    all_vars.append({})
+                    continue
+                vars_dict, missing_vars = self._get(mat_file_path, file_key, vars_list)
+                all_vars.append(vars_dict)
+                if missing_vars:
+                    to_load.setdefault(tuple(missing_vars), []).append((path_idx, mat_file_path, file_key))
+
+        for missing_vars, files in to_load.items():
+            with span("var_cache.load_missing", files=len(files), variables=len(missing_vars)):
+                loaded_vars = load_fcn([mat_file_path for _, mat_file_path, _ in files], list(missing_vars))
+            count("var_cache.misses", len(files) * len(missing_vars))
+            with self._lock:
+                for (path_idx, mat_file_path, file_key), vars_dict in zip(files, loaded_vars):
+                    self.misses += len(missing_vars)
+                    new_vars = {vr_name: vars_dict.get(vr_name, _NOT_IN_FILE) for vr_name in missing_vars}
+                    for vr_name, value in new_vars.items():
+                        self._put(mat_file_path, vr_name, file_key, value)
+                        if not _is_not_in_file(value):
+                            all_vars[path_idx][vr_name] = value
+                    self._save_to_disk(mat_file_path, file_key, new_vars)
+        return all_vars
+
+    def clear(self) -> None:
+        """Clear the in-memory cache. The on-disk cache is left as is."""
+        with self._lock:
+            self._memory.clear()
+            self.memory_bytes = 0
+
+    def _get(self, mat_file_path: str, file_key: tuple, vars_list: list) -> tuple:
+        """Get the cached variables of one .mat file. Returns the dict of cached variables, and the list of variables that are not cached."""
+        vars_dict = {}
+        missing_vars = []
+        disk_vars = None
+        for vr_name in vars_list:
+            entry = self._memory.get((mat_file_path, vr_name))
+            if entry is not None and entry[0] != file_key:
+                self._pop(mat_file_path, vr_name) # The file changed since the variable was cached.
+                entry = None
+            if entry is None:
+                if disk_vars is None:
+                    disk_vars = self._read_from_disk(mat_file_path, file_key)
+                if vr_name not in disk_vars:
+                    missing_vars.append(vr_name)
+                    continue
+                self._put(mat_file_path, vr_name, file_key, disk_vars[vr_name])
+                value = disk_vars[vr_name]
+            else:
+                self._memory.move_to_end((mat_file_path, vr_name))
+                value = entry[1]
+            self.hits += 1
+            count("var_cache.hits")
+            if not _is_not_in_file(value):
+                vars_dict[vr_name] = value
+        return vars_dict, missing_vars
+
+    def _put(self, mat_file_path: str, vr_name: str, file_key: tuple, value) -> None:
+        """Add the variable to the in-memory cache, evicting the least recently used variables if it's full."""
+        self._pop(mat_file_path, vr_name)
+        nbytes = _get_size(value)
+        if nbytes > self.max_memory_bytes:
+            return
+        self._memory[(mat_file_path, vr_name)] = (file_key, value, nbytes)
+        self.memory_bytes += nbytes
+        while self.memory_bytes > self.max_memory_bytes:
+            _, (_, _, evicted_nbytes) = self._memory.popitem(last=False)
+            self.memory_bytes -= evicted_nbytes
+
+    def _pop(self, mat_file_path: str, vr_name: str) -> None:
+        entry = self._memory.pop((mat_file_path, vr_name), None)
+        if entry is not None:
+            self.memory_bytes -= entry[2]
+
+    def _get_disk_path(self, mat_file_path: str) -> str:
+        return os.path.join(self.cache_folder, hashlib.sha1(os.path.abspath(mat_file_path).encode()).hexdigest() + ".pkl")
+
+    def _read_from_disk(self, mat_file_path: str, file_key: tuple) -> dict:
+        """Read the variables cached on disk for the .mat file. Returns an empty dict if there are none, or if the file changed since."""
+        if self.cache_folder is None:
+            return {}
+        disk_path = self._get_disk_path(mat_file_path)
+        try:
+            with open(disk_path, "rb") as f:
+                cached = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return {}
+        if cached["file_key"] != file_key:
+            return {}
+        return cached["vars"]
+
+    def _save_to_disk(self, mat_file_path: str, file_key: tuple, new_vars: dict) -> None:
+        """Add the variables to the .mat file's on-disk cache. Written to a temporary file first so a partial write is never read."""
+        if self.cache_folder is None:
+            return
+        os.makedirs(self.cache_folder, exist_ok=True)
+        disk_vars = self._read_from_disk(mat_file_path, file_key)
+        disk_vars.update(new_vars)
+        disk_path = self._get_disk_path(mat_file_path)
+        tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"file_key": file_key, "vars": disk_vars}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, disk_path)
+
+_variable_cache = None
+_variable_cache_lock = threading.Lock()
+
+def get_variable_cache() -> VariableCache:
+    """Get the variable cache shared by this process. It is stored on disk in the save data folder, if that is set."""
+    global _variable_cache
+    with _variable_cache_lock:
+        if _variable_cache is None:
+            cache_folder = None
+            if SAVE_DATA_FOLDER_KEY in os.environ:
+                cache_folder = os.path.join(os.environ[SAVE_DATA_FOLDER_KEY], VARIABLE_CACHE_FOLDER_NAME)
+            _variable_cache = VariableCache(cache_folder=cache_folder)
+        return _variable_cache
+
+def set_variable_cache(variable_cache: VariableCache) -> None:
+    """Replace the variable cache shared by this process, e.g. to change the memory cap or the folder."""
+    global _variable_cache
+    _variable_cache = variable_cache
+
+def _get_file_key(mat_file_path: str) -> tuple:
+    """Get the modification time and size of the file, or None if it does not exist."""
+    try:
+        stat = os.stat(mat_file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _is_not_in_file(value) -> bool:
+    """Compared by value because the marker is a new str once it's read back from disk."""
+    return isinstance(value, str) and value == _NOT_IN_FILE
+
+def _get_size(value) -> int:
+    """Estimate the memory used by the value."""
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum([_get_size(item) for item in value.flat])
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum([_get_size(item) for item in value])
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum([_get_size(item) for item in value.values()])
+    return sys.getsizeof(value)
@@ -0,0 +1,18 @@
+function [] = wrapperBatch(input_var_metadata, output_var_metadata, save_file_paths)
+
+%% PURPOSE: RUN THE WRAPPER FOR EACH DATA OBJECT IN A BATCH IN ONE CALL, SO THAT ONLY ONE ROUND TRIP TO THE ENGINE IS NEEDED.
+% Calls wrapper.m once per save file path, in order, with the same input and output variables' metadata.
+% Stops at the first data object whose wrapper call fails, and rethrows its error with the save file path.
+
+if ischar(save_file_paths)
+    save_file_paths = {save_file_paths};
+end
+
+for i = 1:length(save_file_paths)
+    save_file_path = char(save_file_paths{i});
+    try
+        wrapper(input_var_metadata, output_var_metadata, save_file_path);
+    catch err
+        error('ResearchOS:wrapperBatch', '%s: %s', save_file_path, err.message);
+    end
+end
@@ -0,0 +1,39 @@
+import pytest
+
+from ResearchOS.batches import get_batches_dict, get_batch_data_objects
+from ResearchOS.data_object_index import DataObjectIndex
+
+SCHEMA = ["Dataset", "Subject", "Task", "Trial"]
+SUBSET = ["S1.T1.R1", "S1.T1.R2", "S2.T1.R1", "S1.T2.R1", "S2.T2.R1"]
+
+def test_get_batches_dict():
+    assert get_batches_dict(SUBSET, [], schema=SCHEMA) == {data_object: [] for data_object in SUBSET}
+    batches = get_batches_dict(SUBSET, ["Subject"], schema=SCHEMA)
+    assert batches == {"S1": {"S1.T1.R1": [], "S1.T1.R2": [], "S1.T2.R1": []}, "S2": {"S2.T1.R1": [], "S2.T2.R1": []}}
+    batches = get_batches_dict(SUBSET, ["Subject", "Task"], schema=SCHEMA)
+    assert batches["S1"] == {"S1.T1": {"S1.T1.R1": [], "S1.T1.R2": []}, "S1.T2": {"S1.T2.R1": []}}
+    assert get_batches_dict(SUBSET, "Task", schema=SCHEMA)["S2.T2"] == {"S2.T2.R1": []}
+
+    # Each batch's data objects, in the order of the subset.
+    assert get_batch_data_objects("S1", batches["S1"]) == ["S1.T1.R1", "S1.T1.R2", "S1.T2.R1"]
+    assert get_batch_data_objects("S1.T1.R1", []) == ["S1.T1.R1"]
+
+    with pytest.raises(ValueError):
+        get_batches_dict(SUBSET, ["Session"], schema=SCHEMA)
+    with pytest.raises(ValueError):
+        get_batches_dict(SUBSET, ["Task", "Subject"], schema=SCHEMA)
+    with pytest.raises(ValueError):
+        get_batches_dict(["S1.T1"], ["Task"], schema=SCHEMA)
+
+def test_get_batches_dict_index():
+    # The ancestors are looked up in the index, so its delimiter is used, and data objects must be in it.
+    dobj_index = DataObjectIndex.from_names([data_object.replace(".", ",") for data_object in SUBSET], delimiter=",")
+    subset = list(dobj_index.at_level(2))
+    batches = get_batches_dict(subset, ["Subject", "Task"], schema=SCHEMA, dobj_index=dobj_index)
+    assert batches["S1"] == {"S1,T1": {"S1,T1,R1": [], "S1,T1,R2": []}, "S1,T2": {"S1,T2,R1": []}}
+    assert get_batches_dict(SUBSET[:2], ["Subject"], schema=SCHEMA, dobj_index=DataObjectIndex.from_names(SUBSET)) == {"S1": {"S1.T1.R1": [], "S1.T1.R2": []}}
+    with pytest.raises(ValueError):
+        get_batches_dict(["S3.T1.R1"], ["Subject"], schema=SCHEMA, dobj_index=DataObjectIndex.from_names(SUBSET))
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
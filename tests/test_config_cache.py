@@ -0,0 +1,79 @@
+import os
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import tomli as tomllib
+
+from ResearchOS import config_cache as config_cache_module
+from ResearchOS.config_cache import ConfigCache, thaw
+
+def test_config_cache(tmp_path: Path):
+    toml_path = str(tmp_path / "subsets.toml")
+    with open(toml_path, "w") as f:
+        f.write('[Subset1]\nand = [["speed", ">", 1]]\n')
+    cache = ConfigCache()
+
+    settings = cache.load(toml_path)
+    assert cache.load(toml_path) is settings
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert thaw(settings) == {"Subset1": {"and": [["speed", ">", 1]]}}
+
+    # The cached settings can't be modified.
+    with pytest.raises(TypeError):
+        settings["Subset1"]["and"] = []
+
+    # A modified file is parsed again.
+    with open(toml_path, "w") as f:
+        f.write('[Subset1]\nor = []\n')
+    os.utime(toml_path, ns=(0, 0))
+    assert thaw(cache.load(toml_path)) == {"Subset1": {"or": []}}
+    assert cache.misses == 2
+
+def test_config_cache_json(tmp_path: Path):
+    json_path = str(tmp_path / "constant.json")
+    with open(json_path, "w") as f:
+        f.write('{"a": [1, 2]}')
+    cache = ConfigCache()
+    value = thaw(cache.load(json_path))
+    value["a"].append(3)
+    assert thaw(cache.load(json_path)) == {"a": [1, 2]}
+    with pytest.raises(ValueError):
+        cache.load(str(tmp_path / "constant.txt"))
+
+def test_config_cache_threads(tmp_path: Path):
+    toml_paths = [str(tmp_path / f"settings{file_idx}.toml") for file_idx in range(4)]
+    for toml_path in toml_paths:
+        with open(toml_path, "w") as f:
+            f.write("a = 1\n")
+    cache = ConfigCache()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(cache.load, toml_paths * 200))
+    # Each file is parsed once, and every lookup is counted.
+    assert cache.misses == len(toml_paths)
+    assert cache.hits + cache.misses == len(results)
+    assert all(result is results[toml_idx % len(toml_paths)] for toml_idx, result in enumerate(results))
+
+def test_config_cache_package_index(tmp_path: Path, monkeypatch):
+    def read_index(package_folder_path: str) -> dict:
+        with open(os.path.join(package_folder_path, "src", "index.toml"), "rb") as f:
+            return tomllib.load(f)
+    monkeypatch.setattr(config_cache_module, "get_package_index_dict", read_index)
+    os.makedirs(tmp_path / "src")
+    with open(tmp_path / "pyproject.toml", "w") as f:
+        f.write('[tool.researchos]\nindex = "src/index.toml"\n')
+    index_path = str(tmp_path / "src" / "index.toml")
+    with open(index_path, "w") as f:
+        f.write('subsets = "subsets.toml"\n')
+    cache = ConfigCache()
+    index_dict = cache.get_package_index_dict(str(tmp_path))
+    assert cache.get_package_index_dict(str(tmp_path)) is index_dict
+
+    # A modified index file is read again, without clearing the cache.
+    with open(index_path, "w") as f:
+        f.write('subsets = "src/subsets.toml"\n')
+    os.utime(index_path, ns=(0, 0))
+    assert thaw(cache.get_package_index_dict(str(tmp_path))) == {"subsets": "src/subsets.toml"}
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
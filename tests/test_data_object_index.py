@@ -0,0 +1,53 @@
+import pytest
+
+from ResearchOS.data_object_index import DataObjectIndex, NO_ID
+
+def test_data_object_index():
+    index = DataObjectIndex.from_names(["S1.T1", "S1.T2", "S2.T1", "S1.T1"], delimiter=".")
+
+    assert list(index.at_level(0)) == ["S1", "S2"]
+    assert list(index.at_level(1)) == ["S1.T1", "S1.T2", "S2.T1"]
+    assert list(index.at_level(2)) == []
+    assert len(index) == 5
+    assert index.num_levels == 2
+
+    assert index.level("S2.T1") == 1
+    assert index.parent("S2.T1") == "S2"
+    assert index.parent("S2") is None
+    assert index.children("S1") == ["S1.T1", "S1.T2"]
+    assert index.ancestors("S1.T2") == ["S1"]
+    assert index.descendants("S1") == ["S1.T1", "S1.T2"]
+    assert "S1.T3" not in index
+
+    # Adding a data object returns its name and its ancestors' names at each level.
+    assert index.add(["S3", "T1", "C1"]) == ["S3", "S3.T1", "S3.T1.C1"]
+    assert index.ancestors("S3.T1.C1") == ["S3", "S3.T1"]
+
+    # A name with the delimiter in it could not be split back into its names.
+    with pytest.raises(ValueError, match="can't contain the delimiter"):
+        index.add(["S4", "T1.5"])
+    assert "S4.T1" not in index
+
+def test_data_object_index_ids():
+    index = DataObjectIndex.from_names(["S1,T1", "S1,T2", "S2,T1"], delimiter=",")
+    # IDs are assigned in the order the data objects are added, ancestors first.
+    assert index.add_ids(["S1", "T2"]) == [0, 2]
+    assert index.get_id("S2,T1") == 4
+    assert index.get_name(4) == "S2,T1"
+    assert index.get_names(index.ids_at_level(1)) == ["S1,T1", "S1,T2", "S2,T1"]
+    assert list(index.ids_at_level(0)) == [0, 3]
+
+    assert index.id_level(4) == 1
+    assert index.id_parent(4) == 3
+    assert index.id_parent(3) == NO_ID
+    assert index.id_children(0) == [1, 2]
+    assert index.id_children(1) == []
+    assert index.id_ancestors(4) == [3]
+    assert index.id_descendants(0) == [1, 2]
+    with pytest.raises(KeyError):
+        index.get_id("S1,T3")
+    with pytest.raises(KeyError):
+        index.parent("S3")
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
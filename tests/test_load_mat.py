@@ -0,0 +1,67 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+import scipy.io
+
+from ResearchOS.load_mat import load_mat_variables
+
+class FakeMatlabEngine:
+    """Reads the .mat files with scipy, and counts the engine calls."""
+    def __init__(self):
+        self.num_calls = 0
+
+    def readMatFileSafe(self, mat_file_path: str, vars_list: list) -> dict:
+        self.num_calls += 1
+        if not os.path.exists(mat_file_path):
+            return {}
+        mat_vars = scipy.io.loadmat(mat_file_path, variable_names=vars_list, simplify_cells=True)
+        return {vr_name: mat_vars[vr_name] for vr_name in vars_list if vr_name in mat_vars}
+
+    def readMatFilesSafe(self, mat_file_paths: list, vars_list: list) -> list:
+        num_calls = self.num_calls
+        all_vars = [self.readMatFileSafe(mat_file_path, vars_list) for mat_file_path in mat_file_paths]
+        self.num_calls = num_calls + 1
+        return all_vars
+
+def _make_mat_files(tmp_path: Path) -> list:
+    paths = []
+    for trial in range(5):
+        path = str(tmp_path / f"T{trial}.mat")
+        scipy.io.savemat(path, {"speed": float(trial), "side": "left", "data": np.arange(3.0)})
+        paths.append(path)
+    paths.append(str(tmp_path / "missing.mat"))
+    return paths
+
+def test_load_mat_variables_scipy(tmp_path: Path):
+    paths = _make_mat_files(tmp_path)
+    all_vars = load_mat_variables(paths, ["speed", "side", "data", "missing"], loader="scipy")
+    assert len(all_vars) == 6
+    assert all_vars[2]["speed"] == 2.0 and isinstance(all_vars[2]["speed"], float)
+    assert all_vars[2]["side"] == "left"
+    assert all_vars[2]["data"].tolist() == [0.0, 1.0, 2.0]
+    assert "missing" not in all_vars[2]
+    assert all_vars[5] == {}
+
+def test_load_mat_variables_matlab_batch(tmp_path: Path):
+    paths = _make_mat_files(tmp_path)
+    matlab = {"matlab_eng": FakeMatlabEngine()}
+    batch_vars = load_mat_variables(paths, ["speed"], loader="matlab_batch", matlab=matlab)
+    assert matlab["matlab_eng"].num_calls == 1
+    assert batch_vars == load_mat_variables(paths, ["speed"], loader="scipy")
+
+    load_mat_variables(paths, ["speed"], loader="matlab_batch", matlab=matlab, batch_size=4)
+    assert matlab["matlab_eng"].num_calls == 3
+
+    assert load_mat_variables(paths, ["speed"], loader="matlab", matlab=matlab) == batch_vars
+    assert matlab["matlab_eng"].num_calls == 9
+
+def test_load_mat_variables_invalid():
+    with pytest.raises(ValueError):
+        load_mat_variables([], [], loader="h5py")
+    with pytest.raises(ValueError):
+        load_mat_variables([], [], loader="matlab_batch")
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
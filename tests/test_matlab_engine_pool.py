@@ -0,0 +1,123 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ResearchOS.matlab_eng import MatlabEnginePool
+
+class FakeEngine:
+    """Stand-in for a MATLAB engine."""
+    num_started = 0
+
+    def __init__(self, name: str = None):
+        FakeEngine.num_started += 1
+        self.name = name
+        self.paths = []
+        self.warmed_up = False
+        self.crashed = False
+        self.quit_called = False
+
+    def addpath(self, path: str):
+        self.paths.append(path)
+
+    def eval(self, command: str, nargout: int = 0):
+        if self.crashed:
+            raise RuntimeError("MATLAB is not running")
+
+    def quit(self):
+        self.quit_called = True
+
+def warm_up(engine: FakeEngine):
+    engine.warmed_up = True
+
+@pytest.fixture(autouse=True)
+def reset_counter():
+    FakeEngine.num_started = 0
+
+def test_engine_pool_lease():
+    pool = MatlabEnginePool(num_engines=2, addpaths=["m_files"], warm_up=warm_up, start_engine=FakeEngine)
+    assert FakeEngine.num_started == 2
+    with pool.lease() as engine1, pool.lease() as engine2:
+        assert engine1 is not engine2
+        assert engine1.paths == ["m_files"] and engine1.warmed_up
+        # All engines are leased.
+        with pytest.raises(ValueError):
+            with pool.lease(timeout=0.01):
+                pass
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        def work(_):
+            with pool.lease() as engine:
+                return engine
+        engines = list(executor.map(work, range(20)))
+    assert len(set(map(id, engines))) <= 2
+    utilization = pool.utilization()
+    assert sum([engine["leases"] for engine in utilization]) == 22
+    assert all([0 <= engine["utilization"] <= 1 for engine in utilization])
+    assert FakeEngine.num_started == 2 # Engines are reused, not restarted.
+
+    pool.close()
+    assert engine1.quit_called and engine2.quit_called
+    with pytest.raises(ValueError):
+        with pool.lease():
+            pass
+
+def test_engine_pool_recycles_engines():
+    pool = MatlabEnginePool(num_engines=1, start_engine=FakeEngine, max_leases=3)
+    # An error from the work itself keeps the engine.
+    with pytest.raises(KeyError):
+        with pool.lease() as engine:
+            raise KeyError("bad input")
+    with pool.lease() as same_engine:
+        assert same_engine is engine
+
+    # A crashed engine is replaced.
+    with pytest.raises(RuntimeError):
+        with pool.lease() as engine:
+            engine.crashed = True
+            engine.eval("x = 1;")
+    with pool.lease() as new_engine:
+        assert new_engine is not engine
+    assert pool.utilization()[0]["restarts"] == 1
+
+    # Engines are replaced after max_leases leases.
+    for _ in range(2):
+        with pool.lease():
+            pass
+    assert pool.utilization()[0]["restarts"] == 2
+
+def test_engine_pool_restart_fails():
+    def start_engine():
+        if FakeEngine.num_started == 2:
+            raise RuntimeError("MATLAB license unavailable")
+        return FakeEngine()
+    pool = MatlabEnginePool(num_engines=2, start_engine=start_engine)
+    # The lease's own error is raised, not the restart's.
+    with pytest.raises(KeyError):
+        with pool.lease() as engine:
+            engine.crashed = True
+            raise KeyError("bad input")
+    assert pool.utilization()[0]["restarts"] == 1
+
+    # The other engine can still be leased, and when it fails too the leases waiting for an engine are woken up.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        with pytest.raises(RuntimeError):
+            with pool.lease() as engine:
+                def wait_for_engine():
+                    with pool.lease():
+                        pass
+                waiting = executor.submit(wait_for_engine)
+                engine.crashed = True
+                raise RuntimeError("crashed")
+        with pytest.raises(ValueError):
+            waiting.result(timeout=5)
+    with pytest.raises(ValueError):
+        with pool.lease():
+            pass
+
+def test_engine_pool_shared_sessions():
+    pool = MatlabEnginePool(shared_session_names=["ResearchOS1", "ResearchOS2"], connect_engine=FakeEngine)
+    with pool.lease() as engine1, pool.lease() as engine2:
+        assert sorted([engine1.name, engine2.name]) == ["ResearchOS1", "ResearchOS2"]
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
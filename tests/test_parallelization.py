@@ -0,0 +1,105 @@
+import os
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from ResearchOS.parallelization import locked_write_parquet, locked_read_parquet, read_parquet_store, read_parquet_arrays, compact_parquet_store, locked_files
+
+def _append_rows(store_path: str, writer: int, num_writes: int) -> None:
+    for write in range(num_writes):
+        locked_write_parquet(store_path, pa.table({"writer": [writer] * 5, "write": [write] * 5}), mode='a')
+
+def _increment(file_paths: list, num_increments: int) -> None:
+    # Read, modify and write each file, like saving a data object's outputs.
+    for _ in range(num_increments):
+        with locked_files(file_paths):
+            for file_path in file_paths:
+                value = int(open(file_path).read()) if os.path.exists(file_path) else 0
+                with open(file_path, "w") as f:
+                    f.write(str(value + 1))
+
+def test_write_append_read(tmp_path: Path):
+    store_path = str(tmp_path / "store")
+    locked_write_parquet(store_path, pa.table({"x": [1, 2]}))
+    locked_write_parquet(store_path, pa.table({"x": [3]}), mode='a')
+    assert read_parquet_store(store_path)["x"].to_pylist() == [1, 2, 3]
+
+    # Overwriting replaces all rows.
+    locked_write_parquet(store_path, pa.table({"x": [4]}), mode='w')
+    assert read_parquet_store(store_path)["x"].to_pylist() == [4]
+    assert len([f for f in os.listdir(store_path) if f.endswith(".parquet")]) == 1
+
+    with pytest.raises(ValueError):
+        locked_write_parquet(store_path, pa.table({"x": [5]}), mode='r')
+
+def test_concurrent_appends(tmp_path: Path):
+    store_path = str(tmp_path / "store")
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(_append_rows, store_path, writer, 10) for writer in range(4)]
+        # Read while the writers are appending.
+        for _ in range(5):
+            try:
+                assert read_parquet_store(store_path).num_rows % 5 == 0 # Never a partial fragment.
+            except (FileNotFoundError, ValueError):
+                pass # Nothing written yet.
+        for future in futures:
+            future.result()
+    df = locked_read_parquet(store_path)
+    assert len(df) == 4 * 10 * 5
+    # Each writer's appends are in order.
+    assert df[df["writer"] == 0]["write"].tolist() == sorted(df[df["writer"] == 0]["write"].tolist())
+
+    compact_parquet_store(store_path)
+    assert len([f for f in os.listdir(store_path) if f.endswith(".parquet")]) == 1
+    assert locked_read_parquet(store_path, columns=["writer"]).shape == (200, 1)
+
+def test_locked_files(tmp_path: Path):
+    # No increment is lost, and workers locking overlapping files in different orders don't deadlock.
+    paths = [str(tmp_path / "S1" / "T1.mat"), str(tmp_path / "S1" / "T2.mat")]
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(_increment, paths if writer % 2 else paths[::-1], 20) for writer in range(4)]
+        for future in futures:
+            future.result()
+    assert [open(path).read() for path in paths] == ["80", "80"]
+
+def test_projected_filtered_reads(tmp_path: Path):
+    store_path = str(tmp_path / "store")
+    locked_write_parquet(store_path, pa.table({"data_object": ["S01", "S02", "S03"], "value": [1.0, 2.0, 3.0], "other": ["a", "b", "c"]}))
+    table = read_parquet_store(store_path, columns=["value"], filters=[("data_object", "in", ["S01", "S03"])])
+    assert table.column_names == ["value"]
+    assert table["value"].to_pylist() == [1.0, 3.0]
+
+    arrays = read_parquet_arrays(store_path, ["value"], filters=[("data_object", "==", "S02")])
+    assert isinstance(arrays["value"], np.ndarray)
+    assert arrays["value"].tolist() == [2.0]
+
+    # Several fragments are concatenated.
+    locked_write_parquet(store_path, pa.table({"data_object": ["S04"], "value": [4.0], "other": ["d"]}), mode='a')
+    assert read_parquet_arrays(store_path, ["value", "data_object"])["value"].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert locked_read_parquet(store_path, columns=["other"], filters=[("value", ">", 2.5)])["other"].tolist() == ["c", "d"]
+
+def test_write_single_file_store(tmp_path: Path):
+    # A store written as one Parquet file (the old layout) keeps its rows as the first fragment of the new store folder.
+    store_path = str(tmp_path / "store.parquet")
+    pq.write_table(pa.table({"data_object": ["S01"], "value": [1.0]}), store_path)
+    locked_write_parquet(store_path, pa.table({"data_object": ["S02"], "value": [2.0]}), mode='a')
+    assert os.path.isdir(store_path)
+    assert locked_read_parquet(store_path)["data_object"].tolist() == ["S01", "S02"]
+    locked_write_parquet(store_path, pa.table({"data_object": ["S03"], "value": [3.0]}), mode='w')
+    assert locked_read_parquet(store_path)["data_object"].tolist() == ["S03"]
+
+    # Writers that find the single file at the same time all append to the one new store folder.
+    store_path = str(tmp_path / "concurrent.parquet")
+    pq.write_table(pa.table({"writer": [-1], "write": [0]}), store_path)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(_append_rows, store_path, writer, 5) for writer in range(4)]
+        for future in futures:
+            future.result()
+    assert sorted(locked_read_parquet(store_path)["writer"].tolist()) == [-1] + sorted(list(range(4)) * 25)
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from ResearchOS.parquet_dataset import data_objects_to_table, write_data_objects_dataset, read_data_object, save_data_objects
+
+FACTORS = ["Subject", "Trial"]
+COLUMN_HASHES = {"age": "hash_age", "speed": "hash_speed"}
+ALL_ATTRS = {
+    "S1": {"age": 20.0},
+    "S2": {"age": 30.0},
+    "S1.T1": {"speed": 1.5},
+    "S1.T2": {"speed": None},
+    "S2.T1": {"speed": 2.5},
+}
+
+def test_write_and_read_data_objects_dataset(tmp_path: Path):
+    dataset_path = str(tmp_path / "dataset")
+    table = data_objects_to_table(ALL_ATTRS, FACTORS, COLUMN_HASHES)
+    assert table.num_rows == len(ALL_ATTRS)
+    write_data_objects_dataset(dataset_path, table, FACTORS, row_group_size=2)
+
+    # One folder per Subject.
+    assert sorted(os.listdir(dataset_path)) == ["Subject=S1", "Subject=S2"]
+
+    assert read_data_object(dataset_path, "S1", FACTORS) == {"Subject": "S1", "Trial": None, "hash_age": 20.0, "hash_speed": None}
+    assert read_data_object(dataset_path, "S1.T1", FACTORS, columns=["hash_speed"]) == {"hash_speed": 1.5}
+    assert read_data_object(dataset_path, "S1.T2", FACTORS, columns=["hash_speed"]) == {"hash_speed": None}
+    assert read_data_object(dataset_path, "S3", FACTORS) == {}
+
+    # Rewriting one partition leaves the other partitions as is.
+    table = data_objects_to_table({"S2": {"age": 31.0}}, FACTORS, COLUMN_HASHES, schema=table.schema)
+    write_data_objects_dataset(dataset_path, table, FACTORS)
+    assert read_data_object(dataset_path, "S2", FACTORS, columns=["hash_age"]) == {"hash_age": 31.0}
+    assert read_data_object(dataset_path, "S2.T1", FACTORS) == {}
+    assert read_data_object(dataset_path, "S1.T1", FACTORS, columns=["hash_speed"]) == {"hash_speed": 1.5}
+
+def test_save_data_objects_incremental(tmp_path: Path):
+    dataset_path = str(tmp_path / "dataset")
+    created, modified, deleted = save_data_objects(dataset_path, ALL_ATTRS, FACTORS, COLUMN_HASHES, incremental=True)
+    assert (created, modified, deleted) == (sorted(ALL_ATTRS), [], [])
+
+    # Re-importing the same data changes nothing.
+    assert save_data_objects(dataset_path, ALL_ATTRS, FACTORS, COLUMN_HASHES, incremental=True) == ([], [], [])
+
+    # Append a trial, modify a subject and delete another subject.
+    all_attrs = {dobj: attrs for dobj, attrs in ALL_ATTRS.items() if not dobj.startswith("S2")}
+    all_attrs["S1"] = {"age": 21.0}
+    all_attrs["S1.T3"] = {"speed": 3.5}
+    created, modified, deleted = save_data_objects(dataset_path, all_attrs, FACTORS, COLUMN_HASHES, incremental=True)
+    assert (created, modified, deleted) == (["S1.T3"], ["S1"], ["S2", "S2.T1"])
+    assert sorted(os.listdir(dataset_path)) == ["Subject=S1", "_fingerprints.json"]
+    assert read_data_object(dataset_path, "S1", FACTORS, columns=["hash_age"]) == {"hash_age": 21.0}
+    assert read_data_object(dataset_path, "S1.T3", FACTORS, columns=["hash_speed"]) == {"hash_speed": 3.5}
+    assert read_data_object(dataset_path, "S2", FACTORS) == {}
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
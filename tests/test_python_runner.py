@@ -0,0 +1,112 @@
+import os
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import scipy.io
+
+from ResearchOS import run, python_runner
+from ResearchOS.constants import SAVE_DATA_FOLDER_KEY
+from ResearchOS.python_runner import import_function, run_python_batch, batched, stack_inputs, unstack_outputs, save_outputs
+from ResearchOS.result_cache import ResultCache, SKIPPED, RECOMPUTED
+
+FUNCTIONS_CODE = """
+from ResearchOS.python_runner import batched
+
+calls = []
+
+def scale(x, factor):
+    calls.append(1)
+    return x * factor, x.sum()
+
+@batched
+def scale_batched(x, factor):
+    calls.append(1)
+    return x * factor[:, None], x.sum(axis=1)
+"""
+
+def test_run_python_batch(tmp_path: Path):
+    functions_path = tmp_path / "functions.py"
+    functions_path.write_text(FUNCTIONS_CODE)
+    scale = import_function(f"{functions_path}:scale")
+    scale_batched = import_function(f"{functions_path}:scale_batched")
+    assert import_function(f"{functions_path}:scale") is scale # Imported once.
+
+    data_objects = [f"S{idx}" for idx in range(5)]
+    inputs = [{"x": np.arange(3) + idx, "factor": 2.0} for idx in range(5)]
+    results = run_python_batch(scale, data_objects, inputs, ["y", "total"])
+    batched_results = run_python_batch(scale_batched, data_objects, inputs, ["y", "total"], batch_size=2)
+    # Same results, with one call per data object or one call per batch of data objects.
+    assert [result["data_object"] for result in batched_results] == data_objects
+    for result, batched_result in zip(results, batched_results):
+        assert np.array_equal(result["result"]["y"], batched_result["result"]["y"])
+        assert result["result"]["total"] == batched_result["result"]["total"]
+    calls = scale.__globals__["calls"]
+    assert len(calls) == 5 + 3
+
+    # A batched call that fails fails all of its data objects.
+    results = run_python_batch(scale_batched, data_objects, [{"x": np.arange(idx + 1), "factor": 1.0} for idx in range(5)], ["y", "total"])
+    assert all([result["error"] is not None for result in results])
+
+def test_stack_inputs():
+    stacked = stack_inputs([{"x": np.ones(2), "n": 1, "s": "a"}, {"x": np.zeros(2), "n": 2, "s": "b"}])
+    assert stacked["x"].shape == (2, 2)
+    assert np.array_equal(stacked["n"], [1, 2])
+    assert stacked["s"] == ["a", "b"]
+    assert unstack_outputs({"n": stacked["n"], "s": stacked["s"]}, 2) == [{"n": 1, "s": "a"}, {"n": 2, "s": "b"}]
+    with pytest.raises(ValueError):
+        unstack_outputs({"n": np.arange(3)}, 2)
+
+def test_run_python_node(tmp_path: Path, monkeypatch):
+    monkeypatch.setenv(SAVE_DATA_FOLDER_KEY, str(tmp_path))
+    for idx in range(4):
+        (tmp_path / "S1").mkdir(exist_ok=True)
+        scipy.io.savemat(str(tmp_path / "S1" / f"T{idx}.mat"), {"x_hash": np.full(3, float(idx))})
+    double = batched(lambda x: x * 2)
+    monkeypatch.setitem(python_runner._functions, "test.double", double)
+    node_settings = {"language": "python", "function": "test.double", "inputs": {"x": "x_hash"}, "outputs": ["y_hash"],
+                     "batches": {f"S1.T{idx}": [] for idx in range(4)}, "node_hash": "node", "result_cache": ResultCache(str(tmp_path / "cache"))}
+    results = run._run_python_node(node_settings)
+    assert [result["result"] for result in results] == [RECOMPUTED] * 4
+    mat_vars = scipy.io.loadmat(str(tmp_path / "S1" / "T3.mat"))
+    assert np.array_equal(mat_vars["y_hash"].ravel(), [6.0, 6.0, 6.0])
+    assert np.array_equal(mat_vars["x_hash"].ravel(), [3.0, 3.0, 3.0]) # The other variables are kept.
+
+    # Up to date data objects are skipped.
+    node_settings["batches"]["S1.T4"] = []
+    scipy.io.savemat(str(tmp_path / "S1" / "T4.mat"), {"x_hash": np.ones(3)})
+    results = run._run_python_node(node_settings)
+    assert [result["result"] for result in results] == [SKIPPED] * 4 + [RECOMPUTED]
+
+def test_save_outputs_concurrently(tmp_path: Path):
+    # Nodes running at the same time save different variables to the same data object's file, and none of them are lost.
+    save_file_path = str(tmp_path / "S1" / "T1.mat")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda idx: save_outputs(save_file_path, {f"y{idx}_hash": float(idx)}), range(32)))
+    mat_vars = scipy.io.loadmat(save_file_path)
+    assert sorted(name for name in mat_vars if not name.startswith("__")) == sorted(f"y{idx}_hash" for idx in range(32))
+
+def test_save_outputs_atomic(tmp_path: Path, monkeypatch):
+    save_file_path = str(tmp_path / "S1" / "T1.mat")
+    save_outputs(save_file_path, {"x_hash": 1.0})
+    # A save that fails partway leaves the previous file as it was.
+    def failing_savemat(f, mat_vars):
+        f.write(b"partial")
+        raise OSError("No space left on device")
+    with monkeypatch.context() as m:
+        m.setattr(scipy.io, "savemat", failing_savemat)
+        with pytest.raises(OSError):
+            save_outputs(save_file_path, {"y_hash": 2.0})
+    assert scipy.io.loadmat(save_file_path)["x_hash"].item() == 1.0
+    assert sorted(os.listdir(tmp_path / "S1")) == ["T1.mat", "T1.mat.lock"]
+
+    # MATLAB v7.3 (HDF5) files can't be read or written by scipy.
+    v73_path = str(tmp_path / "S1" / "T2.mat")
+    with open(v73_path, "wb") as f:
+        f.write(b"MATLAB 7.3 MAT-file".ljust(116) + bytes(8) + b"\x00\x02IM" + bytes(512))
+    with pytest.raises(ValueError, match="v7.3"):
+        save_outputs(v73_path, {"y_hash": 2.0})
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
@@ -1,8 +1,29 @@
 import os
+import json
+from pathlib import Path
 
 import pytest
 
+from ResearchOS import read_logsheet as read_logsheet_module
 from ResearchOS.read_logsheet import read_logsheet
+from ResearchOS.batches import get_batches_dict
+from ResearchOS.data_object_index import get_save_file_path
+from ResearchOS.constants import SAVE_DATA_FOLDER_KEY
+from ResearchOS.parquet_dataset import LOGSHEET_DATASET_NAME, open_data_objects_dataset, read_fingerprints
+
+LOGSHEETS_FOLDER = os.path.join(os.path.dirname(__file__), "logsheets")
+FACTORS = ["Subject", "Session", "Trial"]
+HEADERS = {
+    "Subject": {"column_name": "Subject", "type": "str", "level": "Subject"},
+    "Session": {"column_name": "Session", "type": "str", "level": "Session"},
+    "Trial": {"column_name": "Trial", "type": "str", "level": "Trial"},
+    "Age": {"column_name": "Age", "type": "num", "level": "Subject"},
+    "Height": {"column_name": "Height", "type": "num", "level": "Subject"},
+    "Condition": {"column_name": "Condition", "type": "str", "level": "Session"},
+    "Speed": {"column_name": "Speed", "type": "num", "level": "Trial"},
+    "Valid": {"column_name": "Valid", "type": "bool", "level": "Trial"},
+    "Notes": {"column_name": "Notes", "type": "str", "level": "Trial"},
+}
 
 def test_read_logsheet():
 
@@ -10,5 +31,97 @@ def test_read_logsheet():
     logsheet_toml_path = os.sep.join([project_folder, "src", "logsheet.toml"])
     read_logsheet(project_folder, logsheet_toml_path=logsheet_toml_path)
 
+def use_logsheet(tmp_path: Path, monkeypatch, file_name: str = "logsheet.csv") -> None:
+    """Read one of the test logsheets instead of the project's, and save its data objects in tmp_path."""
+    logsheet_dict = {"path": os.path.join(LOGSHEETS_FOLDER, file_name), "num_header_rows": 1, "dataset_factors": FACTORS, "headers": HEADERS}
+    monkeypatch.setattr(read_logsheet_module, "get_logsheet_dict", lambda *args, **kw: logsheet_dict)
+    monkeypatch.setenv(SAVE_DATA_FOLDER_KEY, str(tmp_path))
+
+def import_logsheet(tmp_path: Path, monkeypatch, file_name: str = "logsheet.csv", **kwargs) -> tuple:
+    """Import one of the test logsheets into tmp_path. Returns the data objects' rows, with the output variables' names instead of their hashes, and the fingerprints."""
+    use_logsheet(tmp_path, monkeypatch, file_name)
+    read_logsheet(str(tmp_path), **kwargs)
+    dataset_path = os.path.join(str(tmp_path), LOGSHEET_DATASET_NAME)
+    table = open_data_objects_dataset(dataset_path, FACTORS).to_table()
+    # The hash columns are in the order of the headers.
+    hash_columns = [name for name in table.schema.names if name not in FACTORS]
+    table = table.select(FACTORS + hash_columns).rename_columns(FACTORS + [header.lower() for header in HEADERS])
+    rows = sorted(table.to_pylist(), key=lambda row: [row[factor] or "" for factor in FACTORS])
+    return rows, read_fingerprints(dataset_path)
+
+def test_read_logsheet_values(tmp_path: Path, monkeypatch):
+    rows, fingerprints = import_logsheet(tmp_path / "default", monkeypatch)
+    with open(os.path.join(LOGSHEETS_FOLDER, "expected_data_objects.json"), "r") as f:
+        assert rows == json.load(f)
+    assert len(fingerprints) == len(rows)
+
+    # The first conflicting value in row order is reported, e.g. Condition in the 2nd row before Age in the 3rd row.
+    with pytest.raises(ValueError, match="Column: Condition Data Object: S1.Pre has multiple values"):
+        import_logsheet(tmp_path / "conflicts", monkeypatch, file_name="logsheet_conflicts.csv")
+
+def test_read_logsheet_arrow(tmp_path: Path, monkeypatch):
+    assert import_logsheet(tmp_path / "arrow", monkeypatch, backend="arrow") == import_logsheet(tmp_path / "default", monkeypatch)
+    # Conflicting values fall back to the Python reader, which raises the same error.
+    with pytest.raises(ValueError) as arrow_error:
+        import_logsheet(tmp_path / "arrow_conflicts", monkeypatch, file_name="logsheet_conflicts.csv", backend="arrow")
+    with pytest.raises(ValueError) as error:
+        import_logsheet(tmp_path / "conflicts", monkeypatch, file_name="logsheet_conflicts.csv")
+    assert str(arrow_error.value) == str(error.value)
+
+@pytest.mark.parametrize("chunk_size", [1, 3])
+def test_read_logsheet_chunked(tmp_path: Path, monkeypatch, chunk_size: int):
+    # The subjects' rows are not grouped together, so the saved subjects are read back in and saved again.
+    assert import_logsheet(tmp_path / "chunked", monkeypatch, chunk_size=chunk_size) == import_logsheet(tmp_path / "default", monkeypatch)
+    with pytest.raises(ValueError) as chunked_error:
+        import_logsheet(tmp_path / "chunked_conflicts", monkeypatch, file_name="logsheet_conflicts.csv", chunk_size=chunk_size)
+    with pytest.raises(ValueError) as error:
+        import_logsheet(tmp_path / "conflicts", monkeypatch, file_name="logsheet_conflicts.csv")
+    assert str(chunked_error.value) == str(error.value)
+
+def test_read_logsheet_workers(tmp_path: Path, monkeypatch):
+    assert import_logsheet(tmp_path / "workers", monkeypatch, workers=2) == import_logsheet(tmp_path / "default", monkeypatch)
+    assert import_logsheet(tmp_path / "chunked_workers", monkeypatch, workers=2, chunk_size=3) == import_logsheet(tmp_path / "default", monkeypatch)
+    with pytest.raises(ValueError) as error:
+        import_logsheet(tmp_path / "conflicts", monkeypatch, file_name="logsheet_conflicts.csv")
+    # With 2 workers the conflict is within one worker's rows, with 4 workers (one row each) it is found when merging.
+    for workers in [2, 4]:
+        with pytest.raises(ValueError) as workers_error:
+            import_logsheet(tmp_path / f"workers_conflicts_{workers}", monkeypatch, file_name="logsheet_conflicts.csv", workers=workers)
+        assert str(workers_error.value) == str(error.value)
+
+def test_read_logsheet_data_object_names(tmp_path: Path, monkeypatch):
+    # The index's names are split the same way by the batches and the save file paths.
+    use_logsheet(tmp_path, monkeypatch)
+    dobj_index = read_logsheet(str(tmp_path))
+    trials = list(dobj_index.at_level(2))
+    assert trials[:3] == ["S2.Pre.T1", "S1.Pre.T1", "S1.Pre.T2"]
+    batches = get_batches_dict(trials, ["Subject", "Session"], schema=["Dataset"] + FACTORS, dobj_index=dobj_index)
+    assert list(batches) == ["S2", "S1", "S10"]
+    assert batches["S1"] == {"S1.Pre": {"S1.Pre.T1": [], "S1.Pre.T2": []}, "S1.Post": {"S1.Post.T1": [], "S1.Post.T2": []}}
+    assert get_save_file_path(str(tmp_path), "S1.Pre.T2") == os.path.join(str(tmp_path), "S1", "Pre", "T2.mat")
+
+def test_read_logsheet_num_factors(tmp_path: Path, monkeypatch):
+    # Whole numbers are formatted without a decimal point, so they don't add a level to the data object names.
+    headers = {factor: {"column_name": factor, "type": "num" if factor != "Session" else "str", "level": factor} for factor in FACTORS}
+    logsheet_path = tmp_path / "logsheet.csv"
+    logsheet_path.write_text("Subject,Session,Trial\n1,Pre,1\n1,Pre,2.0\n2,Post,1\n")
+    logsheet_dict = {"path": str(logsheet_path), "num_header_rows": 1, "dataset_factors": FACTORS, "headers": headers}
+    monkeypatch.setattr(read_logsheet_module, "get_logsheet_dict", lambda *args, **kw: logsheet_dict)
+    for kwargs in [{}, {"backend": "arrow"}, {"chunk_size": 1}]:
+        save_folder = tmp_path / str(kwargs)
+        monkeypatch.setenv(SAVE_DATA_FOLDER_KEY, str(save_folder))
+        dobj_index = read_logsheet(str(tmp_path), **kwargs)
+        assert list(dobj_index.at_level(2)) == ["1.Pre.1", "1.Pre.2", "2.Post.1"]
+        assert dobj_index.descendants("1") == ["1.Pre", "1.Pre.1", "1.Pre.2"]
+        table = open_data_objects_dataset(os.path.join(str(save_folder), LOGSHEET_DATASET_NAME), FACTORS).to_table(columns=FACTORS)
+        assert sorted(row["Trial"] for row in table.to_pylist() if row["Trial"] is not None) == ["1", "1", "2"]
+    assert get_save_file_path(str(tmp_path), "1.Pre.2") == os.path.join(str(tmp_path), "1", "Pre", "2.mat")
+
+    # Other numbers would contain the delimiter.
+    logsheet_path.write_text("Subject,Session,Trial\n1,Pre,1.5\n")
+    for kwargs in [{}, {"backend": "arrow"}, {"chunk_size": 1}]:
+        with pytest.raises(ValueError, match="Data object name '1.5' can't contain the delimiter '.'"):
+            read_logsheet(str(tmp_path), **kwargs)
+
 if __name__ == "__main__":
-    pytest.main([__file__])
\ No newline at end of file
+    pytest.main(['-v', __file__])
@@ -0,0 +1,42 @@
+import networkx as nx
+import pytest
+
+from ResearchOS import resolve_dag as resolve_dag_module
+from ResearchOS.resolve_dag import resolve_dag, resolve_dags
+
+class FakeDataObjectName:
+    def __init__(self):
+        self.value = None
+
+    def resolve(self, data_object: list):
+        self.value = ".".join(data_object)
+
+class FakeRunnable:
+    pass
+
+@pytest.fixture
+def dag(monkeypatch) -> nx.MultiDiGraph:
+    monkeypatch.setattr(resolve_dag_module, "NODE_TYPES_TO_RESOLVE", (FakeDataObjectName,))
+    dag = nx.MultiDiGraph()
+    dag.add_node("name", node=FakeDataObjectName())
+    dag.add_node("runnable", node=FakeRunnable())
+    dag.add_edge("name", "runnable")
+    return dag
+
+def test_resolve_dag(dag: nx.MultiDiGraph):
+    resolved = resolve_dag(dag, ["S1", "T1"])
+    assert resolved.nodes["name"]["node"].value == "S1.T1"
+    # Only the nodes to resolve are copied, and the DAG is unchanged.
+    assert resolved.nodes["runnable"]["node"] is dag.nodes["runnable"]["node"]
+    assert dag.nodes["name"]["node"].value is None
+    assert list(resolved.predecessors("runnable")) == ["name"]
+    assert list(resolved.nodes) == ["name", "runnable"]
+    with pytest.raises(TypeError):
+        resolved.nodes["runnable"]["node"] = None
+
+def test_resolve_dags(dag: nx.MultiDiGraph):
+    resolved_dags = resolve_dags(dag, [["S1", "T1"], ["S1", "T2"]])
+    assert [resolved.nodes["name"]["node"].value for resolved in resolved_dags] == ["S1.T1", "S1.T2"]
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
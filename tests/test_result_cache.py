@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pytest
+
+from ResearchOS.result_cache import ResultCache, get_result_key, run_if_outdated, get_cache_report, SKIPPED, RECOMPUTED
+
+def test_get_result_key():
+    key = get_result_key("node_hash", {"x": "input_hash", "y": 1.5}, "S1.T1")
+    assert key == get_result_key("node_hash", {"y": 1.5, "x": "input_hash"}, "S1.T1")
+    assert key != get_result_key("changed_node_hash", {"x": "input_hash", "y": 1.5}, "S1.T1")
+    assert key != get_result_key("node_hash", {"x": "input_hash", "y": 2.5}, "S1.T1")
+    assert key != get_result_key("node_hash", {"x": "input_hash", "y": 1.5}, "S1.T2")
+    # An upstream result changing changes the key.
+    upstream_key = get_result_key("node_hash", {"x": "input_hash", "y": 1.5}, "S1.T1", {"upstream_node": ["upstream_key"]})
+    assert upstream_key not in (key, get_result_key("node_hash", {"x": "input_hash", "y": 1.5}, "S1.T1", {"upstream_node": ["changed_upstream_key"]}))
+
+def test_run_if_outdated(tmp_path: Path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    save_file_path = tmp_path / "S1" / "T1.mat"
+    runs = []
+    def run_fcn():
+        runs.append(1)
+        save_file_path.parent.mkdir(exist_ok=True)
+        save_file_path.write_bytes(b"outputs")
+    key = get_result_key("node_hash", {"x": "input_hash"}, "S1.T1")
+
+    results = []
+    for force in (False, False, True):
+        result = run_if_outdated(cache, key, "S1.T1", str(save_file_path), run_fcn, force=force)
+        results.append({"data_object": "S1.T1", "result": result, "error": None})
+    assert [result["result"] for result in results] == [RECOMPUTED, SKIPPED, RECOMPUTED]
+    assert len(runs) == 2
+    assert get_cache_report(results) == {SKIPPED: ["S1.T1"], RECOMPUTED: ["S1.T1", "S1.T1"]}
+
+    # Deleted outputs are recomputed.
+    save_file_path.unlink()
+    assert run_if_outdated(cache, key, "S1.T1", str(save_file_path), run_fcn) == RECOMPUTED
+
+    # Without a cache, everything is recomputed.
+    assert run_if_outdated(None, key, "S1.T1", str(save_file_path), run_fcn) == RECOMPUTED
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
@@ -1,8 +1,179 @@
+import os
 
+import pytest
+import scipy.io
 
-NODE_SETTINGS = {
+from ResearchOS import run, python_runner
+from ResearchOS import data_objects
+from ResearchOS.config_cache import freeze
+from ResearchOS.constants import SAVE_DATA_FOLDER_KEY, PROJECT_FOLDER_KEY, DATASET_SCHEMA_KEY
+from ResearchOS.data_object_index import DataObjectIndex, get_save_file_path
+from ResearchOS.result_cache import ResultCache, RESULT_CACHE_FOLDER_NAME, SKIPPED, get_result_key
 
-}
+NODE_SETTINGS = {"language": "python", "batches": {f"S{idx}": [] for idx in range(6)}}
 
-def test_run_batch(node_settings: dict = NODE_SETTINGS):
-    pass
+def fake_run_data_object(node_settings: dict, data_object: str, data_object_batch: dict, matlab: dict):
+    if data_object == "S3":
+        raise ValueError("Bad data")
+    return data_object.lower()
+
+@pytest.mark.parametrize("parallel,executor_type", [(False, "process"), (True, "thread")])
+def test_run_batch(monkeypatch, parallel: bool, executor_type: str):
+    monkeypatch.setattr(run, "run_data_object", fake_run_data_object)
+    results = run.run_batch(NODE_SETTINGS, parallel=parallel, workers=3, executor_type=executor_type)
+    # Results are in the same order as the batches, and one failure doesn't stop the others.
+    assert [result["data_object"] for result in results] == list(NODE_SETTINGS["batches"])
+    assert [result["result"] for result in results] == ["s0", "s1", "s2", None, "s4", "s5"]
+    assert results[3]["error"] == "ValueError: Bad data"
+
+def test_run_batch_process_pool_reports_errors(tmp_path, monkeypatch):
+    # The even data objects' results are up to date, so they are skipped. The others fail in the worker processes,
+    # because the node's language has no engine to run them with.
+    monkeypatch.setenv(SAVE_DATA_FOLDER_KEY, str(tmp_path))
+    result_cache = ResultCache(os.path.join(str(tmp_path), RESULT_CACHE_FOLDER_NAME))
+    node_settings = {**NODE_SETTINGS, "language": "other", "inputs": {"speed": "speed"}, "outputs": ["power"], "node_hash": "node1", "result_cache": result_cache}
+    for data_object in ["S0", "S2", "S4"]:
+        save_file_path = get_save_file_path(str(tmp_path), data_object)
+        open(save_file_path, "w").close()
+        result_cache.record(get_result_key("node1", {"speed": "speed"}, data_object), data_object, save_file_path)
+    results = run.run_batch(node_settings, parallel=True, workers=2, executor_type="process")
+    assert [result["data_object"] for result in results] == list(NODE_SETTINGS["batches"])
+    assert [result["result"] for result in results] == [SKIPPED, None, SKIPPED, None, SKIPPED, None]
+    assert all([results[idx]["error"].startswith("TypeError") for idx in [1, 3, 5]])
+
+class FakeDag:
+    def __init__(self, languages: dict):
+        self.languages = languages
+        self.nodes = {node: {"node": type("FakeRunnable", (), {"language": language})()} for node, language in languages.items()}
+
+    def predecessors(self, node: str) -> list:
+        # Each node depends on the one before it.
+        nodes = list(self.languages)
+        return nodes[:nodes.index(node)][-1:]
+
+def test_run_starts_matlab_lazily(monkeypatch):
+    dag = FakeDag({"node1": "python", "node2": "matlab", "node3": "matlab"})
+    imports = []
+    matlab = {"matlab_eng": type("FakeEngine", (), {"addpath": lambda self, path: None, "quit": lambda self: None})()}
+    monkeypatch.setattr(run, "get_sorted_runnable_nodes", lambda dag: list(dag.languages))
+    monkeypatch.setattr(run, "get_node_settings", lambda node, **kwargs: {"language": node.language, "batches": {}})
+    monkeypatch.setattr(run, "hash_node", lambda dag, node: node)
+    monkeypatch.setattr(run, "import_matlab", lambda is_matlab, new_session: imports.append(is_matlab) or matlab)
+    run_matlab = []
+    monkeypatch.setattr(run, "run_batch", lambda node_settings, matlab=None, **kwargs: run_matlab.append(matlab) or [])
+    run_python = []
+    monkeypatch.setattr(run, "_run_python_node", lambda node_settings: run_python.append(node_settings["language"]) or [])
+
+    run.run(dag, dobj_index=DataObjectIndex())
+    # MATLAB is started once, when the first MATLAB node runs. The Python node runs in this process.
+    assert imports == [True]
+    assert run_matlab == [matlab, matlab]
+    assert run_python == ["python"]
+
+def test_run_shares_one_executor(monkeypatch):
+    dag = FakeDag({"node1": "matlab", "node2": "matlab", "node3": "other"})
+    matlab = {"matlab_eng": type("FakeEngine", (), {"addpath": lambda self, path: None, "quit": lambda self: None})()}
+    monkeypatch.setattr(run, "get_sorted_runnable_nodes", lambda dag: list(dag.languages))
+    monkeypatch.setattr(run, "get_node_settings", lambda node, **kwargs: {"language": node.language, "batches": {}})
+    monkeypatch.setattr(run, "hash_node", lambda dag, node: node)
+    monkeypatch.setattr(run, "import_matlab", lambda is_matlab, new_session: matlab)
+    calls = []
+    monkeypatch.setattr(run, "run_batch", lambda node_settings, **kwargs: calls.append(kwargs) or [])
+
+    run.run(dag, workers=2, executor_type="thread", dobj_index=DataObjectIndex())
+    # Every node gets the run's executor, and the MATLAB nodes the run's engine pool. Both are closed when the run ends.
+    executor = calls[0]["executor"]
+    assert [call["executor"] for call in calls] == [executor] * 3
+    assert calls[0]["engine_pool"] is calls[1]["engine_pool"]
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+    with pytest.raises(ValueError):
+        run.run(dag, workers=2, executor_type="cluster")
+
+class FakeWrapperEngine:
+    """Stands in for a MATLAB engine: records the save file paths of each wrapper call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def addpath(self, path: str) -> None:
+        pass
+
+    def quit(self) -> None:
+        pass
+
+    def wrapper(self, input_var_metadata: dict, output_var_metadata: list, save_file_path: str, nargout: int = 0) -> None:
+        self._save(save_file_path)
+        self.calls.append(save_file_path)
+
+    def wrapperBatch(self, input_var_metadata: dict, output_var_metadata: list, save_file_paths: list, nargout: int = 0) -> None:
+        for save_file_path in save_file_paths:
+            self._save(save_file_path)
+        self.calls.append(save_file_paths)
+
+    def _save(self, save_file_path: str) -> None:
+        os.makedirs(os.path.dirname(save_file_path), exist_ok=True)
+        open(save_file_path, "w").close()
+
+def use_project(tmp_path, monkeypatch, project_folder: str, save_data_folder: str, runnables: dict) -> FakeDag:
+    """Write each Trial's speed to its .mat file in the project folder, and get a DAG of the runnables {node: attributes},
+    where each node depends on the one before it. Their subset is the Trials with speed > 1, and each node's hash is its name."""
+    for data_object, speed in {"S1.T1": 1.0, "S1.T2": 2.0, "S2.T1": 3.0}.items():
+        mat_file_path = get_save_file_path(project_folder, data_object)
+        os.makedirs(os.path.dirname(mat_file_path), exist_ok=True)
+        scipy.io.savemat(mat_file_path, {"speed": speed})
+    monkeypatch.setenv(PROJECT_FOLDER_KEY, project_folder)
+    monkeypatch.setenv(SAVE_DATA_FOLDER_KEY, save_data_folder)
+    monkeypatch.setenv(DATASET_SCHEMA_KEY, "Dataset.Subject.Trial")
+    monkeypatch.setattr(data_objects, "_get_frozen_subset_conditions", lambda subset_name: freeze(["speed", ">", 1]))
+    monkeypatch.setattr(run, "get_sorted_runnable_nodes", lambda dag: list(dag.languages))
+    monkeypatch.setattr(run, "hash_node", lambda dag, node: node)
+    dag = FakeDag({node: runnable_attrs["language"] for node, runnable_attrs in runnables.items()})
+    for node, runnable_attrs in runnables.items():
+        dag.nodes[node]["node"] = type("FakeRunnable", (), {"subset": "FastTrials", "factor": "Trial", "batch": [], **runnable_attrs})()
+    return dag
+
+def test_run_subsets(tmp_path, monkeypatch):
+    # Two MATLAB nodes over the Trials with speed > 1, with the real node settings and a pool of one fake engine. node2 is batched by Subject.
+    save_data_folder = os.path.join(str(tmp_path), "save")
+    runnable_attrs = {"language": "matlab", "inputs": {"speed": "speed"}, "outputs": ["power"]}
+    dag = use_project(tmp_path, monkeypatch, os.path.join(str(tmp_path), "project"), save_data_folder, {"node1": runnable_attrs, "node2": {**runnable_attrs, "batch": ["Subject"]}})
+    engine = FakeWrapperEngine()
+    monkeypatch.setattr(run, "import_matlab", lambda is_matlab, new_session: {"matlab_eng": engine})
+    dobj_index = DataObjectIndex.from_names(["S1.T1", "S1.T2", "S2.T1"])
+
+    # node2's results are reported per batch.
+    report = run.run(dag, dobj_index=dobj_index)
+    assert report == {"node1": {"skipped": [], "recomputed": ["S1.T2", "S2.T1"]}, "node2": {"skipped": [], "recomputed": ["S1", "S2"]}}
+    save_file_paths = [get_save_file_path(save_data_folder, data_object) for data_object in ["S1.T2", "S2.T1"]]
+    assert engine.calls == save_file_paths + [[save_file_path] for save_file_path in save_file_paths]
+    # Nothing changed, so the second run skips every data object.
+    report = run.run(dag, dobj_index=dobj_index)
+    assert report == {"node1": {"skipped": ["S1.T2", "S2.T1"], "recomputed": []}, "node2": {"skipped": ["S1", "S2"], "recomputed": []}}
+    assert len(engine.calls) == 4
+
+def test_run_upstream_changes(tmp_path, monkeypatch):
+    # node2 adds one to node1's output. When node1 changes, node2's results are outdated too.
+    dag = use_project(tmp_path, monkeypatch, str(tmp_path), str(tmp_path), {
+        "node1": {"language": "python", "function": "test.double", "inputs": {"x": "speed"}, "outputs": ["y"]},
+        "node2": {"language": "python", "function": "test.add_one", "inputs": {"x": "y"}, "outputs": ["z"]}})
+    monkeypatch.setitem(python_runner._functions, "test.double", lambda x: x * 2)
+    monkeypatch.setitem(python_runner._functions, "test.triple", lambda x: x * 3)
+    monkeypatch.setitem(python_runner._functions, "test.add_one", lambda x: x + 1)
+    monkeypatch.setattr(run, "hash_node", lambda dag, node: f"{node}:{dag.nodes[node]['node'].function}")
+    dobj_index = DataObjectIndex.from_names(["S1.T1", "S1.T2", "S2.T1"])
+    fast_trials = ["S1.T2", "S2.T1"]
+    assert run.run(dag, dobj_index=dobj_index) == {node: {"skipped": [], "recomputed": fast_trials} for node in ["node1", "node2"]}
+    assert run.run(dag, dobj_index=dobj_index) == {node: {"skipped": fast_trials, "recomputed": []} for node in ["node1", "node2"]}
+
+    # Only node1's hash changes.
+    dag.nodes["node1"]["node"].function = "test.triple"
+    assert run.run(dag, dobj_index=dobj_index) == {node: {"skipped": [], "recomputed": fast_trials} for node in ["node1", "node2"]}
+    assert scipy.io.loadmat(get_save_file_path(str(tmp_path), "S1.T2"))["z"].item() == 7.0
+
+def test_run_batch_invalid_executor():
+    with pytest.raises(ValueError):
+        run.run_batch(NODE_SETTINGS, parallel=True, executor_type="cluster")
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
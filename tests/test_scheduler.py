@@ -0,0 +1,62 @@
+import time
+import threading
+
+import networkx as nx
+import pytest
+
+from ResearchOS.scheduler import get_runnable_dependencies, schedule
+
+def test_get_runnable_dependencies():
+    dag = nx.MultiDiGraph()
+    # emg -> emg_var -> filter -> filtered_var -> combine <- kinematics_var <- kinematics
+    dag.add_edges_from([("emg", "emg_var"), ("emg_var", "filter"), ("filter", "filtered_var"), ("filtered_var", "combine"),
+                        ("kinematics", "kinematics_var"), ("kinematics_var", "combine"), ("emg_var", "combine")])
+    dependencies = get_runnable_dependencies(dag, ["emg", "kinematics", "filter", "combine"])
+    assert dependencies == {"emg": set(), "kinematics": set(), "filter": {"emg"}, "combine": {"filter", "kinematics", "emg"}}
+
+def test_schedule_runs_independent_nodes_concurrently():
+    dependencies = {"a": [], "b": [], "c": [], "d": ["a", "b", "c"]}
+    started = []
+    def run_node(node: str) -> str:
+        started.append(node)
+        time.sleep(0.1)
+        return node.upper()
+    start_time = time.perf_counter()
+    results = schedule(dependencies, run_node, max_concurrency=3)
+    # Critical path is two nodes long.
+    assert time.perf_counter() - start_time < 0.35
+    assert [result["result"] for result in results.values()] == ["A", "B", "C", "D"]
+    assert started[-1] == "d"
+
+def test_schedule_resource_limits():
+    dependencies = {node: [] for node in ["m1", "m2", "m3", "p1", "p2"]}
+    node_resources = {"m1": "matlab", "m2": "matlab", "m3": "matlab", "p1": "python", "p2": "python"}
+    lock = threading.Lock()
+    running = {"matlab": 0, "python": 0}
+    max_running = {"matlab": 0, "python": 0}
+    def run_node(node: str):
+        with lock:
+            running[node_resources[node]] += 1
+            max_running[node_resources[node]] = max(max_running[node_resources[node]], running[node_resources[node]])
+        time.sleep(0.05)
+        with lock:
+            running[node_resources[node]] -= 1
+    schedule(dependencies, run_node, max_concurrency=5, node_resources=node_resources, resource_limits={"matlab": 1})
+    assert max_running == {"matlab": 1, "python": 2}
+
+def test_schedule_failure_skips_downstream():
+    dependencies = {"a": [], "b": ["a"], "c": ["b"], "d": []}
+    def run_node(node: str):
+        if node == "a":
+            raise ValueError("Bad data")
+    results = schedule(dependencies, run_node, max_concurrency=2)
+    assert [result["status"] for result in results.values()] == ["failed", "skipped", "skipped", "succeeded"]
+    assert results["a"]["error"] == "ValueError: Bad data"
+    assert results["c"]["error"] == "Upstream node a failed"
+
+def test_schedule_cycle():
+    with pytest.raises(ValueError):
+        schedule({"a": ["b"], "b": ["a"]}, lambda node: None)
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
@@ -0,0 +1,97 @@
+import os
+from pathlib import Path
+
+import pytest
+import scipy.io
+
+from ResearchOS import data_objects as data_objects_module
+from ResearchOS.constants import DATASET_SCHEMA_KEY, PROJECT_FOLDER_KEY
+from ResearchOS.config_cache import freeze
+from ResearchOS.data_objects import compile_conditions, filter_data_objects, filter_data_objects_vectorized, get_data_objects_in_subset
+from ResearchOS.data_object_index import DataObjectIndex, get_save_file_path
+
+DATA_OBJECTS = ["S1.T1", "S1.T2", "S2.T1"]
+ALL_VARS = {
+    "S1": {"group": "Control"},
+    "S2": {"group": "Treatment"},
+    "S1.T1": {"speed": 1.0, "side": "Left"},
+    "S1.T2": {"speed": 2.0, "side": None},
+    "S2.T1": {"speed": 3.0, "side": "right"},
+}
+
+def _filter(conditions, all_vars: dict = ALL_VARS) -> list:
+    predicate, vars_list = compile_conditions(conditions)
+    dobj_index = DataObjectIndex.from_names(DATA_OBJECTS)
+    data_objects = filter_data_objects(predicate, DATA_OBJECTS, all_vars, dobj_index)
+    # The vectorized evaluation must give the same result.
+    assert filter_data_objects_vectorized(conditions, DATA_OBJECTS, vars_list, all_vars, dobj_index) == data_objects
+    return data_objects
+
+def test_compile_conditions_variables():
+    _, vars_list = compile_conditions({"and": [["speed", ">", 1], {"or": [["side", "==", "left"], ["group", "==", "control"]]}, ["speed", "<", 5]]})
+    assert vars_list == ["speed", "side", "group"]
+
+def test_compile_conditions_logic():
+    assert _filter(["speed", ">=", 2]) == ["S1.T2", "S2.T1"]
+    assert _filter(["side", "==", "LEFT"]) == ["S1.T1"]
+    assert _filter(["side", "in", ["left", "Right"]]) == ["S1.T1", "S2.T1"]
+    assert _filter(["side", "contains", "ef"]) == ["S1.T1"]
+    assert _filter(["side", "is", None]) == ["S1.T2"]
+    # None values
+    assert _filter(["side", "in", None]) == []
+    assert _filter(["side", "not in", None]) == DATA_OBJECTS
+    assert _filter(["side", "not contains", "x"]) == DATA_OBJECTS
+
+def test_vectorized_mixed_types():
+    # Columns with numbers and strings are tested one value at a time, like the compiled conditions.
+    assert _filter(["side", "in", "left-right"]) == ["S1.T1", "S2.T1"]
+    assert _filter(["speed", "!=", 2]) == ["S1.T1", "S2.T1"]
+    assert _filter({"or": [["side", "==", 1], ["group", "in", ["control"]]]}) == ["S1.T1", "S1.T2"]
+
+def test_vectorized_short_circuit():
+    # Like the compiled conditions, later conditions are only evaluated where the earlier ones don't decide, so the None checks guard the comparisons.
+    all_vars = {"S1.T1": {"x": None}, "S1.T2": {"x": 10}, "S2.T1": {"x": 3}}
+    assert _filter({"and": [["x", "is not", None], ["x", ">", 5]]}, all_vars) == ["S1.T2"]
+    assert _filter({"or": [["x", "is", None], ["x", "<", 5]]}, all_vars) == ["S1.T1", "S2.T1"]
+    assert _filter({"and": [["x", "is not", None], {"or": [["x", "<", 5], ["x", ">", 8]]}]}, all_vars) == ["S1.T2", "S2.T1"]
+
+def test_vectorized_large_ints():
+    # Ints above 2**53 are compared exactly, not as floats.
+    all_vars = {"S1.T1": {"x": 2**53 + 1}, "S1.T2": {"x": 2**53}, "S2.T1": {"x": 2**64}}
+    assert _filter(["x", "==", 2**53], all_vars) == ["S1.T2"]
+    assert _filter(["x", ">", 2**53], all_vars) == ["S1.T1", "S2.T1"]
+    assert _filter(["x", "==", float(2**53)], all_vars) == ["S1.T2"]
+    assert _filter(["x", "<", 2**64], all_vars) == ["S1.T1", "S1.T2"]
+
+def test_compile_conditions_nested():
+    conditions = {"or": [{"and": [["speed", ">", 1], ["speed", "<", 3]]}, ["side", "==", "right"]]}
+    assert _filter(conditions) == ["S1.T2", "S2.T1"]
+
+def test_compile_conditions_ancestors():
+    # "group" is only found in the Subjects' variables.
+    assert _filter(["group", "==", "treatment"]) == ["S2.T1"]
+    assert _filter(["missing", "==", 1]) == []
+
+def test_subset_ancestor_variables(tmp_path: Path, monkeypatch):
+    # "group" is only in the Subjects' .mat files, which are loaded for the Trials that don't have it.
+    for data_object, mat_vars in ALL_VARS.items():
+        mat_vars = {vr_name: vr_value for vr_name, vr_value in mat_vars.items() if vr_value is not None}
+        mat_file_path = get_save_file_path(str(tmp_path), data_object)
+        os.makedirs(os.path.dirname(mat_file_path), exist_ok=True)
+        scipy.io.savemat(mat_file_path, mat_vars)
+    monkeypatch.setenv(DATASET_SCHEMA_KEY, "Dataset.Subject.Trial")
+    monkeypatch.setenv(PROJECT_FOLDER_KEY, str(tmp_path))
+    conditions = {"and": [["group", "==", "control"], ["speed", ">", 1]]}
+    monkeypatch.setattr(data_objects_module, "_get_frozen_subset_conditions", lambda subset_name: freeze(conditions))
+    for vectorized in [False, True]:
+        for cache in [False, True]:
+            assert get_data_objects_in_subset("Subset1", DATA_OBJECTS, "Trial", None, vectorized=vectorized, loader="scipy", cache=cache) == ["S1.T2"]
+
+def test_compile_conditions_invalid():
+    with pytest.raises(ValueError):
+        compile_conditions(["speed", "~", 1])
+    with pytest.raises(ValueError):
+        compile_conditions({"xor": []})
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
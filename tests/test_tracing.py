@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from ResearchOS import tracing
+from ResearchOS.tracing import span, traced, count, start_tracing, stop_tracing
+
+@traced("double")
+def double(x):
+    return 2 * x
+
+def test_tracing_off_records_nothing():
+    stop_tracing()
+    tracing.tracer.reset()
+    with span("outer"):
+        count("rows", 10)
+    assert double(2) == 4
+    assert stop_tracing() == {"spans": {}, "counters": {}}
+
+def test_spans_and_counters(tmp_path: Path):
+    start_tracing()
+    with span("outer", subset="s1"):
+        for x in range(3):
+            double(x)
+        count("rows", 10)
+        count("rows", 5)
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("error")
+    summary = stop_tracing(str(tmp_path))
+
+    assert summary["spans"]["double"]["count"] == 3
+    assert summary["spans"]["outer"]["total_seconds"] >= summary["spans"]["double"]["total_seconds"]
+    assert summary["counters"] == {"rows": 15}
+    with open(tmp_path / tracing.SUMMARY_FILE_NAME) as f:
+        assert json.load(f) == summary
+
+    # Nested spans are within their parent span in the Chrome trace.
+    with open(tmp_path / tracing.CHROME_TRACE_FILE_NAME) as f:
+        events = json.load(f)["traceEvents"]
+    outer = [event for event in events if event["name"] == "outer"][0]
+    assert outer["args"] == {"subset": "s1"}
+    for event in [event for event in events if event["name"] == "double"]:
+        assert outer["ts"] <= event["ts"] and event["ts"] + event["dur"] <= outer["ts"] + outer["dur"]
+    assert [event for event in events if event["name"] == "failing"][0]["args"] == {"error": "ValueError"}
+    assert [event for event in events if event["ph"] == "C"][0]["args"] == {"rows": 15}
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])
@@ -0,0 +1,62 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+import scipy.io
+
+from ResearchOS.load_mat import load_mat_variables
+from ResearchOS.var_cache import VariableCache
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, mat_file_paths: list, vars_list: list) -> list:
+        self.calls.append((len(mat_file_paths), sorted(vars_list)))
+        return load_mat_variables(mat_file_paths, vars_list, loader="scipy")
+
+def _make_mat_files(tmp_path: Path, num_files: int = 3) -> list:
+    paths = [str(tmp_path / f"T{trial}.mat") for trial in range(num_files)]
+    for trial, path in enumerate(paths):
+        scipy.io.savemat(path, {"speed": float(trial), "side": "left"})
+    return paths
+
+def test_variable_cache_hits_and_invalidation(tmp_path: Path):
+    paths = _make_mat_files(tmp_path)
+    loader = CountingLoader()
+    cache = VariableCache()
+    first = cache.load(paths, ["speed", "missing"], loader)
+    assert [vars_dict["speed"] for vars_dict in first] == [0.0, 1.0, 2.0]
+    assert loader.calls == [(3, ["missing", "speed"])]
+
+    # Only the new variable is loaded, and variables not in the files are not looked for again.
+    assert cache.load(paths, ["speed", "missing", "side"], loader)[1] == {"speed": 1.0, "side": "left"}
+    assert loader.calls[1:] == [(3, ["side"])]
+    assert (cache.hits, cache.misses) == (6, 9)
+
+    # A modified file is reloaded.
+    scipy.io.savemat(paths[0], {"speed": 10.0, "side": "right", "extra": np.zeros(100)})
+    os.utime(paths[0], ns=(0, 0))
+    assert cache.load(paths, ["speed"], loader)[0] == {"speed": 10.0}
+    assert loader.calls[2:] == [(1, ["speed"])]
+
+def test_variable_cache_on_disk(tmp_path: Path):
+    paths = _make_mat_files(tmp_path)
+    cache_folder = str(tmp_path / "cache")
+    VariableCache(cache_folder=cache_folder).load(paths, ["speed", "missing"], CountingLoader())
+
+    # A new process' cache reads the variables from disk instead of the .mat files.
+    loader = CountingLoader()
+    assert VariableCache(cache_folder=cache_folder).load(paths, ["speed", "missing"], loader)[2] == {"speed": 2.0}
+    assert loader.calls == []
+
+def test_variable_cache_memory_cap(tmp_path: Path):
+    paths = _make_mat_files(tmp_path)
+    cache = VariableCache(max_memory_bytes=50)
+    cache.load(paths, ["speed"], CountingLoader())
+    assert cache.memory_bytes <= 50
+    assert len(cache._memory) == 2 # Least recently used variable is evicted.
+
+if __name__ == "__main__":
+    pytest.main(['-v', __file__])